@@ -0,0 +1,182 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Per frame evaluation time of the shape key widget drivers: default vs. compact drivers.
+
+Builds a synthetic "Shape Key Selector V1" setup, converts it with each driver mode and
+times playing back an animation of the widget cursors.
+
+Run from the add-on directory with:
+    blender -b --factory-startup --python benchmarks/driver_evaluation.py -- --keys 120
+
+The add-on is imported from the parent directory of this repository,
+so the repository directory name needs to be a valid Python module name.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+import bpy
+
+CHARACTER = "bench"
+RIG_NAME = f"RIG-{CHARACTER}"
+GEO_NAME = f"GEO-{CHARACTER}-head"
+THUMBS_COL_NAME = f"{CHARACTER}-rig-widgets-thumbnails"
+WGTS_COL_NAME = f"{CHARACTER}-rig-widgets"
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=120, help="Total number of shape keys")
+    parser.add_argument("--categories", type=int, default=6, help="Number of categories")
+    parser.add_argument("--frames", type=int, default=250, help="Number of frames to play back")
+    parser.add_argument("--grid", type=int, default=64, help="Vertices per side of the mesh")
+    return parser.parse_args(argv)
+
+
+def register_addon():
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(repo_dir))
+    addon = importlib.import_module(os.path.basename(repo_dir))
+    addon.register()
+    return addon
+
+
+def build_sks_setup(num_keys, num_categories, grid_size):
+    """Make an empty file with a character as "Shape Key Selector V1" would have it"""
+
+    bpy.ops.wm.read_homefile(use_empty=True)
+    scene = bpy.context.scene
+
+    thumbs_col = bpy.data.collections.new(THUMBS_COL_NAME)
+    wgts_col = bpy.data.collections.new(WGTS_COL_NAME)
+    scene.collection.children.link(thumbs_col)
+    scene.collection.children.link(wgts_col)
+
+    # Character mesh: a grid where each shape key moves a few vertices.
+    verts = [(x / grid_size, 0.0, y / grid_size) for y in range(grid_size) for x in range(grid_size)]
+    faces = [(y * grid_size + x, y * grid_size + x + 1, (y + 1) * grid_size + x + 1, (y + 1) * grid_size + x)
+             for y in range(grid_size - 1) for x in range(grid_size - 1)]
+    mesh = bpy.data.meshes.new(GEO_NAME)
+    mesh.from_pydata(verts, [], faces)
+    geo = bpy.data.objects.new(GEO_NAME, mesh)
+    scene.collection.objects.link(geo)
+    geo.shape_key_add(name="Basis")
+
+    category_names = [f"Cat{c}" for c in range(num_categories)]
+    keys_per_category = max(2, num_keys // num_categories)
+    for c, category_name in enumerate(category_names):
+        sk_names = [f"{category_name} - Neutral"]
+        sk_names += [f"{category_name} - Key{i}" for i in range(keys_per_category - 1)]
+        for i, sk_name in enumerate(sk_names):
+            sk = geo.shape_key_add(name=sk_name, from_mix=False)
+            vert_idx = (c * keys_per_category + i) % len(verts)
+            sk.data[vert_idx].co.y += 0.1
+
+            # Thumbnail object, laid out in columns of 10 per category.
+            thumb_obj = bpy.data.objects.new(sk_name, None)
+            thumb_obj.location = (2.0 + c * 1.5 + (i // 10) * 0.15, 0.0, 1.0 + (i % 10) * 0.15)
+            thumbs_col.objects.link(thumb_obj)
+
+    # Rig with a root bone.
+    armature = bpy.data.armatures.new(RIG_NAME)
+    rig = bpy.data.objects.new(RIG_NAME, armature)
+    scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    root = armature.edit_bones.new("root")
+    root.tail = (0.0, 0.0, 1.0)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    return category_names
+
+
+def animate_cursors(rig, num_frames):
+    """Sweep every cursor across its category thumbnails"""
+
+    scene = bpy.context.scene
+    scene.frame_start = 1
+    scene.frame_end = num_frames
+    for pose_bone in rig.pose.bones:
+        if not pose_bone.name.endswith("-cursor"):
+            continue
+        pose_bone["snapping"] = False
+        for frame, offset in ((1, 0.0), (num_frames, 1.5)):
+            pose_bone.location = (offset, offset, 0.0)
+            pose_bone.keyframe_insert("location", frame=frame)
+
+
+def count_drivers(*ids):
+    return sum(len(id_data.animation_data.drivers) for id_data in ids if id_data.animation_data)
+
+
+def time_playback(num_frames):
+    """Return the average seconds to evaluate a frame"""
+
+    scene = bpy.context.scene
+    # Warm up, so that the first depsgraph build isn't measured.
+    scene.frame_set(1)
+    scene.frame_set(2)
+
+    start = time.perf_counter()
+    for frame in range(1, num_frames + 1):
+        scene.frame_set(frame)
+    return (time.perf_counter() - start) / num_frames
+
+
+def run(args, use_compact_drivers, use_influence_readouts=False):
+    category_names = build_sks_setup(args.keys, args.categories, args.grid)
+
+    result = bpy.ops.scene.convert_sks_to_skw(
+        rig_name=RIG_NAME,
+        geo_name=GEO_NAME,
+        thumbs_collection_name=THUMBS_COL_NAME,
+        wgts_collection_name=WGTS_COL_NAME,
+        categories_str=", ".join(category_names),
+        use_compact_drivers=use_compact_drivers,
+        use_influence_readouts=use_influence_readouts,
+    )
+    assert result == {'FINISHED'}, f"Conversion failed: {result}"
+
+    rig = bpy.data.objects[RIG_NAME]
+    shape_keys = bpy.data.objects[GEO_NAME].data.shape_keys
+    bpy.ops.object.mode_set(mode='OBJECT')
+    animate_cursors(rig, args.frames)
+
+    num_keys = len(shape_keys.key_blocks) - 1
+    num_drivers = count_drivers(rig, shape_keys)
+    frame_time = time_playback(args.frames)
+
+    # Baseline without the widget drivers, to isolate their cost from the mesh deformation.
+    for id_data in (rig, shape_keys):
+        for fcurve in id_data.animation_data.drivers:
+            fcurve.mute = True
+    baseline_frame_time = time_playback(args.frames)
+
+    return num_keys, num_drivers, frame_time, baseline_frame_time
+
+
+def main():
+    args = parse_args()
+    register_addon()
+
+    modes = (
+        ("default", False, False),
+        ("compact", True, False),
+        ("compact + read-outs", True, True),
+    )
+
+    print(f"\n{'Drivers mode':<22}{'Keys':>6}{'Drivers':>9}{'ms/frame':>10}{'drivers ms/frame':>18}")
+    for label, use_compact_drivers, use_influence_readouts in modes:
+        num_keys, num_drivers, frame_time, baseline_frame_time = run(
+            args, use_compact_drivers, use_influence_readouts)
+        print(f"{label:<22}{num_keys:>6}{num_drivers:>9}"
+              f"{frame_time * 1000:>10.3f}{(frame_time - baseline_frame_time) * 1000:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
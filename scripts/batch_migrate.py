@@ -0,0 +1,363 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Convert many .blend files set up with Shape Key Selector V1 to rigs, in parallel.
+
+The runner fans the files out to a pool of background Blender processes, one file per process
+and by default as many processes as CPU cores. Each worker converts its file with the same
+code as the 'Convert SKS to SKW rig' operator, saves it and writes a JSON result.
+
+Usage, from the add-on directory:
+    blender -b --factory-startup --python scripts/batch_migrate.py -- \\
+        --manifest show.json --results migration_results "shots/**/*.blend"
+
+The runner doesn't need Blender itself, it can also run with a regular Python 3 when given
+the Blender executable with --blender.
+Files are given as paths or glob patterns. Without any, the file patterns of the manifest are used,
+or the files with a SKS setup in an inventory from scripts/scan_sks_inventory.py, given with --inventory.
+Then the parameters detected by the scanner are used, with the ones of the manifest on top.
+
+The manifest is a JSON file with the conversion parameters for each file:
+    {
+        "defaults": {"categories": "Mouth, Eyes", "incremental": true},
+        "files": {
+            "shots/010/*.blend": {"character": "claudia"},
+            "assets/chr/bob.blend": {
+                "rig_name": "RIG-bob",
+                "geo_name": "GEO-bob-head",
+                "thumbs_collection_name": "bob-rig-widgets-thumbnails",
+                "wgts_collection_name": "bob-rig-widgets",
+                "categories": ["Mouth", "Eyes", "Brows"]
+            }
+        }
+    }
+Parameters of all the patterns matching a file are applied in order, on top of the defaults.
+Relative paths and patterns are relative to the manifest.
+- "character": sets the rig, mesh and collection names following the naming of the Migration panel.
+- "rig_name", "geo_name", "thumbs_collection_name", "wgts_collection_name": as in the operator.
+- "categories": comma separated string or list of category names.
+- "incremental", "use_compact_drivers", "use_influence_readouts", "purge_orphans": as in the operator.
+- "output": path to save the converted file to. By default, files are saved in place.
+
+Per file, the results directory gets '<name>-<hash>.json' with the status ('converted', 'invalid',
+'failed' or 'timeout'), durations, validation errors, conversion stats and profile, and a '.log' with the
+Blender output. 'summary.json' lists all the results of the run.
+"""
+
+import argparse
+import concurrent.futures
+import fnmatch
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+
+try:
+    import bpy
+except ImportError:
+    bpy = None  # Running the pool with a regular Python, not inside Blender.
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_MODULE_NAME = "shape_keys_widget"
+
+CONVERSION_PARAM_NAMES = (
+    "rig_name",
+    "geo_name",
+    "thumbs_collection_name",
+    "wgts_collection_name",
+    "incremental",
+    "use_compact_drivers",
+    "use_influence_readouts",
+)
+
+
+def get_script_args():
+    # Blender passes the arguments after '--' on to the script.
+    return sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+
+# Runner ##########################################################################################
+
+def parse_runner_args(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="See the top of this script for the manifest format.",
+    )
+    parser.add_argument("files", nargs="*", help="Paths or glob patterns of .blend files")
+    parser.add_argument("--manifest", help="JSON file with the parameters per file")
+    parser.add_argument("--inventory", help="JSON inventory of scan_sks_inventory.py, with detected parameters")
+    parser.add_argument("--results", default="migration_results", help="Directory for the results")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of Blender processes to run at the same time")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Threads per Blender process. Default 1, as files run in parallel")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="Seconds allowed per file")
+    parser.add_argument("--blender", default=bpy.app.binary_path if bpy else None,
+                        help="Blender executable. Defaults to the one running this script")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip files that were already converted by a previous run")
+    args = parser.parse_args(argv)
+    if not args.manifest and not args.inventory:
+        parser.error("--manifest or --inventory is needed")
+    if not args.blender:
+        parser.error("--blender is needed when not running inside Blender")
+    return args
+
+
+def expand_file_patterns(patterns, base_dir):
+    file_paths = set()
+    for pattern in patterns:
+        pattern = os.path.join(base_dir, os.path.expanduser(pattern))
+        file_paths.update(os.path.abspath(p) for p in glob.glob(pattern, recursive=True)
+                          if p.endswith(".blend"))
+    return sorted(file_paths)
+
+
+def resolve_file_params(manifest, manifest_dir, file_path, detected_params=None):
+    """Return the conversion parameters for a file: detected ones, the defaults and all the matching entries"""
+
+    params = dict(detected_params or {})
+    params.update(manifest.get("defaults", {}))
+    for pattern, file_params in manifest.get("files", {}).items():
+        abs_pattern = os.path.abspath(os.path.join(manifest_dir, os.path.expanduser(pattern)))
+        if fnmatch.fnmatch(file_path, abs_pattern):
+            params.update(file_params)
+
+    if "output" in params:
+        params["output"] = os.path.abspath(os.path.join(manifest_dir, params["output"]))
+    return params
+
+
+def get_result_path(results_dir, file_path):
+    # Files with the same name in different directories get their own result.
+    path_hash = hashlib.sha1(file_path.encode()).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(results_dir, f"{name}-{path_hash}.json")
+
+
+def run_worker(args, file_path, params, result_path):
+    """Convert a file in a background Blender process and return its result"""
+
+    cmd = [
+        args.blender, "--background", "--factory-startup",
+        "--threads", str(args.threads),
+        file_path,
+        "--python-exit-code", "1",
+        "--python", os.path.abspath(__file__),
+        "--", "--worker",
+        "--params", json.dumps(params),
+        "--result", result_path,
+    ]
+
+    start_time = time.perf_counter()
+    log_path = os.path.splitext(result_path)[0] + ".log"
+    # Clear a result of a previous run, to not mistake it for the result of this one.
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    with open(log_path, "w") as log_file:
+        try:
+            process = subprocess.run(cmd, stdout=log_file, stderr=subprocess.STDOUT, timeout=args.timeout)
+            returncode = process.returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+
+    result = {}
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            result = json.load(f)
+
+    if returncode is None:
+        result.update(status="timeout", errors=[f"Did not finish within {args.timeout}s"])
+    elif not result:
+        result.update(status="failed", errors=[f"Blender exited with code {returncode}. See {log_path}"])
+
+    result.update(
+        file=file_path,
+        params=params,
+        duration=time.perf_counter() - start_time,
+        returncode=returncode,
+        log=log_path,
+    )
+    with open(result_path, "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def main_runner(argv):
+    args = parse_runner_args(argv)
+
+    manifest = {}
+    manifest_dir = os.getcwd()
+    if args.manifest:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        manifest_dir = os.path.dirname(os.path.abspath(args.manifest))
+
+    # Parameters detected by the inventory scanner, for the files with a SKS setup.
+    detected_params_per_file = {}
+    if args.inventory:
+        with open(args.inventory) as f:
+            inventory = json.load(f)
+        detected_params_per_file = {entry["file"]: entry["params"] for entry in inventory["files"]
+                                    if entry["status"] == "sks"}
+
+    if args.files:
+        file_paths = expand_file_patterns(args.files, os.getcwd())
+    elif args.inventory:
+        file_paths = sorted(detected_params_per_file)
+    else:
+        file_paths = expand_file_patterns(manifest.get("files", {}).keys(), manifest_dir)
+    if not file_paths:
+        print("No .blend files to convert")
+        return 1
+
+    results_dir = os.path.abspath(args.results)
+    os.makedirs(results_dir, exist_ok=True)
+
+    jobs = []
+    results = []
+    for file_path in file_paths:
+        result_path = get_result_path(results_dir, file_path)
+        if args.resume and os.path.exists(result_path):
+            with open(result_path) as f:
+                previous_result = json.load(f)
+            if previous_result.get("status") == "converted":
+                results.append(previous_result)
+                continue
+        params = resolve_file_params(manifest, manifest_dir, file_path, detected_params_per_file.get(file_path))
+        jobs.append((file_path, params, result_path))
+
+    print(f"Converting {len(jobs)} files with {args.jobs} Blender processes "
+          f"({len(results)} already converted)")
+    start_time = time.perf_counter()
+
+    # The work happens in the Blender processes, threads only wait for them.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(run_worker, args, *job) for job in jobs]
+        for num_done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            print(f"[{num_done}/{len(jobs)}] {result['status']:<9} {result['duration']:7.1f}s  {result['file']}")
+            for error in result.get("errors", []):
+                print(f"    {error}")
+
+    num_per_status = {}
+    for result in results:
+        num_per_status[result["status"]] = num_per_status.get(result["status"], 0) + 1
+    summary = {
+        "duration": time.perf_counter() - start_time,
+        "num_per_status": num_per_status,
+        "results": sorted(results, key=lambda r: r["file"]),
+    }
+    with open(os.path.join(results_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Done in {summary['duration']:.1f}s: " +
+          ", ".join(f"{num} {status}" for status, num in sorted(num_per_status.items())))
+    return 0 if set(num_per_status) <= {"converted"} else 1
+
+
+# Worker (runs inside Blender) ####################################################################
+
+def import_addon():
+    """Import the add-on from this repository, with a valid module name"""
+
+    if ADDON_MODULE_NAME in sys.modules:
+        return sys.modules[ADDON_MODULE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        ADDON_MODULE_NAME, os.path.join(ADDON_DIR, "__init__.py"),
+        submodule_search_locations=[ADDON_DIR])
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_MODULE_NAME] = addon
+    spec.loader.exec_module(addon)
+    return addon
+
+
+def register_addon():
+    addon = import_addon()
+    addon.register()
+    return addon
+
+
+def convert_open_file(convert_module, params):
+    """Convert the SKS setup in the open file and return the result"""
+
+    conversion_params = {}
+    if "character" in params:
+        conversion_params.update(convert_module.get_character_setup_names(params["character"]))
+    conversion_params.update((name, params[name]) for name in CONVERSION_PARAM_NAMES if name in params)
+
+    categories = params.get("categories", "Mouth, Eyes")
+    if isinstance(categories, str):
+        categories = categories.split(',')
+    category_names = [n.strip() for n in categories]
+
+    missing_param_names = [n for n in CONVERSION_PARAM_NAMES[:4] if n not in conversion_params]
+    if missing_param_names:
+        return {"status": "invalid", "errors": [f"Missing parameters: {', '.join(missing_param_names)}"]}
+
+    run = convert_module.ConversionRun(category_names=category_names, **conversion_params)
+    run.purge_orphans = params.get("purge_orphans", False)
+    problem = run.find_problem()
+    if problem:
+        return {"status": "invalid", "errors": [problem]}
+
+    # The conversion switches the mode of the rig, which needs a view layer with an active object.
+    bpy.context.view_layer.objects.active = run.datablocks.objects_by_name[run.rig_name]
+    if bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    run.prepare()
+    run.run_all_steps()
+    bpy.ops.object.mode_set(mode='OBJECT')
+    run.log_profile()
+
+    output_path = params.get("output") or bpy.data.filepath
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    bpy.ops.wm.save_as_mainfile(filepath=output_path)
+
+    return {
+        "status": "converted",
+        "errors": [],
+        "stats": run.stats.counts,
+        "profile": run.profile.to_dict(),
+        "removal_summary": run.removal_summary,
+        "drivers_needing_python": [f"{id_name}: {data_path}"
+                                   for id_name, data_path in run.drivers_needing_python],
+        "output": output_path,
+    }
+
+
+def main_worker(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", action="store_true")
+    parser.add_argument("--params", required=True)
+    parser.add_argument("--result", required=True)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    try:
+        addon = register_addon()
+        result = convert_open_file(addon.src.convert_sks_to_skw_rig, json.loads(args.params))
+    except Exception:
+        traceback.print_exc()
+        result = {"status": "failed", "errors": [traceback.format_exc(limit=3)]}
+    result["conversion_duration"] = time.perf_counter() - start_time
+
+    with open(args.result, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    script_args = get_script_args()
+    if "--worker" in script_args:
+        main_worker(script_args)
+    else:
+        sys.exit(main_runner(script_args))
@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Render the thumbnails of the shape key categories of a mesh in a .blend file, in parallel.
+
+Same as the 'Render Thumbnails' operator: the shape keys of the categories are split in shards,
+rendered by background Blender processes, as many as CPU cores by default, and the
+'<shape key name>.png' files are loaded back as images in one batch.
+
+Usage, from the add-on directory:
+    blender -b --factory-startup face.blend --python scripts/render_thumbnails.py -- \\
+        --mesh GEO-claudia-head --output //thumbnails/ --save
+
+This script runs inside Blender, with the file open: it needs the add-on to read the categories.
+Without --save, the images are only written to the output directory and not added to the file.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_migrate import bpy, get_script_args, register_addon  # noqa: E402
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--mesh", required=True, help="Name of the mesh object with the categories")
+    parser.add_argument("--output", default="//thumbnails/",
+                        help="Directory for the thumbnails. '//' is the directory of the .blend file")
+    parser.add_argument("--engine", choices=("BLENDER_WORKBENCH", "CYCLES"), default="BLENDER_WORKBENCH")
+    parser.add_argument("--resolution", type=int, default=256, help="Width and height of the thumbnails")
+    parser.add_argument("--frame", choices=("SHAPE_KEYS", "MESH"), default="SHAPE_KEYS",
+                        help="Frame the region moved by the shape keys or the whole mesh")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="Number of Blender processes to run at the same time. Default one per CPU core")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Render all the shape keys, not only the ones without a cached thumbnail")
+    parser.add_argument("--save", action="store_true", help="Save the file with the thumbnail images")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if not bpy or not bpy.data.filepath:
+        print("Run this script inside Blender, with a saved .blend file open")
+        return 1
+
+    thumbnails = register_addon().src.thumbnails
+    mesh_obj = bpy.data.objects.get(args.mesh)
+    if not mesh_obj or mesh_obj.type != 'MESH':
+        print(f"Can not find mesh object '{args.mesh}'")
+        return 1
+    jobs = thumbnails.get_thumbnail_jobs(mesh_obj.data)
+    if not jobs:
+        print(f"No shape keys of the categories of '{args.mesh}' were found in the mesh")
+        return 1
+
+    render = thumbnails.ThumbnailRender(mesh_obj, jobs, args.output, engine=args.engine,
+                                        resolution=args.resolution, frame=args.frame, num_processes=args.jobs,
+                                        use_cache=not args.no_cache)
+    print(f"Rendering {len(render.jobs_to_render)} thumbnails with {render.num_processes} Blender processes, "
+          f"{len(jobs) - len(render.jobs_to_render)} from the cache")
+    # The processes can render the saved file directly.
+    render.start(bpy.data.filepath)
+    errors = render.finish()
+    for error in errors:
+        print(f"    {error}")
+    print(f"Rendered {render.count_rendered()}/{len(jobs)} thumbnails into '{render.output_dir}'")
+
+    if args.save:
+        bpy.ops.wm.save_mainfile()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(get_script_args()))
@@ -0,0 +1,293 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""List which .blend files have a Shape Key Selector V1 setup, without opening them.
+
+Instead of opening each file, workers read the names of its datablocks as a library
+(bpy.data.libraries.load), the same listing used to append or link from a file.
+Only the character meshes are linked, to read their shape keys.
+The files are split in batches, scanned in parallel by background Blender processes.
+
+Usage, from the add-on directory:
+    blender -b --factory-startup --python scripts/scan_sks_inventory.py -- \\
+        --inventory inventory.json --csv inventory.csv "shots/**/*.blend"
+
+The runner doesn't need Blender itself, it can also run with a regular Python 3 when given
+the Blender executable with --blender.
+
+The detection rules are the ones of the conversion (src/convert_sks_to_skw_rig.py):
+- A file has a SKS setup ('sks' status) when it has cursor objects ('Selector Icon*')
+  or collections made by SKS ('*Selectors*').
+- Characters are found from the rig objects, named as in the Migration panel: 'RIG-<character>'.
+  Their categories are the ones with a 'Neutral' shape key on the 'GEO-<character>-head' mesh,
+  each checked for matching thumbnail objects and L/R shape keys like the conversion does.
+- Label curves ('Text*') are only counted: their type and text can't be read from names.
+Not checked, as they need to open the file: the 'root' bone of the rig.
+
+The JSON inventory can be given to scripts/batch_migrate.py with --inventory. For files with a
+single character without problems, it has the conversion parameters of that character.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import batch_migrate  # noqa: E402
+from batch_migrate import bpy, expand_file_patterns, get_script_args  # noqa: E402
+
+CSV_COLUMNS = (
+    "file",
+    "status",
+    "characters",
+    "categories",
+    "problems",
+    "cursor_objects",
+    "label_curves",
+    "selector_collections",
+    "duration",
+)
+
+
+# Runner ##########################################################################################
+
+def parse_runner_args(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("files", nargs="+", help="Paths or glob patterns of .blend files")
+    parser.add_argument("--inventory", default="sks_inventory.json", help="JSON file to write")
+    parser.add_argument("--csv", help="Also write the inventory as a CSV file, e.g. for spreadsheets")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of Blender processes to run at the same time")
+    parser.add_argument("--batch-size", type=int, default=20,
+                        help="Files per Blender process, to not pay for starting Blender for each file")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds allowed per batch")
+    parser.add_argument("--blender", default=bpy.app.binary_path if bpy else None,
+                        help="Blender executable. Defaults to the one running this script")
+    args = parser.parse_args(argv)
+    if not args.blender:
+        parser.error("--blender is needed when not running inside Blender")
+    return args
+
+
+def run_worker(args, file_paths, temp_dir, batch_idx):
+    """Scan a batch of files in a background Blender process and return their entries"""
+
+    files_path = os.path.join(temp_dir, f"batch-{batch_idx}-files.json")
+    result_path = os.path.join(temp_dir, f"batch-{batch_idx}-result.json")
+    with open(files_path, "w") as f:
+        json.dump(file_paths, f)
+
+    cmd = [
+        args.blender, "--background", "--factory-startup",
+        "--python-exit-code", "1",
+        "--python", os.path.abspath(__file__),
+        "--", "--worker",
+        "--files", files_path,
+        "--result", result_path,
+    ]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=args.timeout)
+        error = f"Blender exited with code {process.returncode}:\n{process.stdout[-2000:]}"
+    except subprocess.TimeoutExpired:
+        error = f"Batch did not finish within {args.timeout}s"
+
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            entries = json.load(f)
+    else:
+        entries = []
+
+    # Files that the worker didn't get to, e.g. because Blender crashed on one of them.
+    scanned_paths = {entry["file"] for entry in entries}
+    entries += [make_error_entry(file_path, error) for file_path in file_paths if file_path not in scanned_paths]
+    return entries
+
+
+def make_error_entry(file_path, error):
+    return {"file": file_path, "status": "error", "errors": [error], "characters": [], "params": None}
+
+
+def write_csv(csv_path, entries):
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for entry in entries:
+            characters = entry.get("characters", [])
+            row = dict(entry)
+            row["characters"] = ", ".join(c["character"] for c in characters)
+            row["categories"] = "; ".join(f"{c['character']}: {', '.join(c['categories'])}" for c in characters)
+            row["problems"] = "; ".join(entry.get("errors", []) + [p for c in characters for p in c["problems"]])
+            writer.writerow(row)
+
+
+def main_runner(argv):
+    args = parse_runner_args(argv)
+
+    file_paths = expand_file_patterns(args.files, os.getcwd())
+    if not file_paths:
+        print("No .blend files to scan")
+        return 1
+
+    batches = [file_paths[i:i + args.batch_size] for i in range(0, len(file_paths), args.batch_size)]
+    print(f"Scanning {len(file_paths)} files in {len(batches)} batches with {args.jobs} Blender processes")
+    start_time = time.perf_counter()
+
+    entries = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(run_worker, args, batch, temp_dir, batch_idx)
+                       for batch_idx, batch in enumerate(batches)]
+            for future in concurrent.futures.as_completed(futures):
+                entries += future.result()
+    entries.sort(key=lambda entry: entry["file"])
+
+    num_per_status = {}
+    for entry in entries:
+        num_per_status[entry["status"]] = num_per_status.get(entry["status"], 0) + 1
+    inventory = {
+        "duration": time.perf_counter() - start_time,
+        "num_per_status": num_per_status,
+        "files": entries,
+    }
+    with open(args.inventory, "w") as f:
+        json.dump(inventory, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, entries)
+
+    print(f"Done in {inventory['duration']:.1f}s: " +
+          ", ".join(f"{num} {status}" for status, num in sorted(num_per_status.items())))
+    return 0 if "error" not in num_per_status else 1
+
+
+# Worker (runs inside Blender) ####################################################################
+
+def scan_file(convert_module, file_path):
+    """Return the inventory entry of a file, from the names of its datablocks"""
+
+    with bpy.data.libraries.load(file_path, link=True) as (data_from, data_to):
+        object_names = set(data_from.objects)
+        curve_names = list(data_from.curves)
+        collection_names = set(data_from.collections)
+
+        # Characters of the file, with the names the conversion expects for them.
+        setup_names_per_character = {}
+        for object_name in object_names:
+            if object_name.startswith("RIG-"):
+                character_name = object_name[len("RIG-"):]
+                setup_names_per_character[character_name] = convert_module.get_character_setup_names(character_name)
+
+        # Link only the character meshes, to read their shape keys.
+        data_to.objects = sorted({names["geo_name"] for names in setup_names_per_character.values()
+                                  if names["geo_name"] in object_names})
+
+    # Read what was linked, then remove it again to keep the worker's memory low for the next files.
+    shape_key_names_per_object = {}
+    libraries = set()
+    for ob in data_to.objects:
+        if ob is None:
+            continue
+        if ob.type == 'MESH' and ob.data.shape_keys:
+            shape_key_names_per_object[ob.name] = [key.name for key in ob.data.shape_keys.key_blocks]
+        libraries.add(ob.library)
+    for library in libraries:
+        bpy.data.libraries.remove(library)
+
+    cursor_objects = [name for name in object_names if convert_module.is_sks_cursor_object_name(name)]
+    label_curves = [name for name in curve_names if convert_module.is_sks_label_curve_name(name)]
+    selector_collections = [name for name in collection_names
+                            if convert_module.is_sks_selector_collection_name(name)]
+
+    characters = []
+    for character_name, setup_names in sorted(setup_names_per_character.items()):
+        shape_key_names = shape_key_names_per_object.get(setup_names["geo_name"], [])
+        shape_key_names_by_category = {}
+        for sk_name in shape_key_names:
+            for category_name in convert_module.get_shape_key_category_names(sk_name):
+                shape_key_names_by_category.setdefault(category_name, []).append(sk_name)
+        category_names = [name for name, sk_names in shape_key_names_by_category.items()
+                          if f"{name} - Neutral" in sk_names]
+
+        problems = []
+        if setup_names["geo_name"] not in object_names:
+            problems.append(f"Model/character mesh named '{setup_names['geo_name']}' not found")
+        for collection_name in (setup_names["wgts_collection_name"], setup_names["thumbs_collection_name"]):
+            if collection_name not in collection_names:
+                problems.append(f"Missing collection named '{collection_name}'")
+        for category_name in category_names:
+            problem = convert_module.find_category_problem(
+                category_name, shape_key_names_by_category[category_name], object_names)
+            if problem:
+                problems.append(problem)
+
+        characters.append({
+            "character": character_name,
+            "categories": category_names,
+            "problems": problems,
+        })
+
+    # Conversion parameters, when it's clear what to convert.
+    params = None
+    convertible_characters = [c for c in characters if c["categories"] and not c["problems"]]
+    if len(characters) == 1 and convertible_characters:
+        params = {
+            "character": convertible_characters[0]["character"],
+            "categories": convertible_characters[0]["categories"],
+        }
+
+    return {
+        "file": file_path,
+        "status": "sks" if cursor_objects or selector_collections else "no_sks",
+        "errors": [],
+        "characters": characters,
+        "cursor_objects": len(cursor_objects),
+        "label_curves": len(label_curves),
+        "selector_collections": len(selector_collections),
+        "params": params,
+    }
+
+
+def main_worker(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", action="store_true")
+    parser.add_argument("--files", required=True)
+    parser.add_argument("--result", required=True)
+    args = parser.parse_args(argv)
+
+    with open(args.files) as f:
+        file_paths = json.load(f)
+
+    # Only the detection rules are needed, the add-on doesn't need to be registered.
+    convert_module = batch_migrate.import_addon().src.convert_sks_to_skw_rig
+
+    entries = []
+    for file_path in file_paths:
+        start_time = time.perf_counter()
+        try:
+            entry = scan_file(convert_module, file_path)
+        except Exception:
+            traceback.print_exc()
+            entry = make_error_entry(file_path, traceback.format_exc(limit=3))
+        entry["duration"] = time.perf_counter() - start_time
+        entries.append(entry)
+
+        # Write as it goes, so that a crash only loses the file being scanned.
+        with open(args.result, "w") as f:
+            json.dump(entries, f, indent=2)
+
+
+if __name__ == "__main__":
+    script_args = get_script_args()
+    if "--worker" in script_args:
+        main_worker(script_args)
+    else:
+        sys.exit(main_runner(script_args))
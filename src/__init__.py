@@ -4,12 +4,22 @@
 if "convert_sks_to_skw_rig" in locals():
     import importlib
     importlib.reload(convert_sks_to_skw_rig)
+    importlib.reload(api)
+    importlib.reload(sync)
+    importlib.reload(previews)
+    importlib.reload(thumbnails)
+    importlib.reload(delta_thumbnails)
     importlib.reload(data)
     importlib.reload(ops)
     importlib.reload(ui)
     importlib.reload(utils)
 else:
     from . import convert_sks_to_skw_rig
+    from . import api
+    from . import sync
+    from . import previews
+    from . import thumbnails
+    from . import delta_thumbnails
     from . import data
     from . import ops
     from . import ui
@@ -0,0 +1,460 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Python API to build, update and remove shape key widgets on a rig, for scripts and other add-ons
+
+Works on the given datablocks, not on the active object or the selection, so it can run
+in background mode and in loops over many characters. e.g.:
+
+    from shape_keys_widget.src import api
+
+    rig = bpy.data.objects["RIG-claudia"]
+    mesh_obj = bpy.data.objects["GEO-claudia-head"]
+    # From the categories of the mesh, as set up in the Properties Editor.
+    stats = api.build_widgets(rig, mesh_obj, api.get_category_widget_specs(mesh_obj.data))
+    # Or from explicit lists of shape key names.
+    spec = api.make_widget_spec("Mouth", ["Basis", "Mouth - Smile.L", "Mouth - Smile.R"], num_cols=3)
+    api.update_widgets(rig, mesh_obj, [spec])
+    api.remove_widgets(rig, mesh_obj, ["Mouth"])
+
+A widget is described by a spec dict, see make_widget_spec().
+The widget bones, properties and drivers are the same as made by the conversion from SKS,
+with the thumbnail bones placed in a grid of 'num_cols' columns under the category label.
+The rig needs to be in the view layer: creating and removing bones needs Edit Mode, which is
+entered for the rig only and only when bones need to change. The mode of the rig is restored after.
+"""
+
+import logging
+from contextlib import contextmanager
+
+import bpy
+from mathutils import Vector
+
+from . import convert_sks_to_skw_rig as rigging
+
+log = logging.getLogger(__package__)
+
+
+# Size of a thumbnail. The widget bones snap to increments of it and the
+# cursor influence fades to 0 at this distance from a thumbnail center.
+THUMBNAIL_SIZE = 0.1
+
+# Location of the first widget, when neither the spec nor a previous build gives one.
+DEFAULT_WIDGET_LOCATION = (1.0, 0.0, 1.0)
+
+
+def make_widget_spec(name, shape_key_names, neutral_key_name="Basis", is_mirrored=None, num_cols=5,
+                     location=None):
+    """Return the description of a widget, from explicit lists of shape key names
+
+    In mirrored widgets, shape keys ending in '.L' and '.R' share a thumbnail and are driven by
+    the left and right cursors. When is_mirrored is None, the widget is mirrored if most of the
+    shape keys are '.L' or '.R' keys. Otherwise, each shape key has its own thumbnail.
+    The location of the category label, in rig space, is kept from a previous build if not given.
+    """
+
+    if is_mirrored is None:
+        num_mirrored_keys = len([sk for sk in shape_key_names if sk.endswith(".L") or sk.endswith(".R")])
+        is_mirrored = num_mirrored_keys > len(shape_key_names) * 0.5
+
+    # One thumbnail per L/R pair of mirrored widgets, in the given order.
+    # (a dict keeps the order and finds the pairs in constant time, for categories with many keys)
+    shape_key_base_names = list(dict.fromkeys(
+        sk_name[:-2] if is_mirrored and (sk_name.endswith(".L") or sk_name.endswith(".R")) else sk_name
+        for sk_name in shape_key_names))
+
+    return {
+        'name': name,
+        'shape_key_base_names': shape_key_base_names,
+        'neutral_key_name': neutral_key_name,
+        'is_mirrored': is_mirrored,
+        'num_cols': max(num_cols, 1),
+        'location': tuple(location) if location is not None else None,
+    }
+
+
+def get_category_widget_spec(category):
+    """Return the description of the widget of a ShapeKeysWidgetCategory"""
+    # The shape keys of mirrored categories are already stored without '.L' and '.R'.
+    return make_widget_spec(category.widget_name, [sk.shape_key_name for sk in category.shape_keys],
+                            category.neutral_key_name, category.is_mirrored, category.num_cols)
+
+
+def get_category_widget_specs(mesh):
+    """Return the description of the widgets of all the categories of a mesh"""
+    return [get_category_widget_spec(category) for category in mesh.shape_key_cats]
+
+
+def get_widget_categories(widget_specs):
+    """Return the specs as the (category name, shape key base names, has L/R keys) used by the rigging stages"""
+    return [(spec['name'], spec['shape_key_base_names'], spec['is_mirrored']) for spec in widget_specs]
+
+
+def get_wgts_collection_name(rig):
+    return f"{rig.name}-widgets"
+
+
+def get_grid_bone_layout(rig, widget_specs, parent_name):
+    """Return the (bone name, parent name, head, tail) of each widget bone, parents first
+
+    The thumbnail bones are in a grid under the category base bone, in rows of 'num_cols'.
+    The cursor bones are placed on the thumbnail of the neutral key, or the first one.
+    New widgets without a location go to the right of the widgets already on the rig.
+    """
+
+    bones = rig.data.bones
+    bone_layout = []
+    # Widgets without a location go side by side, to not overlap, also with the widgets that are
+    # already on the rig and not given here, e.g. when a category is added after the build.
+    next_location = Vector(DEFAULT_WIDGET_LOCATION)
+    widget_bone_xs = [bone.head_local.x for bone in bones if bone.name.startswith("SKS-")]
+    if widget_bone_xs:
+        next_location.x = max(next_location.x, max(widget_bone_xs) + 2 * THUMBNAIL_SIZE)
+
+    for spec in widget_specs:
+        sk_category_name = spec['name']
+        shape_key_base_names = spec['shape_key_base_names']
+        num_cols = spec['num_cols']
+
+        base_bone_name = rigging.get_sk_category_base_bone_name(sk_category_name)
+        base_bone = bones.get(base_bone_name)
+        if spec['location'] is not None:
+            base_pos = Vector(spec['location'])
+        elif base_bone:
+            # Preserve the position of a previous build, which might have been moved by the user.
+            base_pos = base_bone.head_local.copy()
+        else:
+            base_pos = next_location.copy()
+        next_location.x = max(next_location.x, base_pos.x + (num_cols + 1) * THUMBNAIL_SIZE)
+        bone_layout.append((base_bone_name, parent_name, base_pos, base_pos + Vector((0, 0, 0.05))))
+
+        thumb_positions = [
+            base_pos + Vector(((i % num_cols) * THUMBNAIL_SIZE, 0, -(i // num_cols + 1) * THUMBNAIL_SIZE))
+            for i in range(len(shape_key_base_names))]
+
+        # Cursor bones.
+        # (before the thumbnails so it looks nice in the outliner)
+        if spec['neutral_key_name'] in shape_key_base_names:
+            cursor_pos = thumb_positions[shape_key_base_names.index(spec['neutral_key_name'])]
+        else:
+            cursor_pos = base_pos + Vector((0, 0, -THUMBNAIL_SIZE))
+        for cursor_type in ['.L', '.R'] if spec['is_mirrored'] else ['']:
+            cursor_bone_name = rigging.get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
+            bone_layout.append((cursor_bone_name, base_bone_name, cursor_pos + Vector((0, 0, -0.05)), cursor_pos))
+
+        # Bones for each shape key thumbnail.
+        for sk_name, pos in zip(shape_key_base_names, thumb_positions):
+            bone_layout.append((rigging.get_sk_bone_name(sk_category_name, sk_name), base_bone_name,
+                                pos + Vector((0, 0, -0.05)), pos))
+
+    return bone_layout
+
+
+@contextmanager
+def rig_mode(rig, mode, profile):
+    """Switch the rig to the given mode, regardless of the active object, and back to its mode after"""
+
+    # mode_set is the only way into Edit Mode, so run it with the rig as the context object.
+    with bpy.context.temp_override(active_object=rig, object=rig,
+                                   selected_objects=[rig], selected_editable_objects=[rig]):
+        original_mode = rig.mode
+        if original_mode != mode:
+            profile.call_operator(bpy.ops.object.mode_set, mode=mode)
+        try:
+            yield
+        finally:
+            # Leaving Edit Mode writes the edit bones to the armature and rebuilds the pose.
+            if rig.mode != original_mode:
+                profile.call_operator(bpy.ops.object.mode_set, mode=original_mode)
+
+
+def find_key_block(shape_keys, data_path):
+    """Return the shape key of a 'key_blocks["name"]...' data path of the Key, if it exists"""
+    try:
+        return shape_keys.path_resolve(data_path.rsplit('.', 1)[0])
+    except ValueError:
+        return None
+
+
+def get_key_block_name(data_path):
+    """Return the name of the shape key in a 'key_blocks["name"]...' data path"""
+    return data_path[len('key_blocks["'):].split('"]', 1)[0]
+
+
+def get_shape_key_value_driver_layout(rig, shape_keys, widget_specs, use_compact_drivers, use_influence_props):
+    """Return the drivers of the rigging stages for the widgets. Raises ValueError for missing shape keys"""
+
+    driver_layout = []
+    missing_key_names = []
+    # The neutral key of each widget, which is never mirrored.
+    neutral_key_names = {spec['name']: spec['neutral_key_name'] for spec in widget_specs}
+    for id_data, data_path, index, spec in rigging.get_sk_value_driver_layout(
+            rig, shape_keys, get_widget_categories(widget_specs), use_compact_drivers, use_influence_props,
+            neutral_key_names):
+        if id_data == shape_keys:
+            key_block = find_key_block(shape_keys, data_path)
+            if key_block is None:
+                missing_key_names.append(get_key_block_name(data_path))
+                continue
+            # The reference key has no value to drive.
+            if key_block == shape_keys.reference_key:
+                continue
+        driver_layout.append((id_data, data_path, index, spec))
+
+    if missing_key_names:
+        names_str = ', '.join(f"'{n}'" for n in missing_key_names)
+        raise ValueError(f"Shape keys not found on '{shape_keys.user.name}': {names_str}")
+    return driver_layout
+
+
+def build_widgets(rig, mesh_obj, widget_specs, wgts_collection=None, parent_bone_name=None,
+                  incremental=False, use_compact_drivers=False):
+    """Build the widgets on the rig, driving the shape keys of the mesh. Returns the ConversionStats
+
+    Existing widget bones, properties and drivers are replaced, unless incremental,
+    in which case only what differs is changed. See update_widgets().
+    The widget shapes go in wgts_collection, by default a '<rig>-widgets' collection, made
+    in the collection of the rig if needed. The bones are parented to the rig's 'root' bone
+    by default, if it has one.
+    Raises ValueError, before changing anything, if shape keys of the widgets don't exist.
+    """
+
+    shape_keys = mesh_obj.data.shape_keys
+    if not shape_keys:
+        raise ValueError(f"Mesh '{mesh_obj.name}' has no shape keys to drive")
+    if parent_bone_name is None:
+        parent_bone_name = "root" if "root" in rig.data.bones else ""
+
+    stats = rigging.ConversionStats()
+    # Only logged for debugging.
+    profile = rigging.ConversionProfile(enabled=log.isEnabledFor(logging.DEBUG))
+    categories = get_widget_categories(widget_specs)
+    category_names = [spec['name'] for spec in widget_specs]
+    use_influence_props = not use_compact_drivers
+    call_stage = profile.call_stage
+
+    # Checked first, so that nothing changes when shape keys are missing.
+    driver_layout = call_stage(get_shape_key_value_driver_layout, rig, shape_keys, widget_specs,
+                               use_compact_drivers, use_influence_props)
+
+    # The widget shapes.
+    if wgts_collection is None:
+        wgts_collection = bpy.data.collections.get(get_wgts_collection_name(rig))
+        if not wgts_collection:
+            wgts_collection = bpy.data.collections.new(get_wgts_collection_name(rig))
+            rig.users_collection[0].children.link(wgts_collection)
+    datablocks = call_stage(rigging.DatablockIndex, mesh_obj.name)
+    call_stage(rigging.setup_wgt_objects_and_collection, wgts_collection.name, category_names,
+               datablocks, stats, profile, incremental)
+
+    # The bones, in a single Edit Mode session, skipped when they are all up-to-date.
+    bone_layout = call_stage(get_grid_bone_layout, rig, widget_specs, parent_bone_name)
+    if incremental and not call_stage(rigging.find_outdated_bones, rig, bone_layout):
+        stats.record('bones', 'UNTOUCHED', len(bone_layout))
+    else:
+        with rig_mode(rig, 'EDIT', profile):
+            call_stage(rigging.create_bones, rig, bone_layout, stats, incremental)
+    call_stage(rigging.move_bones_to_layer, rig)
+
+    # The pose bones and drivers, which don't need a mode.
+    call_stage(rigging.add_bone_custom_properties, rig, categories, stats, incremental, use_influence_props)
+    call_stage(remove_stale_custom_properties, rig, categories, stats, use_influence_props)
+    call_stage(rigging.setup_bone_custom_shapes, rig, categories, stats)
+    call_stage(rigging.setup_bones_movement, rig, categories, stats, incremental)
+    for id_data, data_path, index, spec in driver_layout:
+        rigging.apply_driver_spec(id_data, data_path, index, spec, stats, incremental)
+
+    log.debug(f"Built widgets {category_names} on '{rig.name}': {stats.summary()}\n{profile.details()}")
+    return stats
+
+
+def update_widgets(rig, mesh_obj, widget_specs, **options):
+    """Update the widgets on the rig, changing only what differs. Returns the ConversionStats
+
+    Keeps keyframes and custom values of the widgets that are already up-to-date.
+    Takes the same options as build_widgets().
+    """
+    return build_widgets(rig, mesh_obj, widget_specs, incremental=True, **options)
+
+
+def get_pose_bone_name(data_path):
+    """Return the name of the pose bone in a 'pose.bones["name"]...' data path, if it is one"""
+    prefix = 'pose.bones["'
+    if not data_path.startswith(prefix):
+        return None
+    return data_path[len(prefix):].split('"]', 1)[0]
+
+
+def get_widget_bone_names(widget_spec):
+    """Return the names of the bones of a widget, from its spec only"""
+    sk_category_name = widget_spec['name']
+    cursor_bone_name = rigging.get_sk_category_cursor_bone_name(sk_category_name)
+    return ({rigging.get_sk_category_base_bone_name(sk_category_name)} |
+            {cursor_bone_name + cursor_type for cursor_type in (['.L', '.R'] if widget_spec['is_mirrored'] else [''])} |
+            {rigging.get_sk_bone_name(sk_category_name, sk_name) for sk_name in widget_spec['shape_key_base_names']})
+
+
+def get_widgets_bone_names(widget_specs):
+    """Return the names of the bones of all the widgets, from their specs only"""
+    return set().union(*(get_widget_bone_names(widget_spec) for widget_spec in widget_specs))
+
+
+def find_thumbnail_objects(rig, bone_names):
+    """Return the objects following one of the bones with an armature constraint, as thumbnails do"""
+    return [ob for ob in bpy.data.objects
+            if any(con.type == 'ARMATURE' and any(target.target == rig and target.subtarget in bone_names
+                                                  for target in con.targets)
+                   for con in ob.constraints)]
+
+
+def get_driver_bone_names(rig, fcurve):
+    """Return the names of the rig bones that a driver is on or reads from"""
+    bone_names = {get_pose_bone_name(fcurve.data_path)} if fcurve.id_data == rig else set()
+    for var in fcurve.driver.variables:
+        for target in var.targets:
+            if target.id == rig:
+                bone_names.add(target.bone_target)
+                bone_names.add(get_pose_bone_name(target.data_path))
+    bone_names.discard(None)
+    bone_names.discard("")
+    return bone_names
+
+
+def find_dangling_drivers(rig, id_datas):
+    """Return the (ID name, data path) of the drivers on or reading from bones that the rig doesn't have"""
+
+    bones = rig.data.bones
+    dangling_drivers = []
+    for id_data in id_datas:
+        anim_data = id_data.animation_data if id_data else None
+        if not anim_data:
+            continue
+        for fcurve in anim_data.drivers:
+            if any(bone_name not in bones for bone_name in get_driver_bone_names(rig, fcurve)):
+                dangling_drivers.append((id_data.name, fcurve.data_path))
+    return dangling_drivers
+
+
+def remove_widget_bones(rig, mesh_obj, bone_names, stats, profile):
+    """Remove the bones and everything that belongs to them, in a single pass over each kind of data
+
+    That is their custom properties, their drivers, the drivers reading from them and the thumbnail
+    objects following them. The shape keys that were driven by the bones are reset to 0.
+    """
+
+    bone_names = {bone_name for bone_name in bone_names if bone_name in rig.data.bones}
+    if not bone_names:
+        return
+
+    # Drivers.
+    shape_keys = mesh_obj.data.shape_keys
+    for id_data in (rig, shape_keys):
+        anim_data = id_data.animation_data if id_data else None
+        if not anim_data:
+            continue
+        for fcurve in [fcurve for fcurve in anim_data.drivers
+                       if not get_driver_bone_names(rig, fcurve).isdisjoint(bone_names)]:
+            data_path = fcurve.data_path
+            anim_data.drivers.remove(fcurve)
+            stats.record('drivers', 'REMOVED')
+            if id_data == shape_keys and data_path.endswith('.value'):
+                key_block = find_key_block(shape_keys, data_path)
+                if key_block is not None:
+                    key_block.value = 0.0
+
+    # Thumbnails, with their mesh and material if nothing else uses them.
+    thumb_objs = find_thumbnail_objects(rig, bone_names)
+    if thumb_objs:
+        orphan_candidates = rigging.gather_orphan_candidates(thumb_objs)
+        bpy.data.batch_remove(thumb_objs)
+        stats.record('thumbnails', 'REMOVED', len(thumb_objs))
+        bpy.data.batch_remove([c for c in orphan_candidates if c.users == 0])
+
+    # The bones, with their custom properties.
+    with rig_mode(rig, 'EDIT', profile):
+        edit_bones = rig.data.edit_bones
+        for bone_name in bone_names:
+            edit_bones.remove(edit_bones[bone_name])
+            stats.record('bones', 'REMOVED')
+
+    # Anything left reading from the removed bones would be evaluated on every frame for nothing.
+    for id_name, data_path in find_dangling_drivers(rig, (rig, shape_keys)):
+        log.warning(f"Driver on or reading from a missing widget bone: '{id_name}' {data_path}")
+
+
+def remove_stale_custom_properties(rig, categories, stats, use_influence_props):
+    """Remove the widget properties of cursors that the widget no longer has, e.g. after unmirroring it"""
+
+    props_to_set, _props_to_remove = rigging.get_bone_custom_property_layout(categories, use_influence_props)
+    prop_names_by_bone = {}
+    for bone_name, prop_name, _value, _ui_data in props_to_set:
+        prop_names_by_bone.setdefault(bone_name, set()).add(prop_name)
+
+    pose_bones = rig.pose.bones
+    for sk_category_name, shape_key_base_names, _has_lr_keys in categories:
+        for sk_name in shape_key_base_names:
+            bone_name = rigging.get_sk_bone_name(sk_category_name, sk_name)
+            pose_bone = pose_bones.get(bone_name)
+            if not pose_bone:
+                continue
+            for prop_name in list(pose_bone.keys()):
+                if prop_name.startswith("cursor_influence") and prop_name not in prop_names_by_bone.get(bone_name, ()):
+                    rigging.remove_custom_property(pose_bone, prop_name, stats)
+
+
+def remove_label_widgets(widget_names, stats):
+    # Only the category labels. Other widgets might still use the cursor and thumbnail shapes.
+    for widget_name in widget_names:
+        label_obj = bpy.data.objects.get(rigging.get_wgt_category_obj_name(widget_name))
+        if label_obj:
+            label_data = label_obj.data
+            bpy.data.objects.remove(label_obj)
+            if label_data and label_data.users == 0:
+                bpy.data.curves.remove(label_data)
+            stats.record('widgets', 'REMOVED')
+
+
+def remove_widgets(rig, mesh_obj, widget_names, kept_widget_specs=()):
+    """Remove the bones, properties, drivers, thumbnails and label shapes of the named widgets
+
+    The shape keys driven by the widgets are reset to 0. The shared cursor and thumbnail shapes are kept,
+    and so are the bones of kept_widget_specs, the widgets that stay on the rig, should their names collide.
+    Returns the ConversionStats.
+    """
+
+    stats = rigging.ConversionStats()
+    # Only logged for debugging.
+    profile = rigging.ConversionProfile(enabled=log.isEnabledFor(logging.DEBUG))
+
+    # The widget bones are the category base bones and all their children.
+    bone_names = set()
+    for widget_name in widget_names:
+        base_bone = rig.data.bones.get(rigging.get_sk_category_base_bone_name(widget_name))
+        if base_bone:
+            bone_names.add(base_bone.name)
+            bone_names.update(bone.name for bone in base_bone.children_recursive)
+    bone_names -= get_widgets_bone_names(kept_widget_specs)
+
+    remove_widget_bones(rig, mesh_obj, bone_names, stats, profile)
+    remove_label_widgets(widget_names, stats)
+
+    log.debug(f"Removed widgets {widget_names} from '{rig.name}': {stats.summary()}\n{profile.details()}")
+    return stats
+
+
+def remove_widget_keys(rig, mesh_obj, widget_name, shape_key_base_names, kept_widget_specs=()):
+    """Remove the thumbnail bones of shape keys of a widget, with what belongs to them. Returns the ConversionStats
+
+    The rest of their widget is kept. Update the widget after, to close the gap in its grid.
+    The bones of kept_widget_specs, the widgets that stay on the rig, are kept should their names collide.
+    """
+
+    stats = rigging.ConversionStats()
+    # Only logged for debugging.
+    profile = rigging.ConversionProfile(enabled=log.isEnabledFor(logging.DEBUG))
+    bone_names = {rigging.get_sk_bone_name(widget_name, sk_name) for sk_name in shape_key_base_names}
+    bone_names -= get_widgets_bone_names(kept_widget_specs)
+    remove_widget_bones(rig, mesh_obj, bone_names, stats, profile)
+
+    log.debug(f"Removed keys {shape_key_base_names} from '{rig.name}': {stats.summary()}\n{profile.details()}")
+    return stats
@@ -1,11 +1,15 @@
 # SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
 # SPDX-License-Identifier: GPL-3.0
 
+import hashlib
+import json
 import logging
-from math import radians
+import time
+from contextlib import contextmanager
+from math import cos, pi, radians, sin
 
 import bpy
-from bpy.props import StringProperty
+from bpy.props import BoolProperty, EnumProperty, StringProperty
 from bpy.types import Operator
 from mathutils import Vector, Matrix
 
@@ -27,6 +31,16 @@ log = logging.getLogger(__package__)
 # This is what gets generated for the Blender bones and objects as seen in the outliner.
 # Change as desired for the result.
 
+def get_character_setup_names(character_name):
+    """Return the names of the rig, mesh and collections of a character setup with SKS"""
+    return {
+        'rig_name': f"RIG-{character_name}",
+        'geo_name': f"GEO-{character_name}-head",
+        'thumbs_collection_name': f"{character_name}-rig-widgets-thumbnails",
+        'wgts_collection_name': f"{character_name}-rig-widgets",
+    }
+
+
 def get_bone_collection_name():
     return "Shake Key Widgets"
 
@@ -39,8 +53,13 @@ def get_sk_category_cursor_bone_name(sk_category_name):
     return f"SKS-{slugify_name(sk_category_name)}-cursor"
 
 
-def get_sk_bone_name(sk_name):
-    return f"SKS-{slugify_name(sk_name)}"
+def get_sk_bone_name(sk_category_name, sk_name):
+    # Scoped to the category: a shape key in several categories, like 'Basis', has a bone in each.
+    # SKS shape keys are named '<category> - <key>', which gives the same 'SKS-<category>-<key>'.
+    prefix = f"{sk_category_name} - "
+    if sk_name.startswith(prefix):
+        sk_name = sk_name[len(prefix):]
+    return f"SKS-{slugify_name(sk_category_name)}-{slugify_name(sk_name)}"
 
 
 def get_sk_thumb_obj_name(sk_name):
@@ -71,14 +90,283 @@ def slugify_name(name):
 # This script needs to access one or the other depending on the Blender version.
 USE_BONE_COLLECTIONS = bpy.app.version[0] >= 4
 
+# Distance under which two locations are considered the same, when comparing
+# what is already in the file with the desired result of the conversion.
+LOCATION_TOLERANCE = 1e-5
+
+
+class ConversionStats:
+    """Tally of what a conversion created, updated or left untouched, per kind of data"""
+
+    STATES = ('CREATED', 'UPDATED', 'UNTOUCHED', 'REMOVED')
+
+    def __init__(self):
+        # e.g.: {'bones': {'CREATED': 2, 'UPDATED': 1, 'UNTOUCHED': 30}, 'drivers': {...}}
+        self.counts = {}
+
+    def record(self, kind, state, amount=1):
+        kind_counts = self.counts.setdefault(kind, dict.fromkeys(self.STATES, 0))
+        kind_counts[state] += amount
+
+    def total(self, state):
+        return sum(kind_counts[state] for kind_counts in self.counts.values())
+
+    def summary(self):
+        summary = (f"{self.total('CREATED')} created, {self.total('UPDATED')} updated, "
+                   f"{self.total('UNTOUCHED')} untouched")
+        if self.total('REMOVED'):
+            summary += f", {self.total('REMOVED')} removed"
+        return summary
+
+    def details(self):
+        lines = []
+        for kind, kind_counts in self.counts.items():
+            counts_str = ', '.join(f"{num} {state.lower()}" for state, num in kind_counts.items())
+            lines.append(f"{kind}: {counts_str}")
+        return '\n'.join(lines)
+
+
+class ConversionProfile:
+    """Wall time of the conversion steps and stages, and counts of the costly operations
+
+    Steps are what the conversion runs one after the other (e.g. one per category), and
+    stages the functions within them. Datablocks created and removed are counted per step.
+    When disabled, nothing is timed nor counted, for callers that don't report the profile.
+    """
+
+    # bpy.data collections whose datablocks the conversion creates or removes.
+    DATABLOCK_TYPES = ('objects', 'meshes', 'curves', 'collections')
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.steps = []  # [{'label': ..., 'seconds': ..., 'datablocks': {...}}]
+        # e.g.: {'create_bones': {'calls': 1, 'seconds': 0.2}}
+        self.stages = {}
+        # e.g.: {'mode switches': 2, 'operator calls': 3, 'object.mode_set': 2}
+        self.counts = {}
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    @staticmethod
+    def get_datablock_uids():
+        return {type_name: {id_data.session_uid for id_data in getattr(bpy.data, type_name)}
+                for type_name in ConversionProfile.DATABLOCK_TYPES}
+
+    @contextmanager
+    def step(self, label):
+        # Counting the datablocks goes through all of them, twice per step.
+        if not self.enabled:
+            yield
+            return
+        uids_before = self.get_datablock_uids()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            uids_after = self.get_datablock_uids()
+            datablocks = {}
+            for type_name in self.DATABLOCK_TYPES:
+                created = len(uids_after[type_name] - uids_before[type_name])
+                removed = len(uids_before[type_name] - uids_after[type_name])
+                if created or removed:
+                    datablocks[type_name] = {'created': created, 'removed': removed}
+            self.steps.append({'label': label, 'seconds': seconds, 'datablocks': datablocks})
+
+    def call_stage(self, function, *args, **kwargs):
+        """Call a conversion function, timing it as the stage of the same name"""
+
+        if not self.enabled:
+            return function(*args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stage = self.stages.setdefault(function.__name__, {'calls': 0, 'seconds': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += time.perf_counter() - start_time
+
+    def call_operator(self, operator, **kwargs):
+        # Operators can be slow on big files, e.g. switching to Edit Mode rebuilds the armature.
+        if self.enabled:
+            idname = operator.idname_py()
+            self.count('operator calls')
+            self.count(idname)
+            if idname == 'object.mode_set':
+                self.count('mode switches')
+        return operator(**kwargs)
+
+    def total_seconds(self):
+        return sum(step['seconds'] for step in self.steps)
+
+    def get_slowest_stage(self):
+        if not self.stages:
+            return None, 0.0
+        name = max(self.stages, key=lambda n: self.stages[n]['seconds'])
+        return name, self.stages[name]['seconds']
+
+    def summary(self):
+        summary = f"{self.total_seconds():.2f}s"
+        slowest_stage_name, seconds = self.get_slowest_stage()
+        if slowest_stage_name:
+            summary += f" (slowest: {slowest_stage_name} {seconds:.2f}s)"
+        return summary
+
+    def details(self):
+        lines = [f"Conversion took {self.total_seconds():.3f}s"]
+        for step in self.steps:
+            datablocks_str = ', '.join(f"{type_name} +{num['created']} -{num['removed']}"
+                                       for type_name, num in step['datablocks'].items())
+            lines.append(f"  {step['label']}: {step['seconds']:.3f}s" +
+                         (f" ({datablocks_str})" if datablocks_str else ""))
+        lines.append("Stages:")
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"  {name}: {stage['seconds']:.3f}s in {stage['calls']} calls")
+        if self.counts:
+            lines.append(', '.join(f"{num} {name}" for name, num in self.counts.items()))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {
+            'seconds': self.total_seconds(),
+            'steps': self.steps,
+            'stages': self.stages,
+            'counts': self.counts,
+        }
+
+
+# --- Shape Key Selector V1 detection rules ---
+# How the SKS data is recognized in a file. Shared by the conversion and the
+# inventory scanner (scripts/scan_sks_inventory.py), which only sees datablock names.
+
+def is_sks_cursor_object_name(name):
+    return name.startswith("Selector Icon")
+
+
+def is_sks_label_curve_name(name):
+    # Matching the naming convention as additional security, since these will be removed.
+    return name.startswith('Text')
+
+
+def is_sks_selector_collection_name(name):
+    return "Selectors" in name
+
+
+def get_shape_key_category_names(sk_name):
+    """Return the categories of a shape key following the 'Category - Name' convention
+
+    Names with several ' - ' are listed under each prefix.
+    """
+    category_names = []
+    sep_idx = sk_name.find(' - ')
+    while sep_idx != -1:
+        category_names.append(sk_name[:sep_idx])
+        sep_idx = sk_name.find(' - ', sep_idx + 1)
+    return category_names
+
+
+def find_category_problem(sk_category_name, shape_key_names, object_names):
+    """Return a description of the first problem with the shape keys and thumbnails of a category
+
+    object_names only needs to support 'in', e.g. a set of names or a dict by name.
+    """
 
-def find_shape_keys(mesh_name, category_name):
-    shape_keys = bpy.data.objects[mesh_name].data.shape_keys.key_blocks
-    filtered_shape_key_names = []
-    for key in shape_keys:
-        if key.name.startswith(category_name + ' - '):
-            filtered_shape_key_names.append(key.name)
-    return filtered_shape_key_names
+    shape_key_names = sorted(shape_key_names)
+    if not shape_key_names:
+        return f"Mesh does not have any Shape Keys for category '{sk_category_name}'"
+
+    # Check for the 'Neutral' Shape Key.
+    neutral_sk_name = f"{sk_category_name} - Neutral"
+    if neutral_sk_name not in shape_key_names:
+        return f"Mesh does not have a Shape Key called '{neutral_sk_name}'"
+
+    # Match L and R shapes if they exist.
+    l_sk_names = [sk for sk in shape_key_names if sk.endswith(".L")]
+    r_sk_names = [sk for sk in shape_key_names if sk.endswith(".R")]
+    global_sk_names = [sk for sk in shape_key_names if not sk.endswith(".L") and not sk.endswith(".R")]
+    has_lr_keys = (len(l_sk_names) > 0 or len(r_sk_names) > 0)
+
+    if has_lr_keys:
+        if len(l_sk_names) != len(r_sk_names) or len(global_sk_names) > 1:
+            return (f"Mesh has mismatched shape keys for '{sk_category_name}'\n"
+                    f"Category needs 1 'Neutral' and all others (or none) ending with '.L' and '.R'.\n"
+                    f"Found: {len(global_sk_names)} global, {len(l_sk_names)} .L, {len(r_sk_names)} .R")
+
+        for lname, rname in zip(l_sk_names, r_sk_names):
+            if lname[:-2] != rname[:-2]:
+                return (f"Mesh has mismatched shape keys for '{sk_category_name}'\n"
+                        f"Shapes ending with '.L' and '.R' need to match in name.\n"
+                        f"'{lname}' ≠ '{rname}'")
+
+    # Look for a thumbnail object matching each shape key (1 for each L/R pair).
+    sk_base_names = global_sk_names
+    if has_lr_keys:
+        sk_base_names += [sk[:-2] for sk in l_sk_names]
+
+    for sk_name in sk_base_names:
+        if get_sk_thumb_obj_name(sk_name) not in object_names:
+            return f"File does not have an already existing thumbnail object called '{sk_name}'"
+
+    return None
+
+
+class DatablockIndex:
+    """Lookups into the datablocks of the file, built once per conversion run
+
+    The conversion needs to find shape keys, thumbnails and the SKS leftovers for each category.
+    Scanning bpy.data for each category and again in each stage grows with
+    categories × datablocks, so the index is built with a single pass over each bpy.data
+    collection and shared by the validation and all the conversion stages.
+    Note: datablocks removed after the index was built are not removed from it.
+    """
+
+    def __init__(self, mesh_name):
+        self.objects_by_name = {}
+        # FONT objects named after their text, as SKS made them for the category labels.
+        self.sks_text_objects_by_body = {}
+        # Objects of the SKS cursors.
+        self.selector_icon_objects = []
+        for ob in bpy.data.objects:
+            self.objects_by_name[ob.name] = ob
+            if ob.type == 'FONT' and ob.name == ob.data.body:
+                self.sks_text_objects_by_body.setdefault(ob.data.body, []).append(ob)
+            if is_sks_cursor_object_name(ob.name):
+                self.selector_icon_objects.append(ob)
+
+        # Text datablocks of the SKS category labels.
+        self.sks_text_curves_by_body = {}
+        for curve in bpy.data.curves:
+            if isinstance(curve, bpy.types.TextCurve) and is_sks_label_curve_name(curve.name):
+                self.sks_text_curves_by_body.setdefault(curve.body, []).append(curve)
+
+        # Generated meshes of the bone custom shapes, by the signature of their shape.
+        self.widget_meshes_by_signature = {mesh[WIDGET_SHAPE_SIGNATURE_PROP]: mesh for mesh in bpy.data.meshes
+                                           if WIDGET_SHAPE_SIGNATURE_PROP in mesh}
+
+        # Collections that SKS made to hold its objects, to remove once they are empty.
+        self.selector_collections = [c for c in bpy.data.collections
+                                     if is_sks_selector_collection_name(c.name)]
+
+        # Shape keys of the mesh, by name and by category.
+        self.key_blocks_by_name = {}
+        self.shape_key_names_by_category = {}
+        self.shape_keys = None
+        mesh_obj = self.objects_by_name.get(mesh_name)
+        if mesh_obj and mesh_obj.type == 'MESH' and mesh_obj.data.shape_keys:
+            self.shape_keys = mesh_obj.data.shape_keys
+            for key in self.shape_keys.key_blocks:
+                self.key_blocks_by_name[key.name] = key
+                for category_name in get_shape_key_category_names(key.name):
+                    self.shape_key_names_by_category.setdefault(category_name, []).append(key.name)
+
+    def find_shape_keys(self, category_name):
+        """Return the names of the shape keys in the category, in the mesh's order"""
+        return list(self.shape_key_names_by_category.get(category_name, []))
+
+
+def is_same_location(loc_a, loc_b):
+    return (Vector(loc_a) - Vector(loc_b)).length < LOCATION_TOLERANCE
 
 
 def nuke_existing_and_make_new_bone(edit_bones, bone_name):
@@ -103,6 +391,10 @@ def lock_transform(ob, lock_also_x_and_y=False):
 
 
 def move_to_collection(ob, collection):
+    # Nothing to do if the object is only in the given collection already.
+    if tuple(ob.users_collection) == (collection,):
+        return
+
     # Remove the object from the collections that it is already into.
     for col in ob.users_collection:
         col.objects.unlink(ob)
@@ -111,96 +403,212 @@ def move_to_collection(ob, collection):
     collection.objects.link(ob)
 
 
-def create_bones(rig, sk_category_name, shape_key_base_names, has_lr_keys):
+def gather_category_widgets(datablocks, category_names):
+    """Return the (category name, shape key base names, has L/R keys) for each category"""
+
+    categories = []
+    for sk_category_name in category_names:
+        # Gather the set of thumbnail and shape key names to configure the widget.
+        shape_key_names = datablocks.find_shape_keys(sk_category_name)
+        l_sk_names = [sk for sk in shape_key_names if sk.endswith(".L")]
+        global_sk_names = [sk for sk in shape_key_names if not sk.endswith(".L") and not sk.endswith(".R")]
+
+        # Prepare set of shape key names matching the thumbnails, by stripping '.L' endings
+        # and having only one base name per pair.
+        has_lr_keys = any(sk.endswith(".L") for sk in shape_key_names)
+        shape_key_base_names = global_sk_names
+        if has_lr_keys:
+            shape_key_base_names += [sk[:-2] for sk in l_sk_names]
+
+        categories.append((sk_category_name, shape_key_base_names, has_lr_keys))
+    return categories
+
+
+# The conversion stages below take the widget data of all categories at once,
+# as gathered by gather_category_widgets.
+# Switching between Object, Edit and Pose Mode rebuilds the armature and the pose,
+# so the stages expect the caller to have set the rig in the right mode beforehand:
+# - create_bones: Edit Mode.
+# - all others: Pose Mode (or Object Mode, for the ones not touching pose bones).
+
+def get_bone_layout(rig, categories, datablocks):
+    """Return the (bone name, parent name, head, tail) of each widget bone, parents first"""
+
+    # Bones are read outside of Edit Mode, so their rest positions are in head_local/tail_local.
+    bones = rig.data.bones
+    bone_layout = []
+
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
+
+        # Make a base bone for the category. The other bones will be parented to this one.
+        base_bone_name = get_sk_category_base_bone_name(sk_category_name)
+        # If the bone already exists from a previous run, preserve its position.
+        base_bone = bones.get(base_bone_name)
+        base_pos = Vector((1.0, 0.0, 1.0))
+        if base_bone:
+            base_pos = base_bone.head_local.copy()
+        else:
+            # Bone does not exist. Get the location of the corresponding SKS text.
+            text_objects = datablocks.sks_text_objects_by_body.get(sk_category_name, [])
+            # Pray we found exactly one object.
+            if len(text_objects) == 1:
+                text_data = text_objects[0].data
+                base_pos = text_objects[0].location + Vector((text_data.offset_x, text_data.offset_y, 0))
+        bone_layout.append((base_bone_name, "root", base_pos, base_pos + Vector((0, 0, 0.05))))
+
+        # Find the Neutral thumbnail position. The cursor bone will be placed here.
+        neutral_thumb_obj = datablocks.objects_by_name.get(get_sk_thumb_obj_name(f"{sk_category_name} - Neutral"))
+        neutral_thumb_pos = neutral_thumb_obj.matrix_world.to_translation()
+
+        # Cursor bones.
+        # (before the thumbnails so it looks nice in the outliner)
+        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+            cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
+            # Place the cursor bones(s) on the Neutral thumbnail.
+            bone_layout.append((cursor_bone_name, base_bone_name,
+                                neutral_thumb_pos + Vector((0, 0, -0.05)), neutral_thumb_pos))
+
+        # Bones for each shape key thumbnail.
+        for sk_name in shape_key_base_names:
+            # Place the bone at the corresponding thumbnail's center coordinates in world space.
+            thumb_obj = datablocks.objects_by_name.get(get_sk_thumb_obj_name(sk_name))
+            pos = thumb_obj.matrix_world.to_translation()
+            bone_layout.append((get_sk_bone_name(sk_category_name, sk_name), base_bone_name,
+                                pos + Vector((0, 0, -0.05)), pos))
+
+    return bone_layout
+
+
+def bone_is_up_to_date(bone, parent_name, head, tail):
+    # Check either an EditBone (in Edit Mode) or a Bone (in Object and Pose Mode).
+    # An empty parent name is for bones without a parent.
+    if isinstance(bone, bpy.types.EditBone):
+        bone_head, bone_tail = bone.head, bone.tail
+    else:
+        bone_head, bone_tail = bone.head_local, bone.tail_local
+
+    return (not bone.use_deform and
+            (bone.parent.name if bone.parent else "") == parent_name and
+            is_same_location(bone_head, head) and
+            is_same_location(bone_tail, tail))
+
+
+def find_outdated_bones(rig, bone_layout):
+    """Return the names of the bones in the layout that are missing or differ in the rig"""
+
+    bones = rig.data.bones
+    outdated_bone_names = []
+    for bone_name, parent_name, head, tail in bone_layout:
+        bone = bones.get(bone_name)
+        if not bone or not bone_is_up_to_date(bone, parent_name, head, tail):
+            outdated_bone_names.append(bone_name)
+    return outdated_bone_names
+
+
+def create_bones(rig, bone_layout, stats, incremental=False):
     # If the bones already exist, delete them and create fresh new ones.
+    # When incremental, keep existing bones and only move the ones that differ.
 
-    # Switch to Edit Mode to add bones.
-    bpy.ops.object.mode_set(mode='EDIT')
     edit_bones = rig.data.edit_bones
 
-    # Make a new base bone for the category. The new bones will be parented to this one.
-    base_bone_name = get_sk_category_base_bone_name(sk_category_name)
-    # If the bone already exists from a previous run, preserve its position.
-    base_bone = edit_bones.get(base_bone_name)
-    base_pos = Vector((1.0, 0.0, 1.0))
-    if base_bone:
-        base_pos = base_bone.head
-    else:
-        # Bone does not exist. Get the location of the corresponding SKS text.
-        text_objects = [t for t in bpy.data.objects
-                        if t.type == 'FONT' and
-                        t.name == sk_category_name and
-                        t.data.body == sk_category_name]
-        # Pray we found exactly one object.
-        if len(text_objects) == 1:
-            text_data = text_objects[0].data
-            base_pos = text_objects[0].location + Vector((text_data.offset_x, text_data.offset_y, 0))
-    base_bone = nuke_existing_and_make_new_bone(edit_bones, base_bone_name)
-    base_bone.use_deform = False
-    base_bone.parent = edit_bones.get("root")
-    base_bone.tail = base_pos + Vector((0, 0, 0.05))
-    base_bone.head = base_pos
-
-    # Find the Neutral thumbnail position. The cursor bone will be placed here.
-    neutral_thumb_obj = bpy.data.objects.get(get_sk_thumb_obj_name(f"{sk_category_name} - Neutral"))
-    neutral_thumb_pos = neutral_thumb_obj.matrix_world.to_translation()
-
-    # Create cursor bones.
-    # (before the thumbnails so it looks nice in the outliner)
-    for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-        cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
-        cursor_bone = nuke_existing_and_make_new_bone(edit_bones, cursor_bone_name)
-        cursor_bone.use_deform = False
-        cursor_bone.parent = base_bone
-
-        # Place the cursor bones(s) on the Neutral thumbnail.
-        cursor_bone.tail = neutral_thumb_pos
-        cursor_bone.head = neutral_thumb_pos + Vector((0, 0, -0.05))
-
-    # Create bones for each shape key thumbnail.
-    for sk_name in shape_key_base_names:
-        new_bone_name = get_sk_bone_name(sk_name)
-        new_bone = nuke_existing_and_make_new_bone(edit_bones, new_bone_name)
-        new_bone.use_deform = False
-        new_bone.parent = base_bone
-
-        # Place the bone at the corresponding thumbnail's center coordinates in world space.
-        thumb_obj = bpy.data.objects.get(get_sk_thumb_obj_name(sk_name))
-        pos = thumb_obj.matrix_world.to_translation()
-        new_bone.tail = pos
-        new_bone.head = pos + Vector((0, 0, -0.05))
+    for bone_name, parent_name, head, tail in bone_layout:
+        bone = edit_bones.get(bone_name)
+
+        if bone and incremental:
+            if bone_is_up_to_date(bone, parent_name, head, tail):
+                stats.record('bones', 'UNTOUCHED')
+                continue
+            stats.record('bones', 'UPDATED')
+        else:
+            stats.record('bones', 'UPDATED' if bone else 'CREATED')
+            bone = nuke_existing_and_make_new_bone(edit_bones, bone_name)
+
+        bone.use_deform = False
+        bone.parent = edit_bones.get(parent_name)
+        bone.tail = tail
+        bone.head = head
 
     # Update the scene
     bpy.context.view_layer.update()
 
-    # Leave edit mode so that pose bones become available.
-    bpy.ops.object.mode_set(mode='OBJECT')
+
+def set_custom_property(owner, prop_name, value, stats, incremental=False, **ui_data):
+    # When incremental, keep the property and its current value if it already exists.
+    if prop_name in owner:
+        if incremental:
+            stats.record('properties', 'UNTOUCHED')
+            return
+        stats.record('properties', 'UPDATED')
+    else:
+        stats.record('properties', 'CREATED')
+
+    owner[prop_name] = value
+    id_props = owner.id_properties_ui(prop_name)
+    id_props.update(**ui_data)
 
 
-def add_bone_custom_properties(rig, sk_category_name, shape_key_base_names, has_lr_keys):
+def remove_custom_property(owner, prop_name, stats):
+    # Remove the driver of the property first, so it doesn't stay behind with an invalid path.
+    if find_driver(owner, f'["{prop_name}"]'):
+        owner.driver_remove(f'["{prop_name}"]')
+        stats.record('drivers', 'REMOVED')
+    if prop_name in owner:
+        del owner[prop_name]
+        stats.record('properties', 'REMOVED')
 
-    # Switch to Pose Mode to configure bone properties usable in pose mode.
-    bpy.ops.object.mode_set(mode='POSE')
+
+def get_bone_custom_property_layout(categories, use_influence_props=True):
+    """Return the (bone name, property name, value, UI data) of each widget property to set up
+    and the (bone name, property name) of each one to remove if it exists"""
+
+    # The 'cursor_influence' properties are needed by the two-level driver setup.
+    # With compact drivers, they are optional read-outs and otherwise removed if they exist.
+    props_to_set = []
+    props_to_remove = []
+
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
+        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+            # Cursor custom property 'snapping'.
+            cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
+            props_to_set.append((cursor_bone_name, "snapping", True,
+                                 {'description': "Snap the widget cursor to shape key poses"}))
+
+            # Thumbnail bone custom property 'cursor_influence'.
+            for sk_name in shape_key_base_names:
+                bone_name = get_sk_bone_name(sk_category_name, sk_name)
+                if use_influence_props:
+                    props_to_set.append((bone_name, "cursor_influence" + cursor_type, 0.0,
+                                         {'subtype': 'FACTOR', 'min': 0.0, 'max': 1.0}))
+                else:
+                    props_to_remove.append((bone_name, "cursor_influence" + cursor_type))
+
+    return props_to_set, props_to_remove
+
+
+def add_bone_custom_properties(rig, categories, stats, incremental=False, use_influence_props=True):
     pose_bones = rig.pose.bones
+    props_to_set, props_to_remove = get_bone_custom_property_layout(categories, use_influence_props)
 
-    for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-        # Add cursor custom property 'snapping'.
-        cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
-        cursor_bone = pose_bones.get(cursor_bone_name)
-        cursor_bone["snapping"] = True
-        id_props = cursor_bone.id_properties_ui("snapping")
-        id_props.update(description="Snap the widget cursor to shape key poses")
+    for bone_name, prop_name, value, ui_data in props_to_set:
+        set_custom_property(pose_bones.get(bone_name), prop_name, value, stats, incremental, **ui_data)
+    for bone_name, prop_name in props_to_remove:
+        remove_custom_property(pose_bones.get(bone_name), prop_name, stats)
 
-        # Add thumbnail bone custom property 'cursor_influence'.
-        for sk_name in shape_key_base_names:
-            bone_name = get_sk_bone_name(sk_name)
-            bone = pose_bones.get(bone_name)
-            bone["cursor_influence" + cursor_type] = 0.0
-            id_props = bone.id_properties_ui("cursor_influence" + cursor_type)
-            id_props.update(subtype='FACTOR', min=0.0, max=1.0)
+
+def thumbnail_is_up_to_date(thumb_obj, rig, bone_name, bone_tail, thumbs_col):
+    con = thumb_obj.constraints[0] if len(thumb_obj.constraints) == 1 else None
+    return (thumb_obj.animation_data is None and
+            thumb_obj.parent is None and
+            con is not None and con.type == 'ARMATURE' and len(con.targets) == 1 and
+            con.targets[0].target == rig and con.targets[0].subtarget == bone_name and
+            is_same_location(thumb_obj.location, bone_tail) and
+            is_same_location(thumb_obj.rotation_euler, (radians(90), 0, 0)) and
+            is_same_location(thumb_obj.scale, (1, 1, 1)) and
+            all(thumb_obj.lock_location) and all(thumb_obj.lock_scale) and
+            tuple(thumb_obj.users_collection) == (thumbs_col,))
 
 
-def setup_thumbnails(thumbs_col_name, rig, shape_key_base_names):
+def setup_thumbnails(thumbs_col_name, rig, categories, datablocks, stats, incremental=False):
     # Find the thumbnails' collection.
     thumbs_col = bpy.data.collections.get(thumbs_col_name)
 
@@ -209,247 +617,423 @@ def setup_thumbnails(thumbs_col_name, rig, shape_key_base_names):
     thumbs_col.hide_render = True
     thumbs_col.hide_viewport = False
 
-    # Switch to Pose Mode to access pose bone locations.
-    bpy.ops.object.mode_set(mode='POSE')
+    # Pose bone locations are read from the rig in Pose Mode.
     pose_bones = rig.pose.bones
 
-    for sk_name in shape_key_base_names:
-        thumb_obj = bpy.data.objects.get(get_sk_thumb_obj_name(sk_name))
-        bone_name = get_sk_bone_name(sk_name)
-        bone = pose_bones.get(bone_name)
+    for sk_category_name, shape_key_base_names, _has_lr_keys in categories:
+        for sk_name in shape_key_base_names:
+            thumb_obj = datablocks.objects_by_name.get(get_sk_thumb_obj_name(sk_name))
+            bone_name = get_sk_bone_name(sk_category_name, sk_name)
+            bone = pose_bones.get(bone_name)
 
-        # At this moment, the sk thumb bone should be in the desired location.
-        # So we clear everything from the thumbnail object,
-        # set it to that world location and parent it to follow the bone in pose mode.
+            if incremental and thumbnail_is_up_to_date(thumb_obj, rig, bone_name, bone.tail, thumbs_col):
+                stats.record('thumbnails', 'UNTOUCHED')
+                continue
+            stats.record('thumbnails', 'UPDATED')
 
-        # Remove any existing drivers, constraints, parenting and transform.
-        thumb_obj.animation_data_clear()
-        thumb_obj.constraints.clear()
-        thumb_obj.parent = None
-        thumb_obj.matrix_basis = Matrix()
+            # At this moment, the sk thumb bone should be in the desired location.
+            # So we clear everything from the thumbnail object,
+            # set it to that world location and parent it to follow the bone in pose mode.
 
-        # Set the thumbnail image object to the bone location.
-        thumb_obj.location = bone.tail
-        thumb_obj.rotation_euler[0] = radians(90)
+            # Remove any existing drivers, constraints, parenting and transform.
+            thumb_obj.animation_data_clear()
+            thumb_obj.constraints.clear()
+            thumb_obj.parent = None
+            thumb_obj.matrix_basis = Matrix()
 
-        # Parent the thumbnail objects to the bone.
-        # Use an armature constraint to prevent unreliable transform results from reparenting.
-        # This way, there is no invisible offset to the parent, and it also makes a cleaner outliner.
-        con = thumb_obj.constraints.new(type='ARMATURE')
-        con_target = con.targets.new()
-        con_target.target = rig
-        con_target.subtarget = bone_name
+            # Set the thumbnail image object to the bone location.
+            thumb_obj.location = bone.tail
+            thumb_obj.rotation_euler[0] = radians(90)
 
-        # Lock the thumbnail transform from being manually changed, as it should follow the bone.
-        lock_transform(thumb_obj, lock_also_x_and_y=True)
+            # Parent the thumbnail objects to the bone.
+            # Use an armature constraint to prevent unreliable transform results from reparenting.
+            # This way, there is no invisible offset to the parent, and it also makes a cleaner outliner.
+            con = thumb_obj.constraints.new(type='ARMATURE')
+            con_target = con.targets.new()
+            con_target.target = rig
+            con_target.subtarget = bone_name
 
-        # Place in the appropriate collection.
-        move_to_collection(thumb_obj, thumbs_col)
+            # Lock the thumbnail transform from being manually changed, as it should follow the bone.
+            lock_transform(thumb_obj, lock_also_x_and_y=True)
 
-        # TODO setup material and thumbnail texture.
+            # Place in the appropriate collection.
+            move_to_collection(thumb_obj, thumbs_col)
 
+            # TODO setup material and thumbnail texture.
 
-def setup_bone_custom_shapes(rig, sk_category_name, shape_key_base_names, has_lr_keys):
 
-    # Switch to Pose Mode to configure bone shapes.
-    bpy.ops.object.mode_set(mode='POSE')
-    pose_bones = rig.pose.bones
+def set_bone_custom_shape(pose_bone, shape_obj, stats, **shape_settings):
+    # Only assign when something differs, to leave up-to-date bones untouched.
+    def is_same_setting(value, desired_value):
+        if isinstance(desired_value, bool):
+            return value == desired_value
+        return is_same_location(value, desired_value)
 
-    # Category label
-    label_mesh_obj = bpy.data.objects.get(get_wgt_category_obj_name(sk_category_name))
-    base_bone_name = get_sk_category_base_bone_name(sk_category_name)
-    base_bone = pose_bones.get(base_bone_name)
-    base_bone.custom_shape = label_mesh_obj
-
-    # Cursor custom shape.
-    for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-        cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
-        cursor_bone = pose_bones.get(cursor_bone_name)
-
-        cursor_mesh_name = get_wgt_cursor_obj_name() + cursor_type
-        cursor_mesh_obj = bpy.data.objects.get(cursor_mesh_name)
-        cursor_bone.custom_shape = cursor_mesh_obj
-        cursor_bone.use_custom_shape_bone_size = False
-        cursor_bone.custom_shape_rotation_euler[0] = radians(90)
-        cursor_bone.custom_shape_translation[1] = 0.05
-        cursor_bone.custom_shape_translation[2] = 0.001
-
-    # Thumbnail bones
-    thumb_mesh_obj = bpy.data.objects.get(get_wgt_thumb_obj_name())
-    for sk_name in shape_key_base_names:
-        bone_name = get_sk_bone_name(sk_name)
-        bone = pose_bones.get(bone_name)
-        bone.custom_shape = thumb_mesh_obj
+    if pose_bone.custom_shape == shape_obj and all(
+            is_same_setting(getattr(pose_bone, attr), value) for attr, value in shape_settings.items()):
+        stats.record('custom shapes', 'UNTOUCHED')
+        return
+    stats.record('custom shapes', 'UPDATED')
 
+    pose_bone.custom_shape = shape_obj
+    for attr, value in shape_settings.items():
+        setattr(pose_bone, attr, value)
 
-def setup_bones_movement(rig, sk_category_name, shape_key_base_names, has_lr_keys):
 
-    # Switch to Pose Mode to configure transform channels that can be keyed.
-    bpy.ops.object.mode_set(mode='POSE')
+def setup_bone_custom_shapes(rig, categories, stats):
+
     pose_bones = rig.pose.bones
+    thumb_mesh_obj = bpy.data.objects.get(get_wgt_thumb_obj_name())
 
-    # Category base bone
-    base_bone_name = get_sk_category_base_bone_name(sk_category_name)
-    base_bone = pose_bones.get(base_bone_name)
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
 
-    lock_transform(base_bone, lock_also_x_and_y=False)
+        # Category label
+        label_mesh_obj = bpy.data.objects.get(get_wgt_category_obj_name(sk_category_name))
+        base_bone_name = get_sk_category_base_bone_name(sk_category_name)
+        base_bone = pose_bones.get(base_bone_name)
+        set_bone_custom_shape(base_bone, label_mesh_obj, stats)
 
-    # Cursor
-    for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-        cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
-        cursor_bone = pose_bones.get(cursor_bone_name)
+        # Cursor custom shape.
+        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+            cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
+            cursor_bone = pose_bones.get(cursor_bone_name)
+
+            cursor_mesh_name = get_wgt_cursor_obj_name() + cursor_type
+            cursor_mesh_obj = bpy.data.objects.get(cursor_mesh_name)
+            set_bone_custom_shape(
+                cursor_bone, cursor_mesh_obj, stats,
+                use_custom_shape_bone_size=False,
+                custom_shape_rotation_euler=(radians(90), 0, 0),
+                custom_shape_translation=(0, 0.05, 0.001),
+            )
+
+        # Thumbnail bones
+        for sk_name in shape_key_base_names:
+            bone_name = get_sk_bone_name(sk_category_name, sk_name)
+            bone = pose_bones.get(bone_name)
+            set_bone_custom_shape(bone, thumb_mesh_obj, stats)
 
-        lock_transform(cursor_bone, lock_also_x_and_y=False)
 
-        add_snap_location_driver(rig, cursor_bone, 'LOC_X', use_snap_user_option=True)
-        add_snap_location_driver(rig, cursor_bone, 'LOC_Y', use_snap_user_option=True)
+def setup_bones_movement(rig, categories, stats, incremental=False):
 
-    # Thumbnail bones
-    for sk_name in shape_key_base_names:
-        bone_name = get_sk_bone_name(sk_name)
-        bone = pose_bones.get(bone_name)
+    # Configure transform channels that can be keyed.
+    pose_bones = rig.pose.bones
 
-        lock_transform(bone, lock_also_x_and_y=False)
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
 
-        add_snap_location_driver(rig, bone, 'LOC_X', use_snap_user_option=False)
-        add_snap_location_driver(rig, bone, 'LOC_Y', use_snap_user_option=False)
+        # Category base bone
+        base_bone_name = get_sk_category_base_bone_name(sk_category_name)
+        lock_transform(pose_bones.get(base_bone_name), lock_also_x_and_y=False)
 
+        # Cursor
+        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+            cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name) + cursor_type
+            lock_transform(pose_bones.get(cursor_bone_name), lock_also_x_and_y=False)
 
-def add_snap_location_driver(rig, bone, tf_channel, use_snap_user_option=False):
-    property_index = 0 if tf_channel == 'LOC_X' else 1
+        # Thumbnail bones
+        for sk_name in shape_key_base_names:
+            lock_transform(pose_bones.get(get_sk_bone_name(sk_category_name, sk_name)), lock_also_x_and_y=False)
 
-    # Remove the existing driver if it exists
-    bone.driver_remove(f'location[{property_index}]')
+    # Snap the cursors and thumbnail bones to the thumbnail grid.
+    for id_data, data_path, index, spec in get_bones_movement_driver_layout(rig, categories):
+        apply_driver_spec(id_data, data_path, index, spec, stats, incremental)
 
-    # Add a driver to the given axis
-    dr = bone.driver_add("location", property_index)
-    # Remove automatically added polynomial modifier.
-    if dr.modifiers:
-        dr.modifiers.remove(dr.modifiers[0])
 
-    dr.driver.type = 'SCRIPTED'
-    # round(var*10)/10 snaps the driver to increments of 0.1
-    # but the scale of the thumbnail images is 0.1 so that becomes a scale of 1
-    if use_snap_user_option:
-        dr.driver.expression = "round(loc*10)/10 if is_snapping_on else loc"
-    else:
-        dr.driver.expression = "round(loc*10)/10"
+# Drivers are described as specs, so that existing drivers can be compared with the desired ones.
+# e.g.: {
+#     'type': 'SCRIPTED',
+#     'expression': "var * 2",
+#     'variables': [
+#         {'name': 'var', 'type': 'SINGLE_PROP', 'targets': [{'id': rig, 'data_path': '...'}]},
+#     ],
+# }
+# Target attributes are set in the given order (e.g. 'id_type' needs to come before 'id').
+# The driver layout functions return the (ID, data path, index, spec) of each driver to set up,
+# with data paths built from names only, so they also work for bones that don't exist yet.
+#
+# Expressions of SCRIPTED drivers should stay within what Blender's simple expression evaluator
+# supports natively: arithmetic, comparisons, 'and/or/not', 'x if cond else y' and math
+# functions like floor, min and max. Anything else falls back to evaluating the driver with
+# Python on every update, which holds the GIL and needs auto-run scripts to be enabled.
 
-    # Add the own location variable to the driver
-    loc_var = dr.driver.variables.new()
-    loc_var.name = 'loc'
-    loc_var.type = 'TRANSFORMS'
+def get_driver_data_path(owner, prop_path):
+    """Return the path of the owner's property as used by the drivers of the owner's ID"""
+    if prop_path.startswith('['):  # Custom property.
+        return owner.path_from_id() + prop_path
+    return owner.path_from_id(prop_path)
 
-    loc_var_target = loc_var.targets[0]
-    loc_var_target.id = rig
-    loc_var_target.bone_target = bone.name
 
-    loc_var_target.transform_type = tf_channel
-    loc_var_target.transform_space = 'TRANSFORM_SPACE'
+def get_pose_bone_data_path(bone_name, prop_path):
+    if prop_path.startswith('['):  # Custom property.
+        return f'pose.bones["{bone_name}"]{prop_path}'
+    return f'pose.bones["{bone_name}"].{prop_path}'
 
-    if use_snap_user_option:
-        # Add a variable for the user option to have snapping enabled.
-        snap_var = dr.driver.variables.new()
-        snap_var.name = 'is_snapping_on'
-        snap_var.type = 'SINGLE_PROP'
 
-        snap_var_target = snap_var.targets[0]
-        snap_var_target.id_type = 'OBJECT'
-        snap_var_target.id = rig
-        snap_var_target.data_path = f'pose.bones["{bone.name}"]["snapping"]'
+def get_shape_key_value_data_path(sk_name):
+    return f'key_blocks["{sk_name}"].value'
 
 
-def add_cursor_influence_driver(rig, bone, cursor_influence_prop_name, cursor_bone_name):
-    # Note: driver is being added to a bone, which were (re)created fresh.
-    # Therefore, there is no need to look for previously existing drivers.
+def find_id_driver(id_data, data_path, index=-1):
+    anim_data = id_data.animation_data
+    if not anim_data:
+        return None
+    return anim_data.drivers.find(data_path, index=max(index, 0))
 
-    # Add a driver to the given custom property name.
-    dr = bone.driver_add(f'["{cursor_influence_prop_name}"]')
-    # Remove automatically added polynomial modifier.
-    if dr.modifiers:
-        dr.modifiers.remove(dr.modifiers[0])
 
-    dr.driver.type = 'SCRIPTED'
-    dr.driver.expression = "max(0, 1 - 10 * var)"
+def find_driver(owner, prop_path, index=-1):
+    return find_id_driver(owner.id_data, get_driver_data_path(owner, prop_path), index)
 
-    # Create a variable for the world space distance between a thumbnail and cursor bone.
-    var = dr.driver.variables.new()
-    var.name = 'var'
-    var.type = 'LOC_DIFF'
 
-    object1 = var.targets[0]
-    object2 = var.targets[1]
+def driver_matches_spec(fcurve, spec):
+    driver = fcurve.driver
+    if (driver.type != spec['type'] or
+            ('expression' in spec and driver.expression != spec['expression']) or
+            len(fcurve.modifiers) > 0 or
+            len(driver.variables) != len(spec['variables'])):
+        return False
 
-    object1.id = rig
-    object1.bone_target = cursor_bone_name
-    object2.id = rig
-    object2.bone_target = bone.name
+    for var, var_spec in zip(driver.variables, spec['variables']):
+        if var.name != var_spec['name'] or var.type != var_spec['type']:
+            return False
+        for target, target_spec in zip(var.targets, var_spec['targets']):
+            if any(getattr(target, attr) != value for attr, value in target_spec.items()):
+                return False
 
-    object1.transform_space = 'WORLD_SPACE'
-    object2.transform_space = 'WORLD_SPACE'
+    return True
 
 
-def add_shape_key_value_driver(rig, shape_key, thumbnail_bone_name, cursor_influence_prop_name):
-    # Remove the existing driver if it exists
-    shape_key.driver_remove('value')
+def apply_driver_spec(id_data, data_path, index, spec, stats, incremental=False):
+    # When incremental, keep the existing driver if it already matches the spec.
+    # Otherwise, remove the existing driver if it exists.
+    fcurve = find_id_driver(id_data, data_path, index)
+    if fcurve:
+        if incremental and driver_matches_spec(fcurve, spec):
+            stats.record('drivers', 'UNTOUCHED')
+            return fcurve
+        stats.record('drivers', 'UPDATED')
+        id_data.driver_remove(data_path, index)
+    else:
+        stats.record('drivers', 'CREATED')
 
-    # Add a driver to the given axis
-    dr = shape_key.driver_add('value')
+    # Add a driver to the given property and axis.
+    fcurve = id_data.driver_add(data_path, index)
     # Remove automatically added polynomial modifier.
-    if dr.modifiers:
-        dr.modifiers.remove(dr.modifiers[0])
+    if fcurve.modifiers:
+        fcurve.modifiers.remove(fcurve.modifiers[0])
 
-    dr.driver.type = 'SUM'  # Get value of single variable.
+    driver = fcurve.driver
+    driver.type = spec['type']
+    if 'expression' in spec:
+        driver.expression = spec['expression']
 
-    # Add a variable for the influence of the cursor on this shape key
-    var = dr.driver.variables.new()
-    var.name = 'var'
-    var.type = 'SINGLE_PROP'
+    for var_spec in spec['variables']:
+        var = driver.variables.new()
+        var.name = var_spec['name']
+        var.type = var_spec['type']
+        for target, target_spec in zip(var.targets, var_spec['targets']):
+            for attr, value in target_spec.items():
+                setattr(target, attr, value)
 
-    var_target = var.targets[0]
-    var_target.id_type = 'OBJECT'
-    var_target.id = rig
-    var_target.data_path = f'pose.bones["{thumbnail_bone_name}"]["{cursor_influence_prop_name}"]'
+    return fcurve
 
 
-def setup_sk_value_drivers(mesh_name, rig, sk_category_name, shape_key_base_names, has_lr_keys):
-
-    bpy.ops.object.mode_set(mode='POSE')
-    pose_bones = rig.pose.bones
-    cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name)
-
-    # Setup driver for the cursor influence on each thumbnail bone.
-    for sk_name in shape_key_base_names:
-        bone_name = get_sk_bone_name(sk_name)
-        bone = pose_bones.get(bone_name)
+def get_snap_location_driver_spec(rig, bone_name, tf_channel, use_snap_user_option=False):
+    # floor(loc*10 + 0.5)/10 snaps the driver to increments of 0.1
+    # but the scale of the thumbnail images is 0.1 so that becomes a scale of 1
+    # (floor instead of round to stay within the simple expression evaluator).
+    if use_snap_user_option:
+        expression = "floor(loc*10 + 0.5)/10 if is_snapping_on else loc"
+    else:
+        expression = "floor(loc*10 + 0.5)/10"
+
+    # The own location variable of the bone.
+    variables = [{
+        'name': 'loc',
+        'type': 'TRANSFORMS',
+        'targets': [{
+            'id': rig,
+            'bone_target': bone_name,
+            'transform_type': tf_channel,
+            'transform_space': 'TRANSFORM_SPACE',
+        }],
+    }]
 
-        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-            add_cursor_influence_driver(
-                rig, bone,
-                "cursor_influence" + cursor_type,
-                cursor_bone_name + cursor_type)
-
-    # Setup driver for the SK value from the cursor influence.
-    shape_keys = bpy.data.objects[mesh_name].data.shape_keys.key_blocks
-    for sk_base_name in shape_key_base_names:
-        thumbnail_bone_name = get_sk_bone_name(sk_base_name)
-
-        if sk_base_name.endswith('Neutral'):
-            sk = shape_keys[sk_base_name]
-            add_shape_key_value_driver(
-                rig, sk,
-                thumbnail_bone_name, "cursor_influence")
+    if use_snap_user_option:
+        # Add a variable for the user option to have snapping enabled.
+        variables.append({
+            'name': 'is_snapping_on',
+            'type': 'SINGLE_PROP',
+            'targets': [{
+                'id_type': 'OBJECT',
+                'id': rig,
+                'data_path': get_pose_bone_data_path(bone_name, '["snapping"]'),
+            }],
+        })
+
+    return {'type': 'SCRIPTED', 'expression': expression, 'variables': variables}
+
+
+def get_cursor_influence_driver_spec(rig, thumbnail_bone_name, cursor_bone_name):
+    # The influence fades from 1 at the thumbnail center to 0 at 0.1 away, which is the
+    # size of a thumbnail. Uses a variable for the world space distance between a thumbnail
+    # and cursor bone.
+    return {
+        'type': 'SCRIPTED',
+        'expression': "max(0, 1 - 10 * var)",
+        'variables': [{
+            'name': 'var',
+            'type': 'LOC_DIFF',
+            'targets': [
+                {'id': rig, 'bone_target': cursor_bone_name, 'transform_space': 'WORLD_SPACE'},
+                {'id': rig, 'bone_target': thumbnail_bone_name, 'transform_space': 'WORLD_SPACE'},
+            ],
+        }],
+    }
+
+
+def get_shape_key_value_driver_spec(rig, thumbnail_bone_name, cursor_influence_prop_name):
+    # Get value of single variable: the influence of the cursor on this shape key.
+    return {
+        'type': 'SUM',
+        'variables': [{
+            'name': 'var',
+            'type': 'SINGLE_PROP',
+            'targets': [{
+                'id_type': 'OBJECT',
+                'id': rig,
+                'data_path': get_pose_bone_data_path(thumbnail_bone_name, f'["{cursor_influence_prop_name}"]'),
+            }],
+        }],
+    }
+
+
+def get_mirrored_neutral_value_driver_spec(rig, thumbnail_bone_name, cursor_bone_name, use_compact_drivers=False):
+    # The neutral key of a mirrored category has no '.L' and '.R' keys, and the category has
+    # no center cursor: each of the left and right cursors on its thumbnail drives half of it.
+    variables = []
+    for var_name, cursor_type in (('var_l', '.L'), ('var_r', '.R')):
+        if use_compact_drivers:
+            spec = get_cursor_influence_driver_spec(rig, thumbnail_bone_name, cursor_bone_name + cursor_type)
+        else:
+            spec = get_shape_key_value_driver_spec(rig, thumbnail_bone_name, "cursor_influence" + cursor_type)
+        variables.append({**spec['variables'][0], 'name': var_name})
+
+    if use_compact_drivers:
+        return {
+            'type': 'SCRIPTED',
+            'expression': "(max(0, 1 - 10 * var_l) + max(0, 1 - 10 * var_r)) / 2",
+            'variables': variables,
+        }
+    return {'type': 'AVERAGE', 'variables': variables}
+
+
+def get_bones_movement_driver_layout(rig, categories):
+    """Return the (ID, data path, index, spec) of the drivers snapping the widget bones"""
+
+    driver_layout = []
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
+        # Cursors snap to the thumbnails, unless the user turns 'snapping' off.
+        bone_names_and_options = [(get_sk_category_cursor_bone_name(sk_category_name) + cursor_type, True)
+                                  for cursor_type in (['.L', '.R'] if has_lr_keys else [''])]
+        # Thumbnail bones are always on the grid.
+        bone_names_and_options += [(get_sk_bone_name(sk_category_name, sk_name), False)
+                                   for sk_name in shape_key_base_names]
+
+        for bone_name, use_snap_user_option in bone_names_and_options:
+            data_path = get_pose_bone_data_path(bone_name, 'location')
+            for index, tf_channel in enumerate(('LOC_X', 'LOC_Y')):
+                spec = get_snap_location_driver_spec(rig, bone_name, tf_channel, use_snap_user_option)
+                driver_layout.append((rig, data_path, index, spec))
+    return driver_layout
+
+
+def get_sk_value_driver_layout(rig, shape_keys, categories,
+                               use_compact_drivers=False, use_influence_props=True, neutral_key_names=None):
+    """Return the (ID, data path, index, spec) of the drivers of the influence properties and shape keys
+
+    neutral_key_names: {category name: neutral shape key name}. Categories without one, like the
+    ones of SKS setups, use their shape key ending in 'Neutral'.
+    """
+
+    # Default: a driver on each thumbnail bone computes the 'cursor_influence' property and
+    # each shape key value is driven by that property.
+    # Compact: a single driver per shape key computes the value from the cursor distance.
+    # The influence properties can be kept driven as read-outs.
+
+    driver_layout = []
+    for sk_category_name, shape_key_base_names, has_lr_keys in categories:
+        cursor_bone_name = get_sk_category_cursor_bone_name(sk_category_name)
+        neutral_key_name = (neutral_key_names or {}).get(sk_category_name)
+
+        # Driver for the cursor influence on each thumbnail bone.
+        if use_influence_props:
+            for sk_name in shape_key_base_names:
+                bone_name = get_sk_bone_name(sk_category_name, sk_name)
+                for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+                    spec = get_cursor_influence_driver_spec(rig, bone_name, cursor_bone_name + cursor_type)
+                    data_path = get_pose_bone_data_path(bone_name, f'["cursor_influence{cursor_type}"]')
+                    driver_layout.append((rig, data_path, -1, spec))
+
+        # Driver for the SK value from the cursor influence.
+        for sk_base_name in shape_key_base_names:
+            thumbnail_bone_name = get_sk_bone_name(sk_category_name, sk_base_name)
+
+            # The Neutral shape key is never mirrored.
+            if neutral_key_name is not None:
+                is_neutral = sk_base_name == neutral_key_name
+            else:
+                is_neutral = sk_base_name.endswith('Neutral')
+            if has_lr_keys and is_neutral:
+                spec = get_mirrored_neutral_value_driver_spec(
+                    rig, thumbnail_bone_name, cursor_bone_name, use_compact_drivers)
+                driver_layout.append((shape_keys, get_shape_key_value_data_path(sk_base_name), -1, spec))
+                continue
+            for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
+                if use_compact_drivers:
+                    # Compute the cursor influence directly in the shape key value driver,
+                    # instead of reading it from a driven custom property of the thumbnail bone.
+                    spec = get_cursor_influence_driver_spec(
+                        rig, thumbnail_bone_name, cursor_bone_name + cursor_type)
+                else:
+                    spec = get_shape_key_value_driver_spec(
+                        rig, thumbnail_bone_name, "cursor_influence" + cursor_type)
+                data_path = get_shape_key_value_data_path(sk_base_name + cursor_type)
+                driver_layout.append((shape_keys, data_path, -1, spec))
+
+    return driver_layout
+
+
+def driver_needs_python(driver):
+    return driver.type == 'SCRIPTED' and (driver.use_self or not driver.is_simple_expression)
+
+
+def find_drivers_needing_python(rig, shape_keys):
+    """Return the ID and data path of each widget driver that needs Python to be evaluated"""
+
+    drivers_needing_python = []
+    for id_data in (rig, shape_keys):
+        anim_data = id_data.animation_data if id_data else None
+        if not anim_data:
             continue
+        for fcurve in anim_data.drivers:
+            # Only check the drivers of the widget bones or driven by them.
+            is_widget_driver = fcurve.data_path.startswith('pose.bones["SKS-') or any(
+                target.id == rig for var in fcurve.driver.variables for target in var.targets)
+            if is_widget_driver and driver_needs_python(fcurve.driver):
+                drivers_needing_python.append((id_data.name, fcurve.data_path))
+    return drivers_needing_python
 
-        for cursor_type in ['.L', '.R'] if has_lr_keys else ['']:
-            sk = shape_keys[sk_base_name + cursor_type]
-            add_shape_key_value_driver(
-                rig, sk,
-                thumbnail_bone_name, "cursor_influence" + cursor_type)
+
+def setup_sk_value_drivers(rig, categories, datablocks, stats, incremental=False,
+                           use_compact_drivers=False, use_influence_props=True):
+    driver_layout = get_sk_value_driver_layout(
+        rig, datablocks.shape_keys, categories, use_compact_drivers, use_influence_props)
+    for id_data, data_path, index, spec in driver_layout:
+        apply_driver_spec(id_data, data_path, index, spec, stats, incremental)
 
 
 def move_bones_to_layer(rig):
-    bpy.ops.object.mode_set(mode='OBJECT')
+    # Bone layers and collections are data of the Armature, available in Object and Pose Mode.
 
     bone_col = None
     if USE_BONE_COLLECTIONS:
@@ -458,109 +1042,234 @@ def move_bones_to_layer(rig):
         if not bone_col:
             bone_col = armature.collections.new(get_bone_collection_name())
 
+    layer_21_only = tuple(i == 21 for i in range(32))
+
     for bone in rig.data.bones:
         if not bone.name.startswith('SKS-'):
             continue
         # Assign the Shake Key bone to its own collection.
         if USE_BONE_COLLECTIONS:
+            if tuple(bone.collections) == (bone_col,):
+                continue
             bone.collections.clear()
             bone_col.assign(bone)
         else:  # Move the bone from any layer it might have been in to layer 21.
+            if tuple(bone.layers) == layer_21_only:
+                continue
             for i in range(32):
                 rig.data.bones[bone.name].layers[i] = False
             rig.data.bones[bone.name].layers[21] = True
 
 
-def find_layer_collection(layer_col, col_name):
-    if layer_col.name == col_name:
-        return layer_col
+# Bone custom shapes for the cursors and thumbnails are generated, described by a shape dict.
+# Their meshes store a signature of the shape, so that all rigs and conversions in a file
+# share a single mesh for each shape, found through DatablockIndex.widget_meshes_by_signature.
+WIDGET_SHAPE_SIGNATURE_PROP = "skw_widget_shape"
 
-    for lc in layer_col.children:
-        found_lc = find_layer_collection(lc, col_name)
-        if found_lc:
-            return found_lc
 
+def get_cursor_shape(cursor_type):
+    # A circle the size of a thumbnail, with a tick on the side of '.L' and '.R' cursors.
+    # In the XZ plane, as the cursor bones show their custom shape rotated by 90° in X.
+    return {'type': 'CURSOR', 'radius': 0.05, 'segments': 24, 'side': {'': 0, '.L': 1, '.R': -1}[cursor_type]}
 
-def layer_collection_set_exclude_from_view_layer(layer_col, col_name, exclude_value):
-    if layer_col.name == col_name:
-        layer_col.exclude = exclude_value
-        return True
 
-    for lc in layer_col.children:
-        if find_layer_collection(lc, col_name):
-            return True
+def get_thumbnail_selector_shape():
+    # A frame around the thumbnail, in units of bone length, which is half a thumbnail.
+    return {'type': 'FRAME', 'width': 2.0, 'height': 2.0, 'center': [0.0, 1.0, 0.0]}
 
 
-def setup_wgt_objects_and_collection(wgts_col_name, category_names):
+def get_shape_signature(shape):
+    return hashlib.sha1(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
 
-    wgts_col = bpy.data.collections.get(wgts_col_name)
 
-    # Temporarily ensure that the collection is selectable and part of the view layer,
-    # so that this code can run operators on its objects.
-    wgts_col.hide_select = False
-    wgts_col.hide_render = False
-    wgts_col.hide_viewport = False
-    # Find the Collection Layer that wgts_col Collection is in.
-    user_preferred_active_collection = bpy.context.view_layer.active_layer_collection
-    layer_col = find_layer_collection(bpy.context.view_layer.layer_collection, wgts_col_name)
-    # Ensure the collection is part of the view layer and save the previous state to restore later.
-    user_preferred_exclude_value = layer_col.exclude
-    layer_col.exclude = False
-    # Setup custom mesh to be shared for the cursor(s).
-    for cursor_type in ["", ".L", ".R"]:
-        cursor_mesh_data_name = "Selector Icon" + cursor_type
-        cursor_mesh_obj_name = get_wgt_cursor_obj_name() + cursor_type
-        cursor_mesh_data = bpy.data.meshes.get(cursor_mesh_data_name)
-        cursor_mesh_obj = bpy.data.objects.get(cursor_mesh_obj_name)
+def make_widget_shape_geometry(shape):
+    """Return the vertices and edges of a widget shape"""
 
-        if not cursor_mesh_obj:
-            cursor_mesh_obj = bpy.data.objects.new(cursor_mesh_obj_name, cursor_mesh_data)
+    if shape['type'] == 'CURSOR':
+        radius = shape['radius']
+        num_segments = shape['segments']
+        verts = [(radius * cos(2 * pi * i / num_segments), 0.0, radius * sin(2 * pi * i / num_segments))
+                 for i in range(num_segments)]
+        edges = [(i, (i + 1) % num_segments) for i in range(num_segments)]
+        if shape['side']:
+            # The tick starts at the circle vertex on the side, pointing outwards.
+            side_vert_idx = 0 if shape['side'] > 0 else num_segments // 2
+            verts.append((shape['side'] * radius * 1.5, 0.0, 0.0))
+            edges.append((side_vert_idx, len(verts) - 1))
+        return verts, edges
 
-        move_to_collection(cursor_mesh_obj, wgts_col)
+    if shape['type'] == 'FRAME':
+        half_width = shape['width'] / 2
+        half_height = shape['height'] / 2
+        x, y, z = shape['center']
+        verts = [(x - half_width, y - half_height, z), (x + half_width, y - half_height, z),
+                 (x + half_width, y + half_height, z), (x - half_width, y + half_height, z)]
+        edges = [(0, 1), (1, 2), (2, 3), (3, 0)]
+        return verts, edges
 
-    # Create text widgets for each SK category.
-    text_objects = []
-    for sk_category_name in category_names:
-        text_obj = create_category_text_custom_shape_obj(wgts_col, sk_category_name)
-        text_objects.append(text_obj)
+    raise ValueError(f"Unknown widget shape type: {shape['type']}")
 
-    # Convert the font into a 3D curve so it doesn't look tessellated in wireframe mode.
-    # The convert operator needs an active object and also the active objects to have their
-    # select flag on. See issue #93188
-    bpy.context.view_layer.update()
-    with bpy.context.temp_override(
-            active_object=text_objects[0],
-            # selected_objects=text_objects
-    ):
-        for ob in bpy.context.selected_objects:
-            ob.select_set(False)
-        for ob in text_objects:
-            ob.select_set(True)
-        bpy.ops.object.convert(target='CURVE', keep_original=False)
-        for ob in text_objects:
-            ob.data.dimensions = '3D'
-    for ob in text_objects:
-        ob.select_set(False)
+
+def ensure_widget_mesh(shape, mesh_name, datablocks, stats):
+    """Return the mesh of the widget shape, making it only if the file doesn't have one yet"""
+
+    signature = get_shape_signature(shape)
+    mesh = datablocks.widget_meshes_by_signature.get(signature)
+    if mesh:
+        stats.record('widget meshes', 'UNTOUCHED')
+        return mesh
+
+    stats.record('widget meshes', 'CREATED')
+    verts, edges = make_widget_shape_geometry(shape)
+    mesh = bpy.data.meshes.new(mesh_name)
+    mesh.from_pydata(verts, edges, [])
+    mesh[WIDGET_SHAPE_SIGNATURE_PROP] = signature
+    datablocks.widget_meshes_by_signature[signature] = mesh
+    return mesh
+
+
+def ensure_widget_object(obj_name, shape, wgts_col, datablocks, stats):
+    # Objects that already exist keep their mesh, so that the widget shapes can be customized.
+    widget_obj = bpy.data.objects.get(obj_name)
+    if widget_obj:
+        stats.record('widgets', 'UNTOUCHED')
+    else:
+        stats.record('widgets', 'CREATED')
+        widget_obj = bpy.data.objects.new(obj_name, ensure_widget_mesh(shape, obj_name, datablocks, stats))
+
+    move_to_collection(widget_obj, wgts_col)
+    return widget_obj
+
+
+# Outlines of the label characters, cached for the session so that the labels of all
+# categories and rigs reuse them: {character: (splines, advance)}, with each spline as
+# (is_cyclic, [(co, handle_left, handle_right, handle_left_type, handle_right_type), ...]).
+glyph_outlines = {}
+
+
+def read_text_outline(text_obj, depsgraph, body):
+    """Return the outline splines of a text, with the settings of the text object"""
+
+    text_obj.data.body = body
+    # The text object is not in the scene, so the original text is turned into curves.
+    curve = text_obj.to_curve(depsgraph)
+    splines = [(spline.use_cyclic_u,
+                [(tuple(p.co), tuple(p.handle_left), tuple(p.handle_right),
+                  p.handle_left_type, p.handle_right_type) for p in spline.bezier_points])
+               for spline in curve.splines]
+    text_obj.to_curve_clear()
+    return splines
+
+
+def get_glyph_outlines(characters):
+    """Return the outline splines and advance width of each character, reading the ones not cached yet"""
+
+    missing_characters = set(characters) - glyph_outlines.keys()
+    if missing_characters:
+        # Read the outlines from a temporary text object, without operators.
+        fonts_before = set(bpy.data.fonts)
+        text_data = bpy.data.curves.new(type='FONT', name="SKW-glyphs")
+        text_data.align_y = 'CENTER'
+        text_obj = bpy.data.objects.new("SKW-glyphs", text_data)
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        try:
+            # The advance of a character is how much it moves a marker character placed after it.
+            marker = '|'
+            marker_splines = read_text_outline(text_obj, depsgraph, marker)
+            marker_x = min(point[0][0] for _is_cyclic, points in marker_splines for point in points)
+            for character in missing_characters:
+                splines = read_text_outline(text_obj, depsgraph, character + marker)
+                glyph_splines = splines[:len(splines) - len(marker_splines)]
+                moved_marker_x = min(point[0][0] for _is_cyclic, points in splines[len(glyph_splines):]
+                                     for point in points)
+                glyph_outlines[character] = (glyph_splines, moved_marker_x - marker_x)
+        finally:
+            bpy.data.objects.remove(text_obj)
+            bpy.data.curves.remove(text_data)
+            # Don't leave behind the built-in font if it was loaded just for this.
+            for font in set(bpy.data.fonts) - fonts_before:
+                if font.users == 0:
+                    bpy.data.fonts.remove(font)
+
+    return {character: glyph_outlines[character] for character in characters}
+
+
+def create_text_curve(name, text):
+    """Make 3D curve data with the outlines of the text, aligned to the right and vertically centered"""
+
+    glyphs = get_glyph_outlines(text)
+    curve = bpy.data.curves.new(name, type='CURVE')
+    # 3D so that it doesn't look tessellated in wireframe mode.
+    curve.dimensions = '3D'
+
+    x = -sum(glyphs[character][1] for character in text)
+    for character in text:
+        splines, advance = glyphs[character]
+        for is_cyclic, points in splines:
+            spline = curve.splines.new('BEZIER')
+            spline.use_cyclic_u = is_cyclic
+            spline.bezier_points.add(len(points) - 1)
+            for point, (co, handle_left, handle_right, handle_left_type, handle_right_type) in zip(
+                    spline.bezier_points, points):
+                point.handle_left_type = handle_left_type
+                point.handle_right_type = handle_right_type
+                point.co = (co[0] + x, co[1], co[2])
+                point.handle_left = (handle_left[0] + x, handle_left[1], handle_left[2])
+                point.handle_right = (handle_right[0] + x, handle_right[1], handle_right[2])
+        x += advance
+
+    return curve
+
+
+def setup_wgt_objects_and_collection(wgts_col_name, category_names, datablocks, stats, profile,
+                                     incremental=False):
+
+    wgts_col = bpy.data.collections.get(wgts_col_name)
+
+    # Setup custom shapes to be shared for the cursor(s) and thumbnails.
+    for cursor_type in ["", ".L", ".R"]:
+        ensure_widget_object(get_wgt_cursor_obj_name() + cursor_type, get_cursor_shape(cursor_type),
+                             wgts_col, datablocks, stats)
+    ensure_widget_object(get_wgt_thumb_obj_name(), get_thumbnail_selector_shape(), wgts_col, datablocks, stats)
+
+    # Create text widgets for each SK category.
+    # When incremental, keep the labels that were already generated by a previous run.
+    label_category_names = category_names
+    if incremental:
+        label_category_names = [n for n in category_names
+                                if not bpy.data.objects.get(get_wgt_category_obj_name(n))]
+        stats.record('widgets', 'UNTOUCHED', len(category_names) - len(label_category_names))
+    if label_category_names:
+        profile.call_stage(create_category_text_widgets, wgts_col, label_category_names, stats)
 
     # Rig widgets collection should not be visible in the viewport when using the rig.
     wgts_col.hide_select = True
     wgts_col.hide_render = True
     wgts_col.hide_viewport = True
-    # TODO: check why the line below has no effect.
-    layer_collection_set_exclude_from_view_layer(
-        bpy.context.view_layer.layer_collection, wgts_col_name, user_preferred_exclude_value)
-    bpy.context.view_layer.active_layer_collection = user_preferred_active_collection
 
 
-def create_category_text_custom_shape_obj(wgts_col, sk_category_name):
+def create_category_text_widgets(wgts_col, category_names, stats):
+    for sk_category_name in category_names:
+        create_category_text_custom_shape_obj(wgts_col, sk_category_name, stats)
+
+
+def create_category_text_custom_shape_obj(wgts_col, sk_category_name, stats):
 
     display_name = sk_category_name
     wgt_obj_name = get_wgt_category_obj_name(sk_category_name)
 
-    text_data = bpy.data.curves.new(type="FONT", name=wgt_obj_name)
-    text_data.body = display_name
-    text_data.align_x = 'RIGHT'
-    text_data.align_y = 'CENTER'
+    # If the label already existed in the file, delete it and create a fresh new one.
+    # Otherwise, each run would leave behind a label with a '.001' name.
+    old_text_obj = bpy.data.objects.get(wgt_obj_name)
+    if old_text_obj:
+        old_text_data = old_text_obj.data
+        bpy.data.objects.remove(old_text_obj)
+        if old_text_data and old_text_data.users == 0:
+            bpy.data.curves.remove(old_text_data)
+    stats.record('widgets', 'UPDATED' if old_text_obj else 'CREATED')
+
+    # Curves of the text outlines, as the custom shape of a bone can not be a text object.
+    text_data = create_text_curve(wgt_obj_name, display_name)
 
     text_obj = bpy.data.objects.new(name=wgt_obj_name, object_data=text_data)
     move_to_collection(text_obj, wgts_col)
@@ -568,36 +1277,533 @@ def create_category_text_custom_shape_obj(wgts_col, sk_category_name):
     return text_obj
 
 
-def remove_sks_objects(category_names):
+def gather_sks_leftovers(category_names, datablocks):
+    """Return the SKS objects, label curves and collections that the conversion replaces"""
 
-    # Remove old cursors using the cursor meshes.
-    objs_to_remove = [ob for ob in bpy.data.objects if ob.name.startswith("Selector Icon")]
-    for ob in objs_to_remove:
-        bpy.data.objects.remove(ob)
+    # Old cursors using the cursor meshes.
     # TODO remove only if no longer used
+    objects = set(datablocks.selector_icon_objects)
 
-    # Remove text objects for the category labels.
-    # Look for Text (font) datablocks, with the text content of a SK category
-    # that is being converted. Check for naming convention as additional security.
-    text_datablocks = [t for t in bpy.data.curves
-                       if isinstance(t, bpy.types.TextCurve) and
-                       t.name.startswith('Text') and
-                       t.body in category_names]
-    for t in text_datablocks:
-        bpy.data.curves.remove(t, do_unlink=True)  # Will delete the linked object.
+    # Text (font) datablocks for the category labels, with the text content of a SK category
+    # that is being converted, and the objects using them.
+    curves = [t for name in category_names
+              for t in datablocks.sks_text_curves_by_body.get(name, [])]
+    for users in bpy.data.user_map(subset=curves, value_types={'OBJECT'}).values():
+        objects.update(users)
 
-    # Check for empty collections to remove.
-    empty_collections = [c for c in bpy.data.collections if len(c.all_objects) == 0]
-    for col in empty_collections:
-        if "Selectors" in col.name:
-            bpy.data.collections.remove(col)
+    # Collections that will be left empty.
+    collections = [c for c in datablocks.selector_collections
+                   if all(ob in objects for ob in c.all_objects)]
 
+    return sorted(objects, key=lambda ob: ob.name), curves, collections
 
-class SCENE_OT_convert_sks_to_skw(Operator):
-    bl_idname = "scene.convert_sks_to_skw"
-    bl_label = "Convert SKS to SKW rig"
-    bl_description = """
-        Migrate data on a file that was setup with the Shape Key Selector V1 addon to a rig"""
+
+def estimate_datablock_memory(id_data):
+    """Return a rough estimate of the bytes taken by the geometry or pixels of a datablock"""
+
+    if isinstance(id_data, bpy.types.Mesh):
+        # Positions, edge and corner indices and face offsets, without the optional attributes.
+        return (len(id_data.vertices) * 12 + len(id_data.edges) * 8 +
+                len(id_data.loops) * 8 + len(id_data.polygons) * 4)
+    if isinstance(id_data, bpy.types.Curve):
+        return sum(len(spline.bezier_points) * 36 + len(spline.points) * 16 for spline in id_data.splines)
+    if isinstance(id_data, bpy.types.Image) and id_data.has_data:
+        bytes_per_channel = 4 if id_data.is_float else 1
+        return id_data.size[0] * id_data.size[1] * id_data.channels * bytes_per_channel
+    return 0
+
+
+# Types of data that can be left unused by the SKS leftovers, by ID type.
+ORPHAN_TYPE_NAMES = {'MESH': 'meshes', 'CURVE': 'curves', 'MATERIAL': 'materials', 'IMAGE': 'images'}
+
+
+def gather_orphan_candidates(objects):
+    """Return the data of the objects, their materials and images, which may be left unused"""
+
+    candidates = set()
+    for ob in objects:
+        if ob.data is not None and ob.type in {'MESH', 'CURVE', 'FONT'}:
+            candidates.add(ob.data)
+            candidates.update(mat for mat in ob.data.materials if mat)
+        candidates.update(slot.material for slot in ob.material_slots if slot.material)
+
+    for mat in [c for c in candidates if isinstance(c, bpy.types.Material)]:
+        if mat.node_tree:
+            candidates.update(node.image for node in mat.node_tree.nodes
+                              if node.type == 'TEX_IMAGE' and node.image)
+
+    # Linked data belongs to its library file and data marked to keep is kept.
+    return {c for c in candidates if not c.library and not c.use_fake_user}
+
+
+def format_removal_summary(summary):
+    counts_str = ', '.join(f"{num} {type_name}" for type_name, num in summary.items()
+                           if type_name != 'estimated_bytes' and num)
+    return f"{counts_str or 'nothing'} (~{summary['estimated_bytes'] / 1024:.0f} KiB)"
+
+
+def remove_sks_objects(category_names, datablocks, purge_orphans=False):
+    """Remove the SKS leftovers at once and return how many datablocks of each type were removed
+
+    Optionally also remove the meshes, curves, materials and images used only by the leftovers.
+    """
+
+    objects, curves, collections = gather_sks_leftovers(category_names, datablocks)
+    orphan_candidates = gather_orphan_candidates(objects) if purge_orphans else set()
+
+    summary = {'objects': len(objects), 'curves': len(curves), 'collections': len(collections)}
+    estimated_bytes = sum(estimate_datablock_memory(t) for t in curves)
+
+    # Removing in a single batch remaps the users of all the removed datablocks in one pass,
+    # instead of one pass over the whole file for each removed datablock.
+    bpy.data.batch_remove(objects + curves + collections)
+
+    # The users of the candidates are only known after removing the leftovers.
+    # Removing materials can leave images unused, so purge until nothing else is unused.
+    orphan_candidates.difference_update(curves)
+    while orphan_candidates:
+        orphans = [c for c in orphan_candidates if c.users == 0]
+        if not orphans:
+            break
+        for orphan in orphans:
+            type_name = ORPHAN_TYPE_NAMES[orphan.id_type]
+            summary[type_name] = summary.get(type_name, 0) + 1
+            estimated_bytes += estimate_datablock_memory(orphan)
+        orphan_candidates.difference_update(orphans)
+        bpy.data.batch_remove(orphans)
+
+    summary['estimated_bytes'] = estimated_bytes
+    return summary
+
+
+def save_context_state():
+    # Save context state to restore it as it was when the conversion is done.
+    return {
+        "view3d_mode": bpy.context.object.mode,
+        'active_obj': bpy.context.view_layer.objects.active,
+        'selected_objects': bpy.context.selected_objects,
+    }
+
+
+def restore_context_state(original_state):
+    # Restore context for the user.
+    try:
+        bpy.context.view_layer.objects.active = original_state['active_obj']
+        for ob in original_state['selected_objects']:
+            ob.select_set(True)
+        if bpy.context.active_object:
+            bpy.ops.object.mode_set(mode=original_state['view3d_mode'])
+    except ReferenceError:
+        # The selection had objects which were deleted. Can't restore context to that.
+        pass
+
+
+# --- Conversion plan ---
+# A plan lists what a conversion would change, without changing anything. It is made of
+# JSON serializable dicts and lists, so it can be stored, reviewed and diffed, and applied
+# later with the categories and bone layout it recorded.
+
+PLAN_FORMAT_VERSION = 1
+
+PLAN_SETTING_NAMES = (
+    'rig_name',
+    'geo_name',
+    'thumbs_collection_name',
+    'wgts_collection_name',
+    'category_names',
+    'incremental',
+    'use_compact_drivers',
+    'use_influence_readouts',
+)
+
+# Rough relative cost of evaluating the drivers on each frame, to compare driver setups.
+# Each driver has a base cost, plus the cost of reading each variable: a world space
+# distance needs the matrices of two bones, while a property is a single lookup.
+# See benchmarks/driver_evaluation.py to measure actual times.
+DRIVER_EVALUATION_COSTS = {
+    'DRIVER': 1.0,
+    'SINGLE_PROP': 0.5,
+    'TRANSFORMS': 1.0,
+    'LOC_DIFF': 2.0,
+    'ROTATION_DIFF': 2.0,
+}
+
+
+def get_planned_action(exists, is_kept=False):
+    if not exists:
+        return 'CREATE'
+    return 'KEEP' if is_kept else 'UPDATE'
+
+
+def serialize_driver_spec(spec):
+    # Refer to IDs by name, to be able to write the spec as JSON.
+    return {**spec, 'variables': [
+        {**var_spec, 'targets': [
+            {attr: value.name if isinstance(value, bpy.types.ID) else value
+             for attr, value in target_spec.items()}
+            for target_spec in var_spec['targets']]}
+        for var_spec in spec['variables']]}
+
+
+def estimate_driver_evaluation(driver_specs):
+    """Return the number of drivers and variables per type and their relative evaluation cost"""
+
+    drivers_per_type = {}
+    variables_per_type = {}
+    cost = 0.0
+    for spec in driver_specs:
+        drivers_per_type[spec['type']] = drivers_per_type.get(spec['type'], 0) + 1
+        cost += DRIVER_EVALUATION_COSTS['DRIVER']
+        for var_spec in spec['variables']:
+            variables_per_type[var_spec['type']] = variables_per_type.get(var_spec['type'], 0) + 1
+            cost += DRIVER_EVALUATION_COSTS.get(var_spec['type'], 1.0)
+
+    return {
+        'drivers': len(driver_specs),
+        'drivers_per_type': drivers_per_type,
+        'variables_per_type': variables_per_type,
+        'evaluation_cost': round(cost, 1),
+    }
+
+
+def summarize_plan(plan):
+    parts = []
+    for kind in ('bones', 'properties', 'drivers', 'objects'):
+        counts = {}
+        for item in plan[kind]:
+            counts[item['action']] = counts.get(item['action'], 0) + 1
+        counts_str = ', '.join(f"{counts[action]} to {action.lower()}"
+                               for action in ('CREATE', 'UPDATE', 'REMOVE') if action in counts)
+        parts.append(f"{kind}: {counts_str or 'no changes'}")
+    parts.append(f"{len(plan['removals'])} SKS datablocks to remove")
+    estimate = plan['estimate']
+    parts.append(f"{estimate['drivers']} drivers with an evaluation cost of {estimate['evaluation_cost']}")
+    return '; '.join(parts)
+
+
+class ConversionRun:
+    """One conversion of a SKS setup to a rig, split in steps
+
+    The steps can run all at once, or one at a time to report progress in between.
+    Each step leaves the rig in Pose Mode, never in Edit Mode.
+    """
+
+    def __init__(self, rig_name, geo_name, thumbs_collection_name, wgts_collection_name,
+                 category_names, incremental=False,
+                 use_compact_drivers=False, use_influence_readouts=False):
+        self.rig_name = rig_name
+        self.geo_name = geo_name
+        self.thumbs_collection_name = thumbs_collection_name
+        self.wgts_collection_name = wgts_collection_name
+        self.category_names = category_names
+        self.incremental = incremental
+        self.use_compact_drivers = use_compact_drivers
+        self.use_influence_readouts = use_influence_readouts
+        self.use_influence_props = not use_compact_drivers or use_influence_readouts
+
+        self.stats = ConversionStats()
+        self.profile = ConversionProfile()
+        # Index the file's datablocks once, for both the validation and the conversion.
+        self.datablocks = self.profile.call_stage(DatablockIndex, geo_name)
+        self.drivers_needing_python = []
+        self.removal_summary = {}
+        # Whether to also remove the data that only the SKS leftovers used.
+        self.purge_orphans = False
+
+        # Set by prepare(), once the setup is known to be valid.
+        self.rig = None
+        self.categories = []
+
+        # Set when following a stored plan, instead of finding them again in the file.
+        self.planned_categories = None
+        self.planned_bone_layout = None
+
+    @classmethod
+    def from_plan(cls, plan):
+        """Make a run that applies a plan made by make_plan()"""
+
+        if plan.get('version') != PLAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported conversion plan version: {plan.get('version')}")
+
+        run = cls(**{name: plan['settings'][name] for name in PLAN_SETTING_NAMES})
+        run.planned_categories = [(c['name'], c['shape_key_base_names'], c['has_lr_keys'])
+                                  for c in plan['categories']]
+        run.planned_bone_layout = [(b['name'], b['parent'], Vector(b['head']), Vector(b['tail']))
+                                   for b in plan['bones']]
+        return run
+
+    def find_problem(self):
+        """Return a description of the first problem that prevents the conversion, if any"""
+
+        wgts_col = bpy.data.collections.get(self.wgts_collection_name)
+        if not wgts_col:
+            return (f"Missing collection named '{self.wgts_collection_name}'\n"
+                    "Needed to hold meshes for bone custom shapes.\n"
+                    "It will be hidden in the viewport.")
+
+        thumbs_col = bpy.data.collections.get(self.thumbs_collection_name)
+        if not thumbs_col:
+            return (f"Missing collection named '{self.thumbs_collection_name}'\n"
+                    "Needed to hold thumbnail mesh objects that are parented to the rig.\n"
+                    "It will be shown in the viewport, but hidden in renders.")
+
+        mesh_obj = self.datablocks.objects_by_name.get(self.geo_name)
+        if not mesh_obj:
+            return f"Model/character mesh named '{self.geo_name}' not found"
+
+        # Check for a match in SK and thumbnail objects for each SK in each category.
+        for sk_category_name in self.category_names:
+            problem = find_category_problem(sk_category_name,
+                                            self.datablocks.find_shape_keys(sk_category_name),
+                                            self.datablocks.objects_by_name)
+            if problem:
+                return problem
+
+        rig = self.datablocks.objects_by_name.get(self.rig_name)
+        if not rig:
+            return f"Can not find rig with name '{self.rig_name}' to modify"
+
+        # Check for a base bone for each SK category.
+        armature = rig.data
+        root_bone = armature.bones.get('root')
+        if not root_bone:
+            return f"Rig does not have an already existing bone called 'root' to parent new bones to"
+
+        return None
+
+    def prepare(self):
+        # Set the rig as the active object so the conversion can switch between edit/pose/object mode as needed.
+        self.rig = self.datablocks.objects_by_name.get(self.rig_name)
+        bpy.context.view_layer.objects.active = self.rig
+
+        # Gather the widget setup for each shape key category.
+        self.categories = self.gather_categories()
+        for sk_category_name, shape_key_base_names, _has_lr_keys in self.categories:
+            log.info(f"... Creating '{sk_category_name}' widget with {shape_key_base_names} thumbnails.")
+
+    def gather_categories(self):
+        if self.planned_categories is not None:
+            return self.planned_categories
+        return self.profile.call_stage(gather_category_widgets, self.datablocks, self.category_names)
+
+    def get_bone_layout(self, rig, categories):
+        if self.planned_bone_layout is not None:
+            return self.planned_bone_layout
+        return self.profile.call_stage(get_bone_layout, rig, categories, self.datablocks)
+
+    def make_plan(self):
+        """Return what the conversion would change, as JSON serializable data. Changes nothing
+
+        Expects the setup to be valid, see find_problem().
+        """
+
+        datablocks = self.datablocks
+        rig = datablocks.objects_by_name.get(self.rig_name)
+        categories = self.gather_categories()
+        bone_layout = self.get_bone_layout(rig, categories)
+
+        # Bones, as create_bones would make them.
+        bones = rig.data.bones
+        planned_bones = []
+        for bone_name, parent_name, head, tail in bone_layout:
+            bone = bones.get(bone_name)
+            is_kept = bool(bone) and self.incremental and bone_is_up_to_date(bone, parent_name, head, tail)
+            planned_bones.append({
+                'name': bone_name,
+                'parent': parent_name,
+                'head': list(head),
+                'tail': list(tail),
+                'action': get_planned_action(bone is not None, is_kept),
+            })
+
+        # Custom properties of the pose bones, as add_bone_custom_properties would set them.
+        pose_bones = rig.pose.bones
+        props_to_set, props_to_remove = get_bone_custom_property_layout(categories, self.use_influence_props)
+        planned_props = []
+        for bone_name, prop_name, _value, _ui_data in props_to_set:
+            pose_bone = pose_bones.get(bone_name)
+            exists = pose_bone is not None and prop_name in pose_bone
+            planned_props.append({'bone': bone_name, 'name': prop_name,
+                                  'action': get_planned_action(exists, self.incremental)})
+        for bone_name, prop_name in props_to_remove:
+            pose_bone = pose_bones.get(bone_name)
+            if pose_bone is not None and prop_name in pose_bone:
+                planned_props.append({'bone': bone_name, 'name': prop_name, 'action': 'REMOVE'})
+
+        # Drivers, including the ones of the properties to remove.
+        driver_layout = (get_bones_movement_driver_layout(rig, categories) +
+                         get_sk_value_driver_layout(rig, datablocks.shape_keys, categories,
+                                                    self.use_compact_drivers, self.use_influence_props))
+        planned_drivers = []
+        for id_data, data_path, index, spec in driver_layout:
+            fcurve = find_id_driver(id_data, data_path, index)
+            is_kept = bool(fcurve) and self.incremental and driver_matches_spec(fcurve, spec)
+            planned_drivers.append({
+                'id': id_data.name,
+                'data_path': data_path,
+                'index': index,
+                'action': get_planned_action(fcurve is not None, is_kept),
+                'spec': serialize_driver_spec(spec),
+            })
+        for bone_name, prop_name in props_to_remove:
+            data_path = get_pose_bone_data_path(bone_name, f'["{prop_name}"]')
+            if find_id_driver(rig, data_path):
+                planned_drivers.append({'id': rig.name, 'data_path': data_path, 'index': -1,
+                                        'action': 'REMOVE', 'spec': None})
+
+        # Widget and thumbnail objects, as setup_wgt_objects_and_collection and setup_thumbnails would do.
+        planned_objects = []
+        wgts_col = bpy.data.collections.get(self.wgts_collection_name)
+        shape_obj_names = [get_wgt_cursor_obj_name() + cursor_type for cursor_type in ["", ".L", ".R"]]
+        for shape_obj_name in shape_obj_names + [get_wgt_thumb_obj_name()]:
+            shape_obj = datablocks.objects_by_name.get(shape_obj_name)
+            is_kept = bool(shape_obj) and tuple(shape_obj.users_collection) == (wgts_col,)
+            planned_objects.append({'name': shape_obj_name, 'collection': wgts_col.name,
+                                    'action': get_planned_action(shape_obj is not None, is_kept)})
+        for sk_category_name in self.category_names:
+            label_obj_name = get_wgt_category_obj_name(sk_category_name)
+            planned_objects.append({'name': label_obj_name, 'collection': wgts_col.name,
+                                    'action': get_planned_action(label_obj_name in datablocks.objects_by_name,
+                                                                 self.incremental)})
+
+        thumbs_col = bpy.data.collections.get(self.thumbs_collection_name)
+        bone_tails = {bone_name: tail for bone_name, _parent_name, _head, tail in bone_layout}
+        for sk_category_name, shape_key_base_names, _has_lr_keys in categories:
+            for sk_name in shape_key_base_names:
+                thumb_obj = datablocks.objects_by_name.get(get_sk_thumb_obj_name(sk_name))
+                bone_name = get_sk_bone_name(sk_category_name, sk_name)
+                is_kept = self.incremental and thumbnail_is_up_to_date(
+                    thumb_obj, rig, bone_name, bone_tails[bone_name], thumbs_col)
+                planned_objects.append({'name': thumb_obj.name, 'collection': thumbs_col.name,
+                                        'action': 'KEEP' if is_kept else 'UPDATE'})
+
+        # SKS datablocks, as remove_sks_objects would remove them.
+        removed_objects, removed_curves, removed_collections = gather_sks_leftovers(self.category_names, datablocks)
+        planned_removals = (
+            [{'type': 'OBJECT', 'name': ob.name} for ob in removed_objects] +
+            [{'type': 'CURVE', 'name': t.name} for t in removed_curves] +
+            [{'type': 'COLLECTION', 'name': c.name} for c in removed_collections]
+        )
+
+        return {
+            'version': PLAN_FORMAT_VERSION,
+            'settings': {name: getattr(self, name) for name in PLAN_SETTING_NAMES},
+            'categories': [{'name': name, 'shape_key_base_names': list(base_names), 'has_lr_keys': has_lr_keys}
+                           for name, base_names, has_lr_keys in categories],
+            'bones': planned_bones,
+            'properties': planned_props,
+            'drivers': planned_drivers,
+            'objects': planned_objects,
+            'removals': planned_removals,
+            'estimate': estimate_driver_evaluation(
+                [spec for _id_data, _data_path, _index, spec in driver_layout]),
+        }
+
+    def get_steps(self, split_categories=False):
+        """Return the (label, function) of each step, to be called in order"""
+
+        steps = [
+            ("Widgets", self.setup_widgets),
+            ("Bones", self.setup_bones),
+        ]
+        if split_categories:
+            for category in self.categories:
+                steps.append((f"Category '{category[0]}'",
+                              lambda category=category: self.setup_categories([category])))
+        else:
+            steps.append(("Categories", lambda: self.setup_categories(self.categories)))
+        steps.append(("Cleanup", self.cleanup))
+        return steps
+
+    def run_step(self, label, step):
+        with self.profile.step(label):
+            step()
+
+    def run_all_steps(self):
+        # Each category as its own step, to time them separately.
+        # Categories are set up in Pose Mode, so this doesn't add mode switches.
+        for label, step in self.get_steps(split_categories=True):
+            self.run_step(label, step)
+
+    def log_profile(self):
+        log.info(self.profile.details())
+
+    def write_profile(self, filepath):
+        """Write the profile and stats as JSON, to compare conversions across versions"""
+        from .. import bl_info
+
+        with open(filepath, 'w') as f:
+            json.dump({
+                'addon_version': list(bl_info['version']),
+                'blender_version': bpy.app.version_string,
+                'settings': {name: getattr(self, name) for name in PLAN_SETTING_NAMES},
+                'stats': self.stats.counts,
+                'profile': self.profile.to_dict(),
+            }, f, indent=2)
+
+    def setup_widgets(self):
+        self.profile.call_stage(setup_wgt_objects_and_collection, self.wgts_collection_name,
+                                self.category_names, self.datablocks, self.stats, self.profile,
+                                self.incremental)
+
+    def setup_bones(self):
+        # Do all the bone creation in a single Edit Mode session, then leave it directly
+        # to Pose Mode, where the new pose bones are available, for all the remaining setup.
+        call_stage = self.profile.call_stage
+        bone_layout = self.get_bone_layout(self.rig, self.categories)
+        if self.incremental and not call_stage(find_outdated_bones, self.rig, bone_layout):
+            # Skip Edit Mode altogether, since entering it rebuilds the armature.
+            self.stats.record('bones', 'UNTOUCHED', len(bone_layout))
+        else:
+            self.profile.call_operator(bpy.ops.object.mode_set, mode='EDIT')
+            call_stage(create_bones, self.rig, bone_layout, self.stats, self.incremental)
+        self.profile.call_operator(bpy.ops.object.mode_set, mode='POSE')
+
+        call_stage(move_bones_to_layer, self.rig)
+
+    def setup_categories(self, categories):
+        # Convert the selector widget setup of the given categories at once.
+        rig = self.rig
+        call_stage = self.profile.call_stage
+        call_stage(add_bone_custom_properties, rig, categories, self.stats, self.incremental,
+                   self.use_influence_props)
+
+        call_stage(setup_thumbnails, self.thumbs_collection_name, rig, categories, self.datablocks,
+                   self.stats, self.incremental)
+        call_stage(setup_bone_custom_shapes, rig, categories, self.stats)
+        call_stage(setup_bones_movement, rig, categories, self.stats, self.incremental)
+        call_stage(setup_sk_value_drivers, rig, categories, self.datablocks, self.stats, self.incremental,
+                   self.use_compact_drivers, self.use_influence_props)
+
+    def cleanup(self):
+        self.removal_summary = self.profile.call_stage(
+            remove_sks_objects, self.category_names, self.datablocks, self.purge_orphans)
+        log.info("Removed SKS leftovers: " + format_removal_summary(self.removal_summary))
+
+        # The widgets should not need Python to be evaluated. Flag any driver that does.
+        mesh_obj = self.datablocks.objects_by_name.get(self.geo_name)
+        self.drivers_needing_python = self.profile.call_stage(
+            find_drivers_needing_python, self.rig, mesh_obj.data.shape_keys)
+        for id_name, data_path in self.drivers_needing_python:
+            log.warning(f"Driver needs Python to be evaluated: '{id_name}' {data_path}")
+
+    def report_result(self, operator):
+        log.info(f"Done: {self.stats.summary()}\n{self.stats.details()}")
+        self.log_profile()
+        summary = f"Shape Key widgets: {self.stats.summary()} in {self.profile.summary()}"
+        if self.removal_summary:
+            summary += f". Removed {format_removal_summary(self.removal_summary)}"
+        if self.drivers_needing_python:
+            operator.report({'WARNING'},
+                            f"{summary}\n"
+                            f"{len(self.drivers_needing_python)} drivers need Python to be evaluated. "
+                            "See the console for details")
+        else:
+            operator.report({'INFO'}, summary)
+
+
+class ConvertSKSOperator(Operator):
+    """Settings and validation shared by the operators converting SKS setups to a rig"""
     bl_options = {'UNDO', 'REGISTER'}
 
     rig_name: StringProperty(
@@ -625,109 +1831,124 @@ class SCENE_OT_convert_sks_to_skw(Operator):
         description="Comma separated list of Shape Key categories to generate controls for",
         default="Mouth, Eyes",
     )
+    incremental: BoolProperty(
+        name="Only Update Changes",
+        description="Keep the bones, drivers, thumbnails and widgets of a previous conversion that are "
+                    "still as they should be, and change only what differs. "
+                    "Preserves keyframes and custom property values on the widget bones",
+        default=False,
+    )
+    use_compact_drivers: BoolProperty(
+        name="Compact Drivers",
+        description="Drive each shape key directly from the distance between the cursor and its "
+                    "thumbnail, with a single driver instead of a chain of two drivers",
+        default=False,
+    )
+    use_influence_readouts: BoolProperty(
+        name="Influence Read-outs",
+        description="With compact drivers, still add the driven 'cursor_influence' properties "
+                    "on the thumbnail bones to display the influence of the cursor",
+        default=False,
+    )
+    purge_orphans: BoolProperty(
+        name="Purge SKS Data",
+        description="Also remove the meshes, materials and images that were only used by the "
+                    "removed Shape Key Selector objects",
+        default=False,
+    )
+    plan_mode: EnumProperty(
+        name="Plan",
+        items=[
+            ('NONE', "Convert", "Find the SKS setup in the file and convert it"),
+            ('WRITE', "Write Plan",
+             "Only write what the conversion would change to the plan file, without changing anything"),
+            ('APPLY', "Apply Plan",
+             "Convert following the plan file, with its settings and the setup it found"),
+        ],
+        default='NONE',
+    )
+    plan_filepath: StringProperty(
+        name="Plan File",
+        description="JSON file of the conversion plan. "
+                    "When writing a plan without a file, the plan is printed to the console",
+        subtype='FILE_PATH',
+    )
+    profile_filepath: StringProperty(
+        name="Profile File",
+        description="JSON file to write the time taken by each step and stage of the conversion to, "
+                    "along with counts of mode switches, operator calls and datablocks created and removed",
+        subtype='FILE_PATH',
+    )
 
-    def meets_requirements_for_conversion(self, context) -> bool:
-
-        wgts_col = bpy.data.collections.get(self.wgts_collection_name)
-        if not wgts_col:
-            self.report({'ERROR'},
-                        f"Missing collection named '{self.wgts_collection_name}'\n"
-                        "Needed to hold meshes for bone custom shapes.\n"
-                        "It will be hidden in the viewport.")
+    def meets_requirements_for_conversion(self, context, run) -> bool:
+        problem = run.find_problem()
+        if problem:
+            self.report({'ERROR'}, problem)
             return False
+        return True
 
-        # TODO: SKW should make the custom shape mesh data for the cursors and thumbnail moving.
-        # Then it won't be a user error, but now the mesh data needs to be in the file.
-        cursor_mesh_data = bpy.data.meshes.get("Selector Icon")
-        cursor_l_mesh_data = bpy.data.meshes.get("Selector Icon.L")
-        cursor_r_mesh_data = bpy.data.meshes.get("Selector Icon.R")
-        thumb_selector_mesh_data = bpy.data.meshes.get(get_wgt_thumb_obj_name())
-        if not cursor_mesh_data or not cursor_l_mesh_data or not cursor_r_mesh_data or not thumb_selector_mesh_data:
-            self.report({'ERROR'},
-                        "Missing custom mesh objects for bone custom shapes.\n"
-                        "Needs objects with a mesh called 'Selector Icon', 'Selector Icon.L', "
-                        f"'Selector Icon.R' and '{get_wgt_thumb_obj_name()}'")
-            return False
+    def make_conversion_run(self):
+        if self.plan_mode == 'APPLY':
+            try:
+                with open(bpy.path.abspath(self.plan_filepath)) as f:
+                    run = ConversionRun.from_plan(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                self.report({'ERROR'}, f"Can not read conversion plan '{self.plan_filepath}': {e}")
+                return None
+        else:
+            category_names = [n.strip() for n in self.categories_str.split(',')]
+            run = ConversionRun(
+                self.rig_name, self.geo_name, self.thumbs_collection_name, self.wgts_collection_name,
+                category_names, self.incremental, self.use_compact_drivers, self.use_influence_readouts)
+
+        run.purge_orphans = self.purge_orphans
+        return run
 
-        thumbs_col = bpy.data.collections.get(self.thumbs_collection_name)
-        if not thumbs_col:
-            self.report({'ERROR'},
-                        f"Missing collection named '{self.thumbs_collection_name}'\n"
-                        "Needed to hold thumbnail mesh objects that are parented to the rig.\n"
-                        "It will be shown in the viewport, but hidden in renders.")
-            return False
+    def execute(self, context):
+        """Run the whole conversion at once"""
 
-        mesh_obj = bpy.data.objects[self.geo_name]
-        if not mesh_obj:
-            self.report({'ERROR'},
-                        f"Model/character mesh named '{self.geo_name}' not found")
-            return False
+        run = self.make_conversion_run()
 
-        # Check for a match in SK and thumbnail objects for each SK in each category.
-        category_names = [n.strip() for n in self.categories_str.split(',')]
-        for sk_category_name in category_names:
-            shape_key_names = sorted(find_shape_keys(self.geo_name, sk_category_name))
+        # Check for the required setup to run the conversion and early out
+        # before modifying data if something is missing.
+        if not run or not self.meets_requirements_for_conversion(context, run):
+            return {'CANCELLED'}
 
-            if not shape_key_names:
-                self.report({'ERROR'},
-                            f"Mesh does not have any Shape Keys for category '{sk_category_name}'")
-                return False
+        if self.plan_mode == 'WRITE':
+            self.write_plan(run)
+            return {'FINISHED'}
 
-            # Check for the 'Neutral' Shape Key.
-            neutral_sk_name = f"{sk_category_name} - Neutral"
-            if neutral_sk_name not in shape_key_names:
-                self.report({'ERROR'}, f"Mesh does not have a Shape Key called '{neutral_sk_name}'")
-                return False
+        log.info("Generating Shape Key widget rigs...")
 
-            # Match L and R shapes if they exist.
-            l_sk_names = [sk for sk in shape_key_names if sk.endswith(".L")]
-            r_sk_names = [sk for sk in shape_key_names if sk.endswith(".R")]
-            global_sk_names = [sk for sk in shape_key_names if not sk.endswith(".L") and not sk.endswith(".R")]
-            has_lr_keys = (len(l_sk_names) > 0 or len(r_sk_names) > 0)
-
-            if has_lr_keys:
-                if len(l_sk_names) != len(r_sk_names) or len(global_sk_names) > 1:
-                    self.report({'ERROR'},
-                                f"Mesh has mismatched shape keys for '{sk_category_name}'\n"
-                                f"Category needs 1 'Neutral' and all others (or none) ending with '.L' and '.R'.\n"
-                                f"Found: {len(global_sk_names)} global, {len(l_sk_names)} .L, {len(r_sk_names)} .R")
-                    return False
-
-                for lname, rname in zip(l_sk_names, r_sk_names):
-                    if lname[:-2] != rname[:-2]:
-                        self.report({'ERROR'},
-                                    f"Mesh has mismatched shape keys for '{sk_category_name}'\n"
-                                    f"Shapes ending with '.L' and '.R' need to match in name.\n"
-                                    f"'{lname}' ≠ '{rname}'")
-                        return False
-
-            # Look for a thumbnail object matching each shape key (1 for each L/R pair).
-            sk_base_names = global_sk_names
-            if has_lr_keys:
-                sk_base_names += [sk[:-2] for sk in l_sk_names]
-
-            for sk_name in sk_base_names:
-                thumb_obj = bpy.data.objects.get(get_sk_thumb_obj_name(sk_name))
-                if not thumb_obj:
-                    self.report({'ERROR'},
-                                f"File does not have an already existing thumbnail object called '{sk_name}'")
-                    return False
-
-        rig = bpy.data.objects.get(self.rig_name)
-        if not rig:
-            self.report({'ERROR'}, f"Can not find rig with name '{self.rig_name}' to modify")
-            return False
+        original_state = save_context_state()
+        run.prepare()
+        run.run_all_steps()
+        restore_context_state(original_state)
 
-        # Check for a base bone for each SK category.
-        armature = rig.data
-        root_bone = armature.bones.get('root')
-        if not root_bone:
-            self.report({'ERROR'},
-                        f"Rig does not have an already existing bone called 'root' to parent new bones to")
-            return False
+        self.finish_run(run)
+        return {'FINISHED'}
 
-        return True
+    def finish_run(self, run):
+        run.report_result(self)
+        if self.profile_filepath:
+            run.write_profile(bpy.path.abspath(self.profile_filepath))
 
+    def write_plan(self, run):
+        plan = run.make_plan()
+        plan_json = json.dumps(plan, indent=2)
+        if self.plan_filepath:
+            with open(bpy.path.abspath(self.plan_filepath), 'w') as f:
+                f.write(plan_json)
+        else:
+            log.info(f"Conversion plan:\n{plan_json}")
+        self.report({'INFO'}, f"Shape Key widgets plan: {summarize_plan(plan)}")
+
+
+class SCENE_OT_convert_sks_to_skw(ConvertSKSOperator):
+    bl_idname = "scene.convert_sks_to_skw"
+    bl_label = "Convert SKS to SKW rig"
+    bl_description = """
+        Migrate data on a file that was setup with the Shape Key Selector V1 addon to a rig"""
 
     def invoke(self, context, event):
         """Present dialog to configure the properties before running the operator"""
@@ -735,77 +1956,114 @@ class SCENE_OT_convert_sks_to_skw(Operator):
         return wm.invoke_props_dialog(self)
 
 
-    def execute(self, context):
-
-        # Check for the required setup to run the conversion and early out
-        # before modifying data if something is missing.
-        if not self.meets_requirements_for_conversion(context):
-            return {'CANCELLED'}
-
-        log.info("Generating Shape Key widget rigs...")
+class SCENE_OT_convert_sks_to_skw_modal(ConvertSKSOperator):
+    bl_idname = "scene.convert_sks_to_skw_modal"
+    bl_label = "Convert SKS to SKW rig with Progress"
+    bl_description = """
+        Migrate data on a file that was setup with the Shape Key Selector V1 addon to a rig.
+        Converts one category at a time, showing progress. Esc cancels and undoes the conversion"""
 
-        category_names = [n.strip() for n in self.categories_str.split(',')]
+    # Seconds between processing steps, giving Blender time to redraw and handle events.
+    STEP_INTERVAL = 0.01
 
-        # Save context state to restore it as it was when this operator is done.
-        original_state = {
-            "view3d_mode": bpy.context.object.mode,
-            'active_obj': bpy.context.view_layer.objects.active,
-            'selected_objects': bpy.context.selected_objects,
-        }
+    def invoke(self, context, event):
+        """Start converting step by step on a timer. Execute runs the conversion at once"""
 
-        # Set the rig as the active object so the conversion can switch between edit/pose/object mode as needed.
-        rig = bpy.data.objects.get(self.rig_name)
-        bpy.context.view_layer.objects.active = rig
+        # Planning changes nothing, there is no progress to show.
+        if self.plan_mode == 'WRITE':
+            return self.execute(context)
 
-        setup_wgt_objects_and_collection(self.wgts_collection_name, category_names)
+        run = self.make_conversion_run()
+        if not run or not self.meets_requirements_for_conversion(context, run):
+            return {'CANCELLED'}
 
-        # Convert the selector widget setup for each shape key category.
-        for sk_category_name in category_names:
+        log.info("Generating Shape Key widget rigs step by step...")
 
-            # Gather the set of thumbnail and shape key names to configure the widget.
-            shape_key_names = find_shape_keys(self.geo_name, sk_category_name)
-            l_sk_names = [sk for sk in shape_key_names if sk.endswith(".L")]
-            global_sk_names = [sk for sk in shape_key_names if not sk.endswith(".L") and not sk.endswith(".R")]
+        # Store the state before the conversion as an undo step, to roll back to if cancelled.
+        bpy.ops.ed.undo_push(message="Before converting SKS to SKW rig")
 
-            # Prepare set of shape key names matching the thumbnails, by stripping '.L' endings
-            # and having only one base name per pair.
-            has_lr_keys = any(sk.endswith(".L") for sk in shape_key_names)
-            shape_key_base_names = global_sk_names
-            if has_lr_keys:
-                shape_key_base_names += [sk[:-2] for sk in l_sk_names]
+        self._run = run
+        self._original_state = save_context_state()
+        run.prepare()
+        self._steps = run.get_steps(split_categories=True)
+        self._next_step_idx = 0
 
-            log.info(f"... Creating '{sk_category_name}' widget with {shape_key_base_names} thumbnails.")
+        wm = context.window_manager
+        wm.progress_begin(0, len(self._steps))
+        self._timer = wm.event_timer_add(self.STEP_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        self.show_status(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.end_modal(context)
+            self.roll_back()
+            self.report({'WARNING'}, "Conversion cancelled. Changes were undone")
+            return {'CANCELLED'}
 
-            create_bones(rig, sk_category_name, shape_key_base_names, has_lr_keys)
-            move_bones_to_layer(rig)
-            add_bone_custom_properties(rig, sk_category_name, shape_key_base_names, has_lr_keys)
+        # Block other events while converting, but keep redrawing the UI.
+        if event.type != 'TIMER':
+            return {'RUNNING_MODAL'}
 
-            setup_thumbnails(self.thumbs_collection_name, rig, shape_key_base_names)
-            setup_bone_custom_shapes(rig, sk_category_name, shape_key_base_names, has_lr_keys)
-            setup_bones_movement(rig, sk_category_name, shape_key_base_names, has_lr_keys)
-            setup_sk_value_drivers(self.geo_name, rig, sk_category_name, shape_key_base_names, has_lr_keys)
+        label, step = self._steps[self._next_step_idx]
+        try:
+            self._run.run_step(label, step)
+        except Exception:
+            log.exception(f"Conversion failed at step '{label}'")
+            self.end_modal(context)
+            self.roll_back()
+            self.report({'ERROR'}, f"Conversion failed at step '{label}'. Changes were undone")
+            return {'CANCELLED'}
+        self._next_step_idx += 1
+        context.window_manager.progress_update(self._next_step_idx)
 
-        remove_sks_objects(category_names)
+        if self._next_step_idx < len(self._steps):
+            self.show_status(context)
+            return {'RUNNING_MODAL'}
 
-        # Restore context for the user.
-        try:
-            bpy.context.view_layer.objects.active = original_state['active_obj']
-            for ob in original_state['selected_objects']:
-                ob.select_set(True)
-            if bpy.context.active_object:
-                bpy.ops.object.mode_set(mode=original_state['view3d_mode'])
-        except ReferenceError:
-            # The selection had objects which were deleted. Can't restore context to that.
-            pass
-
-        log.info("Done")
+        self.end_modal(context)
+        restore_context_state(self._original_state)
+        self.finish_run(self._run)
         return {'FINISHED'}
 
+    def cancel(self, context):
+        # Called when Blender cancels the operator, e.g. on closing the window or loading another file.
+        # Undo is not safe then: after loading a file, it would revert that file instead.
+        # So an interrupted conversion is left half-built, for undo or converting again to complete.
+        self.end_modal(context)
+        log.warning(f"Conversion interrupted after {self._next_step_idx}/{len(self._steps)} steps, "
+                    "leaving the rig half-built. Undo or convert again to complete it")
+
+    def show_status(self, context):
+        label = self._steps[self._next_step_idx][0]
+        context.workspace.status_text_set(
+            f"Converting SKS to SKW rig: {label} ({self._next_step_idx + 1}/{len(self._steps)}). "
+            "Esc to cancel")
+
+    def end_modal(self, context):
+        wm = context.window_manager
+        if self._timer:
+            wm.event_timer_remove(self._timer)
+            self._timer = None
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+    def roll_back(self):
+        # Steps don't leave the rig in Edit Mode, where undo would only revert the bone edits,
+        # but a step that failed halfway might have.
+        if bpy.context.object and bpy.context.object.mode == 'EDIT':
+            bpy.ops.object.mode_set(mode='POSE')
+        # Undo reverts the whole file back to the state stored before converting.
+        self._run.log_profile()
+        bpy.ops.ed.undo()
+
 
 # Add-on Registration #############################################################################
 
 classes = (
     SCENE_OT_convert_sks_to_skw,
+    SCENE_OT_convert_sks_to_skw_modal,
 )
 
 
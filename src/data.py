@@ -20,6 +20,27 @@ from bpy.types import (
 )
 
 from .. import ADDON_ID
+from . import previews, sync
+
+
+def tag_category_changed(self, context):
+    # Follow the renames of the mesh's shape keys and
+    # sync the widget rig of the category's mesh after the edits.
+    register_mesh(self.id_data)
+    sync.tag_category(self.id_data, self)
+
+
+def tag_shape_key_category_changed(self, context):
+    mesh = self.id_data
+    register_mesh(mesh)
+    # The shape key entry is in the 'shape_keys' of a category.
+    category_path = self.path_from_id().rsplit('.shape_keys', 1)[0]
+    category = mesh.path_resolve(category_path)
+    if mesh.shape_keys:
+        index = get_shape_key_index(mesh.shape_keys, self.shape_key_name, category.is_mirrored)
+        if self.shape_key_index != index:
+            self.shape_key_index = index
+    sync.tag_category(mesh, category)
 
 
 class ShapeKeysWidgetShapeKey(PropertyGroup):
@@ -38,6 +59,16 @@ class ShapeKeysWidgetShapeKey(PropertyGroup):
     shape_key_name: StringProperty(
         name="Shape Key",
         description="Name of a Blender native Shape Key",
+        update=tag_shape_key_category_changed,
+    )
+    # The name alone doesn't tell which key a rename came from. Along with the names of the Key
+    # by index at the last check, the index does. See patch_renamed_shape_keys().
+    shape_key_index: IntProperty(
+        name="Shape Key Index",
+        description="Index of the Blender native Shape Key, or of its '.L' or '.R' key in mirrored "
+                    "categories, as of the last check",
+        default=-1,
+        options={'HIDDEN'},
     )
     # TODO thumbnail
 
@@ -55,18 +86,21 @@ class ShapeKeysWidgetCategory(PropertyGroup):
         name="Name",
         description="Name to display in the UI",
         default="Category",
+        update=tag_category_changed,
     )
     is_mirrored: BoolProperty(
         name="Mirrored",
         description="If the widget should have separate left and right cursors. "
                     "Shape Keys should then have .L and .R",
         default=False,
+        update=tag_category_changed,
     )
     neutral_key_name: StringProperty(
         name="Neutral Key",
         description="Key with no changes. Could be the Basis key or a key that "
                     "the shapes in this category are Relative To",
         default="Basis",
+        update=tag_category_changed,
     )
     shape_keys: CollectionProperty(
         type=ShapeKeysWidgetShapeKey,
@@ -83,6 +117,7 @@ class ShapeKeysWidgetCategory(PropertyGroup):
         name="Columns",
         description="Number of columns to arrange the Shape Keys in",
         default=5,
+        update=tag_category_changed,
     )
     # TODO camera setup
 
@@ -102,46 +137,262 @@ class ShapeKeysWidgetPreferences(AddonPreferences):
         default="Mouth, Eyes",
     )
 
+    use_compact_categories: BoolProperty(
+        name="Compact Categories",
+        description="Draw the shape keys of each category only as a grid of thumbnails, "
+                    "without the list of names and the preview of the active key",
+        default=False,
+    )
+    grid_rows: IntProperty(
+        name="Grid Rows",
+        description="Rows of thumbnails shown at once in the category grids. "
+                    "Only the shown rows are drawn, scroll to see the others",
+        default=3,
+        min=1,
+        max=20,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        col = layout.column()
+        col.prop(self, "character_name")
+        col.prop(self, "categories_str")
+        col.separator()
+        col.prop(self, "use_compact_categories")
+        col.prop(self, "grid_rows")
+
 
 # Patching named references #######################################################################
 
+# The categories refer to shape keys by name, and by index as of the last check. To follow renames,
+# the names of the shape keys of each Key are kept by index too: {Key session_uid: [name, ...]}.
+# Renamed keys show as names that are gone and new names, at the same place among the other keys.
+key_name_snapshots = {}
+
+# The same names as a set, for the UI to check which entries match a shape key in constant time.
+# Dropped along with a changed snapshot, on renames, undo/redo and file load. Also rebuilt when
+# the number of shape keys changes, as adding or removing keys doesn't notify.
+key_name_sets = {}
+
+# Meshes with categories, the only ones whose shape key renames are followed: {session_uid: name}.
+# By session_uid, which stays the same when the mesh is renamed, with the last known name to find
+# the mesh without going through all of them.
+# Built on file load and extended when categories are edited. Meshes stay in it for the session,
+# so that undoing the removal of their last category still follows their renames.
+# While it's empty, there is no subscription to renames and undo/redo return right away.
+meshes_with_categories = {}
+
 # RNA msg_bus subscription owner.
 owner = object()
 
 
-def msgbus_on_shapekey_rename(*args):
-    # On any shape key name change, try to patch the name references.
-    on_shapekey_rename()
-
-
-def on_shapekey_rename(*args):
-    # This will replace all shape keys with a mismatched name, not only the one that was renamed.
-    # TODO Check for a better way to get the data change.
-    context = bpy.context
-    sel_shape_key_index = context.object.active_shape_key_index
-    mesh = context.object.data
-    print("Name change! ", sel_shape_key_index)
-
-    shape_keys = mesh.shape_keys.key_blocks
-    sk_names_in_mesh = shape_keys.keys()
-    cats = mesh.shape_key_cats
-    for cat in cats:
+def register_mesh(mesh):
+    """Follow the renames of the mesh's shape keys, if not yet"""
+
+    if mesh.session_uid in meshes_with_categories:
+        meshes_with_categories[mesh.session_uid] = mesh.name
+        # Snapshot shape keys added to the mesh after it was registered.
+        if mesh.shape_keys and mesh.shape_keys.session_uid not in key_name_snapshots:
+            snapshot_key_names(mesh.shape_keys)
+        return
+
+    if not meshes_with_categories:
+        subscribe_to_shapekey_name_changes(None)
+    meshes_with_categories[mesh.session_uid] = mesh.name
+    if mesh.shape_keys:
+        snapshot_key_names(mesh.shape_keys)
+
+
+def snapshot_key_names(key):
+    key_name_snapshots[key.session_uid] = key.key_blocks.keys()
+    key_name_sets.pop(key.session_uid, None)
+
+
+def get_key_name_set(key):
+    """Return the names of the shape keys of the Key as a set, cached"""
+    names = key_name_sets.get(key.session_uid)
+    if names is None or len(names) != len(key.key_blocks):
+        names = key_name_sets[key.session_uid] = set(key.key_blocks.keys())
+    return names
+
+
+def get_shape_key_index(key, name, is_mirrored=False):
+    """Return the index of the shape key, or of the first of its '.L' and '.R' keys if mirrored, or -1"""
+    key_blocks = key.key_blocks
+    for key_name in ([name + ".L", name + ".R"] if is_mirrored else [name]):
+        index = key_blocks.find(key_name)
+        if index != -1:
+            return index
+    return -1
+
+
+def get_new_key_indices(old_names, names):
+    """Return the index in names of each of the old shape key names, following renames, or -1 if removed"""
+
+    old_name_set = set(old_names)
+    name_set = set(names)
+    index_of_name = {name: index for index, name in enumerate(names)}
+    new_indices = [index_of_name.get(name, -1) for name in old_names]
+
+    # Renames don't reorder the keys: between the keys that kept their name, the names that are gone
+    # were renamed to the new names, in order, when there are as many. Otherwise they were removed.
+    old_index = index = 0
+    while True:
+        gone_indices = []
+        while old_index < len(old_names) and old_names[old_index] not in name_set:
+            gone_indices.append(old_index)
+            old_index += 1
+        added_indices = []
+        while index < len(names) and names[index] not in old_name_set:
+            added_indices.append(index)
+            index += 1
+        if len(gone_indices) == len(added_indices):
+            for gone_index, added_index in zip(gone_indices, added_indices):
+                new_indices[gone_index] = added_index
+        if old_index >= len(old_names) or index >= len(names):
+            return new_indices
+        old_index += 1
+        index += 1
+
+
+def get_renamed_key_names(old_names, names, new_indices):
+    """Return {old name: new name} of the renamed shape keys and of the base names of '.L' and '.R' pairs"""
+
+    renames = {old_names[old_index]: names[index] for old_index, index in enumerate(new_indices)
+               if index != -1 and old_names[old_index] != names[index]}
+
+    # Mirrored categories refer to '.L' and '.R' pairs by their base name. The base name is
+    # renamed only once none of the pair's keys has it, and if they were renamed alike.
+    name_set = set(names)
+    old_name_set = set(old_names)
+    new_bases_of_base = {}
+    for old_name, name in renames.items():
+        if old_name[-2:] in {'.L', '.R'} and old_name[-2:] == name[-2:]:
+            new_bases_of_base.setdefault(old_name[:-2], set()).add(name[:-2])
+    for base, new_bases in new_bases_of_base.items():
+        if (len(new_bases) == 1 and base not in old_name_set
+                and base + ".L" not in name_set and base + ".R" not in name_set):
+            renames[base] = new_bases.pop()
+    return renames
+
+
+def patch_renamed_shape_keys(mesh):
+    """Update the shape key names in the categories of the mesh, touching only the renamed ones"""
+
+    if not mesh.shape_keys or not mesh.shape_key_cats:
+        return
+    key = mesh.shape_keys
+    names = key.key_blocks.keys()
+    old_names = key_name_snapshots.get(key.session_uid)
+    if old_names == names:
+        return
+    snapshot_key_names(key)
+    # Without a snapshot, renames can't be told apart.
+    if old_names is None:
+        return
+
+    new_indices = get_new_key_indices(old_names, names)
+    renames = get_renamed_key_names(old_names, names, new_indices)
+    if renames:
+        log.debug(f"Patching renamed shape keys of '{mesh.name}': {renames}")
+    old_index_of_name = {name: index for index, name in enumerate(old_names)}
+    index_of_name = {name: index for index, name in enumerate(names)}
+
+    for cat in mesh.shape_key_cats:
+        if cat.neutral_key_name in renames:
+            cat.neutral_key_name = renames[cat.neutral_key_name]
         for sk in cat.shape_keys:
-            if sk.shape_key_name not in sk_names_in_mesh:
-                sk.shape_key_name = shape_keys[sel_shape_key_index].name
+            if cat.is_mirrored:
+                new_name = renames.get(sk.shape_key_name)
+                if new_name is not None:
+                    sk.shape_key_name = new_name
+                index = index_of_name.get(sk.shape_key_name + ".L", -1)
+                if index == -1:
+                    index = index_of_name.get(sk.shape_key_name + ".R", -1)
+            else:
+                # The key of the entry, by its index if still valid for the snapshot, else by its name.
+                old_index = sk.shape_key_index
+                if not (0 <= old_index < len(old_names) and old_names[old_index] == sk.shape_key_name):
+                    old_index = old_index_of_name.get(sk.shape_key_name, -1)
+                index = new_indices[old_index] if old_index != -1 else index_of_name.get(sk.shape_key_name, -1)
+                if index != -1 and names[index] != sk.shape_key_name:
+                    sk.shape_key_name = names[index]
+            # Keys added, removed or moved shift the indices of the others.
+            if sk.shape_key_index != index:
+                sk.shape_key_index = index
+
+
+def find_mesh(session_uid, mesh_name):
+    """Return the mesh with the session_uid, looked up by its last known name first, or None"""
+    mesh = bpy.data.meshes.get(mesh_name)
+    if mesh and mesh.session_uid == session_uid:
+        return mesh
+    # Renamed since.
+    return next((mesh for mesh in bpy.data.meshes if mesh.session_uid == session_uid), None)
+
+
+def patch_all_renamed_shape_keys():
+    # Any mesh with categories, whether its object is active or not.
+    for session_uid, mesh_name in meshes_with_categories.items():
+        mesh = find_mesh(session_uid, mesh_name)
+        if mesh:
+            # Only the value changes, which is fine while iterating.
+            meshes_with_categories[session_uid] = mesh.name
+            patch_renamed_shape_keys(mesh)
+
+
+def tag_all_categories():
+    # Syncing only changes the widgets whose category differs from its state at the last sync.
+    for session_uid, mesh_name in meshes_with_categories.items():
+        mesh = find_mesh(session_uid, mesh_name)
+        if mesh:
+            for cat in mesh.shape_key_cats:
+                sync.tag_category(mesh, cat)
+
+
+def msgbus_on_shapekey_rename(*args):
+    # On any shape key name change, patch the name references.
+    # The notification doesn't tell which Key, so the registered ones are checked against their snapshot.
+    patch_all_renamed_shape_keys()
 
 
 @persistent
 def on_undo(scene):
-    # TODO - not sure I want to do this.
-    print("Undo")
-    on_shapekey_rename()
+    # Undo and redo restore the shape key names along with the categories, but the categories
+    # can be from before they were patched for a rename. Compare with the names before the step.
+    # The step can also bring back category edits that the widget rig doesn't have, or drop edits
+    # still waiting to be synced, so all the categories are synced again.
+    if meshes_with_categories:
+        previews.clear_thumbnail_icon_ids()
+        patch_all_renamed_shape_keys()
+        tag_all_categories()
 
 
 @persistent
 def on_redo(scene):
-    print("Redo")
-    on_shapekey_rename()
+    if meshes_with_categories:
+        previews.clear_thumbnail_icon_ids()
+        patch_all_renamed_shape_keys()
+        tag_all_categories()
+
+
+def register_meshes_with_categories():
+    """Rebuild the registry of meshes with categories from the file, with their shape key names"""
+
+    meshes_with_categories.clear()
+    key_name_snapshots.clear()
+    key_name_sets.clear()
+    previews.clear_thumbnail_icon_ids()
+    bpy.msgbus.clear_by_owner(owner)
+    for mesh in bpy.data.meshes:
+        if mesh.shape_key_cats:
+            register_mesh(mesh)
+
+
+@persistent
+def on_load_post(scene):
+    register_meshes_with_categories()
 
 
 def subscribe_to_shapekey_name_changes(scene):
@@ -172,21 +423,35 @@ def register():
         name="Shape Key Categories",
         description="Arrangements of Shape Keys for rig widgets",
     )
+    bpy.types.Mesh.shape_key_widget_rig = PointerProperty(
+        type=bpy.types.Object,
+        name="Widget Rig",
+        description="Armature with the widgets of the shape key categories. "
+                    "Category edits update its widgets",
+        poll=lambda self, ob: ob.type == 'ARMATURE',
+    )
 
-    subscribe_to_shapekey_name_changes(None)
-    bpy.app.handlers.load_post.append(subscribe_to_shapekey_name_changes)
+    # bpy.data is not available while registering on startup, so find the meshes right after.
+    bpy.app.timers.register(register_meshes_with_categories, first_interval=0.0)
+    bpy.app.handlers.load_post.append(on_load_post)
     # The RNA subscription doesn't trigger on undo/redo.
     bpy.app.handlers.undo_post.append(on_undo)
     bpy.app.handlers.redo_post.append(on_redo)
 
 
 def unregister():
+    if bpy.app.timers.is_registered(register_meshes_with_categories):
+        bpy.app.timers.unregister(register_meshes_with_categories)
+    if bpy.app.timers.is_registered(sync.sync_pending):
+        bpy.app.timers.unregister(sync.sync_pending)
+    previews.unregister()
     bpy.app.handlers.redo_post.remove(on_redo)
     bpy.app.handlers.undo_post.remove(on_undo)
-    bpy.app.handlers.load_post.remove(subscribe_to_shapekey_name_changes)
+    bpy.app.handlers.load_post.remove(on_load_post)
     bpy.msgbus.clear_by_owner(owner)
 
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
 
+    del bpy.types.Mesh.shape_key_widget_rig
     del bpy.types.Mesh.shape_key_cats
@@ -0,0 +1,229 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Quick thumbnails of the shape keys of the categories of a mesh, drawn with NumPy instead of rendered
+
+Each thumbnail shows the mesh from the front with its shape key at 1.0, colored by how far each
+vertex moved, from grey for still to red for the most moved vertex of that key.
+The triangles are projected orthographically on the same region as the rendered thumbnails and
+rasterized with a depth buffer, all in vectorized NumPy: it doesn't need a GPU nor a render engine,
+so it also works in background Blender. The mesh at rest is rasterized once, and each thumbnail only
+redraws the triangles that its keys move, so the keys of a face are drawn in about a second.
+The thumbnails are packed in the file as the '<shape key name>.png' images that the UI shows.
+"""
+
+import logging
+import time
+
+import bpy
+import numpy as np
+
+from .thumbnails import FRAME_MARGIN, MIN_VERTEX_OFFSET, get_frame_bounds, get_thumbnail_jobs, get_vertex_coords
+
+log = logging.getLogger(__package__)
+
+
+DELTA_THUMBNAIL_RESOLUTION = 128
+STILL_COLOR = np.array([0.6, 0.6, 0.6], dtype=np.float32)
+MOVED_COLOR = np.array([1.0, 0.1, 0.05], dtype=np.float32)
+
+
+def get_triangles(mesh):
+    mesh.calc_loop_triangles()
+    triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", triangles)
+    return triangles.reshape(-1, 3)
+
+
+def get_pixel_coords(world_coords, frame_bounds, resolution):
+    """Return the coordinates projected on the image: x, z in pixels and y as depth, away from the camera"""
+
+    bounds_min, bounds_max = np.array(frame_bounds[0]), np.array(frame_bounds[1])
+    center = (bounds_min + bounds_max) / 2
+    size = max(bounds_max[0] - bounds_min[0], bounds_max[2] - bounds_min[2], 1e-4) * FRAME_MARGIN
+    pixel_coords = np.empty_like(world_coords)
+    pixel_coords[:, 0] = (world_coords[:, 0] - center[0]) / size * resolution + resolution / 2
+    pixel_coords[:, 1] = (world_coords[:, 2] - center[2]) / size * resolution + resolution / 2
+    pixel_coords[:, 2] = world_coords[:, 1]
+    return pixel_coords
+
+
+def get_fragments(pixel_coords, triangles, tri_idxs, resolution):
+    """Return the pixels covered by the given triangles, as (triangle indices, x, y, depth,
+    barycentric weights) arrays with an item per pixel of each triangle
+    """
+
+    corners = pixel_coords[triangles[tri_idxs]]  # (triangle, corner, xyz)
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    denominator = (b[:, 1] - c[:, 1]) * (a[:, 0] - c[:, 0]) + (c[:, 0] - b[:, 0]) * (a[:, 1] - c[:, 1])
+
+    # Pixel bounding box of each triangle, clipped to the image.
+    x_min = np.clip(np.floor(corners[:, :, 0].min(axis=1)), 0, resolution).astype(np.int64)
+    x_max = np.clip(np.ceil(corners[:, :, 0].max(axis=1)), 0, resolution).astype(np.int64)
+    y_min = np.clip(np.floor(corners[:, :, 1].min(axis=1)), 0, resolution).astype(np.int64)
+    y_max = np.clip(np.ceil(corners[:, :, 1].max(axis=1)), 0, resolution).astype(np.int64)
+    widths = x_max - x_min
+    num_pixels = widths * (y_max - y_min)
+    # Skip the triangles out of the image and the ones seen edge-on.
+    num_pixels[np.abs(denominator) < 1e-12] = 0
+
+    # A fragment per pixel of the bounding box of each triangle, all at once.
+    frag_idxs = np.repeat(np.arange(len(tri_idxs)), num_pixels)
+    frag_offsets = np.arange(num_pixels.sum()) - np.repeat(np.cumsum(num_pixels) - num_pixels, num_pixels)
+    frag_widths = widths[frag_idxs]
+    px = x_min[frag_idxs] + frag_offsets % frag_widths
+    py = y_min[frag_idxs] + frag_offsets // frag_widths
+
+    # Barycentric coordinates of the pixel centers, to keep the pixels inside the triangles.
+    a, b, c = a[frag_idxs], b[frag_idxs], c[frag_idxs]
+    x, y = px + 0.5, py + 0.5
+    frag_denominator = denominator[frag_idxs]
+    w_a = ((b[:, 1] - c[:, 1]) * (x - c[:, 0]) + (c[:, 0] - b[:, 0]) * (y - c[:, 1])) / frag_denominator
+    w_b = ((c[:, 1] - a[:, 1]) * (x - c[:, 0]) + (a[:, 0] - c[:, 0]) * (y - c[:, 1])) / frag_denominator
+    weights = np.stack([w_a, w_b, 1.0 - w_a - w_b], axis=1)
+    is_inside = (weights >= 0.0).all(axis=1)
+
+    depth = (weights[is_inside] * np.stack([a[:, 2], b[:, 2], c[:, 2]], axis=1)[is_inside]).sum(axis=1)
+    return tri_idxs[frag_idxs[is_inside]], px[is_inside], py[is_inside], depth, weights[is_inside]
+
+
+def get_fragment_colors(fragments, triangles, vertex_values, triangle_shading):
+    frag_tri_idxs, _px, _py, _depth, weights = fragments
+    frag_values = (weights * vertex_values[triangles[frag_tri_idxs]]).sum(axis=1)
+    frag_colors = STILL_COLOR + (MOVED_COLOR - STILL_COLOR) * frag_values[:, None]
+    return frag_colors * triangle_shading[frag_tri_idxs, None]
+
+
+def get_nearest_fragments(px, py, depth, resolution):
+    """Return the indices of the nearest fragment of each pixel covered by the fragments"""
+
+    # Sorted by pixel, then by depth: the first fragment of each pixel is the nearest.
+    # (assigning several values to the same pixel at once doesn't define which one is kept)
+    pixel_idxs = py * resolution + px
+    order = np.lexsort((depth, pixel_idxs))
+    sorted_pixel_idxs = pixel_idxs[order]
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = sorted_pixel_idxs[1:] != sorted_pixel_idxs[:-1]
+    return order[is_first]
+
+
+def draw_fragments(image, depth_buffer, px, py, depth, colors):
+    """Draw the fragments in front of the depth buffer, and return the indices of the drawn ones"""
+
+    frag_idxs = get_nearest_fragments(px, py, depth, len(image))
+    frag_idxs = frag_idxs[depth[frag_idxs] < depth_buffer[py[frag_idxs], px[frag_idxs]]]
+    px, py = px[frag_idxs], py[frag_idxs]
+    depth_buffer[py, px] = depth[frag_idxs]
+    image[py, px, :3] = colors[frag_idxs]
+    image[py, px, 3] = 1.0
+    return frag_idxs
+
+
+def get_triangle_shading(world_coords, triangles):
+    # Lit from the camera: faces turned away from it are darker.
+    corners = world_coords[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    return (0.3 + 0.7 * np.abs(normals[:, 1]) / lengths).astype(np.float32)
+
+
+def draw_delta_thumbnails(mesh_obj, jobs, resolution=DELTA_THUMBNAIL_RESOLUTION, frame='SHAPE_KEYS'):
+    """Draw the thumbnail of each job, with its shape keys at 1.0, and return {job name: RGBA pixels}"""
+
+    mesh = mesh_obj.data
+    key_blocks = mesh.shape_keys.key_blocks
+    key_names = [n for job in jobs for n in job['key_names']] if frame == 'SHAPE_KEYS' else None
+    frame_bounds = get_frame_bounds(mesh_obj, key_names)
+    triangles = get_triangles(mesh)
+    matrix = np.array(mesh_obj.matrix_world, dtype=np.float32)
+
+    reference_coords = get_vertex_coords(key_blocks[0].data)
+    # Shared by the keys relative to the same key, read once.
+    coords_by_key_name = {key_blocks[0].name: reference_coords}
+
+    def get_key_coords(key_block):
+        if key_block.name not in coords_by_key_name:
+            coords_by_key_name[key_block.name] = get_vertex_coords(key_block.data)
+        return coords_by_key_name[key_block.name]
+
+    # The still triangles look the same in all the thumbnails: rasterized once, at rest.
+    all_tri_idxs = np.arange(len(triangles))
+    rest_world_coords = reference_coords @ matrix[:3, :3].T + matrix[:3, 3]
+    rest_pixel_coords = get_pixel_coords(rest_world_coords, frame_bounds, resolution)
+    rest_fragments = get_fragments(rest_pixel_coords, triangles, all_tri_idxs, resolution)
+    rest_shading = get_triangle_shading(rest_world_coords, triangles)
+    rest_colors = get_fragment_colors(rest_fragments, triangles, np.zeros(len(reference_coords), dtype=np.float32),
+                                      rest_shading)
+    rest_frag_tri_idxs, rest_px, rest_py, rest_depth, _weights = rest_fragments
+    rest_image = np.zeros((resolution, resolution, 4), dtype=np.float32)
+    rest_depth_buffer = np.full((resolution, resolution), np.inf, dtype=np.float32)
+    drawn_idxs = draw_fragments(rest_image, rest_depth_buffer, rest_px, rest_py, rest_depth, rest_colors)
+    # Triangle shown by each pixel, or the extra last index for none.
+    rest_pixel_tri_idxs = np.full((resolution, resolution), len(triangles), dtype=np.int64)
+    rest_pixel_tri_idxs[rest_py[drawn_idxs], rest_px[drawn_idxs]] = rest_frag_tri_idxs[drawn_idxs]
+
+    pixels_by_name = {}
+    for job in jobs:
+        offsets = sum(get_key_coords(key_blocks[key_name]) - get_key_coords(key_blocks[key_name].relative_key)
+                      for key_name in job['key_names'])
+        distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+        is_moved_vertex = distances > MIN_VERTEX_OFFSET
+        is_moved_triangle = np.zeros(len(triangles) + 1, dtype=bool)
+        is_moved_triangle[:-1] = (is_moved_vertex[triangles[:, 0]] | is_moved_vertex[triangles[:, 1]] |
+                                  is_moved_vertex[triangles[:, 2]])
+        moved_tri_idxs = np.flatnonzero(is_moved_triangle)
+
+        # Starting from the thumbnail at rest, the pixels that showed moved triangles are drawn
+        # again with the still triangles behind them.
+        image = rest_image.copy()
+        depth_buffer = rest_depth_buffer.copy()
+        is_uncovered = is_moved_triangle[rest_pixel_tri_idxs]
+        image[is_uncovered] = 0.0
+        depth_buffer[is_uncovered] = np.inf
+        is_redrawn = is_uncovered[rest_py, rest_px] & ~is_moved_triangle[rest_frag_tri_idxs]
+        draw_fragments(image, depth_buffer, rest_px[is_redrawn], rest_py[is_redrawn], rest_depth[is_redrawn],
+                       rest_colors[is_redrawn])
+
+        # Then the moved triangles, in front of or behind the still ones.
+        world_coords = rest_world_coords.copy()
+        world_coords[is_moved_vertex] = ((reference_coords[is_moved_vertex] + offsets[is_moved_vertex]) @
+                                         matrix[:3, :3].T + matrix[:3, 3])
+        pixel_coords = rest_pixel_coords.copy()
+        pixel_coords[is_moved_vertex] = get_pixel_coords(world_coords[is_moved_vertex], frame_bounds, resolution)
+        max_distance = distances.max()
+        vertex_values = distances / max_distance if max_distance > 0.0 else distances
+        shading = rest_shading.copy()
+        shading[moved_tri_idxs] = get_triangle_shading(world_coords, triangles[moved_tri_idxs])
+        moved_fragments = get_fragments(pixel_coords, triangles, moved_tri_idxs, resolution)
+        moved_colors = get_fragment_colors(moved_fragments, triangles, vertex_values, shading)
+        _frag_tri_idxs, px, py, depth, _weights = moved_fragments
+        draw_fragments(image, depth_buffer, px, py, depth, moved_colors)
+        pixels_by_name[job['name']] = image
+    return pixels_by_name
+
+
+def make_delta_thumbnail_images(mesh_obj, resolution=DELTA_THUMBNAIL_RESOLUTION, frame='SHAPE_KEYS'):
+    """Draw the thumbnails of the categories of the mesh into '<shape key name>.png' images, and return them"""
+
+    start_time = time.perf_counter()
+    jobs = get_thumbnail_jobs(mesh_obj.data)
+    pixels_by_name = draw_delta_thumbnails(mesh_obj, jobs, resolution, frame)
+
+    images = []
+    for name, pixels in pixels_by_name.items():
+        img = bpy.data.images.get(f"{name}.png")
+        if not img:
+            img = bpy.data.images.new(f"{name}.png", resolution, resolution, alpha=True)
+        elif tuple(img.size) != (resolution, resolution):
+            img.scale(resolution, resolution)
+        img.pixels.foreach_set(pixels.ravel())
+        # Generated images are lost on save unless packed.
+        img.pack()
+        if img.preview:
+            img.preview.reload()
+        images.append(img)
+
+    log.info(f"Drew {len(images)} delta thumbnails of '{mesh_obj.name}' "
+             f"in {time.perf_counter() - start_time:.3f}s")
+    return images
@@ -5,6 +5,7 @@ import uuid
 
 import bpy
 from bpy.props import (
+    BoolProperty,
     CollectionProperty,
     EnumProperty,
     IntProperty,
@@ -15,7 +16,7 @@ from bpy.types import (
     Operator,
 )
 
-from . import utils
+from . import api, delta_thumbnails, previews, sync, thumbnails, utils
 from .data import ShapeKeysWidgetCategory
 
 import logging
@@ -276,11 +277,20 @@ class OperatorDelShapeKeysWidgetCategory(ShapeKeyWidgetsCategoryOperator):
         cat = cats[self.cat_idx]
         log.debug(f"Deleting Category '{cat.widget_name}'")
 
-        # TODO tear down widget from rig.
+        widget_name = cat.widget_name
+        sync.tag_category(context.mesh, cat)
 
         # Unlink the category.
         cats.remove(self.cat_idx)
 
+        # Tear down the widget from the rig, as part of this undo step,
+        # keeping what the other categories still use.
+        rig = context.mesh.shape_key_widget_rig
+        if rig:
+            stats = api.remove_widgets(rig, context.object, [widget_name],
+                                       kept_widget_specs=api.get_category_widget_specs(context.mesh))
+            log.info(f"Removed '{widget_name}' widget from '{rig.name}': {stats.summary()}")
+
         return {'FINISHED'}
 
 
@@ -428,10 +438,18 @@ class OperatorDelShapeKeyFromCategory(ShapeKeyWidgetsCategoryOperator):
 
         log.info(f"Removing SK '{sk.shape_key_name}' from '{cat.widget_name}' category")
 
-        # TODO tear down data.
-
         # Remove the Shape Key configuration from the category.
+        sk_name = sk.shape_key_name
         cat.shape_keys.remove(sk_idx_to_remove)
+        sync.tag_category(context.mesh, cat)
+
+        # Tear down the thumbnail of the key from the rig, as part of this undo step,
+        # keeping what the categories still use.
+        # The sync then moves the remaining thumbnails to close the gap in the grid.
+        rig = context.mesh.shape_key_widget_rig
+        if rig:
+            api.remove_widget_keys(rig, context.object, cat.widget_name, [sk_name],
+                                   kept_widget_specs=api.get_category_widget_specs(context.mesh))
 
         # Ensure the selected shape key is within range.
         num_sks = len(cat.shape_keys)
@@ -476,6 +494,7 @@ class OperatorMoveShapeKeyInCategory(ShapeKeyWidgetsCategoryOperator):
 
         cat.shape_keys.move(active_idx, new_idx)
         cat.active_sk_idx = new_idx
+        sync.tag_category(context.mesh, cat)
 
         return {'FINISHED'}
 
@@ -535,6 +554,261 @@ class OperatorMuteShapeKeysInCategory(ShapeKeyWidgetsCategoryOperator):
         return {'FINISHED'}
 
 
+def find_mesh_rig(mesh_obj):
+    """Return the armature deforming the mesh object, if any"""
+    for mod in mesh_obj.modifiers:
+        if mod.type == 'ARMATURE' and mod.object:
+            return mod.object
+    if mesh_obj.parent and mesh_obj.parent.type == 'ARMATURE':
+        return mesh_obj.parent
+    return None
+
+
+def get_armature_object_names(self, context, edit_text):
+    return [ob.name for ob in context.view_layer.objects if ob.type == 'ARMATURE']
+
+
+class OperatorBuildRigFromCategories(Operator, CreateShapeKeyWidgetsCategoryMixin):
+    bl_idname = "shape_keys_widget.build_rig_from_categories"
+    bl_label = "Build Rig from Categories"
+    bl_description = ("Create the widget bones, custom shapes and drivers of all the categories of this mesh, "
+                      "with the thumbnails in a grid of the category's columns")
+
+    rig_name: StringProperty(
+        name="Rig",
+        description="Armature object where to add the widget bones. "
+                    "Defaults to the armature deforming the mesh",
+        default="",
+        search=get_armature_object_names,
+    )
+    incremental: BoolProperty(
+        name="Only Update Changes",
+        description="Keep the bones, properties and drivers that are already up-to-date, "
+                    "preserving their keyframes. Otherwise, the widgets are rebuilt from scratch",
+        default=True,
+    )
+    use_compact_drivers: BoolProperty(
+        name="Compact Drivers",
+        description="Drive each shape key from the cursor distance with a single driver, "
+                    "instead of through a 'cursor_influence' property on the thumbnail bone",
+        default=False,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        if not CreateShapeKeyWidgetsCategoryMixin.poll(context):
+            return False
+        if not context.mesh.shape_key_cats:
+            cls.poll_message_set("Mesh has no shape key widget categories")
+            return False
+        return True
+
+    def invoke(self, context, event):
+        if not self.rig_name:
+            rig = context.mesh.shape_key_widget_rig or find_mesh_rig(context.object)
+            self.rig_name = rig.name if rig else ""
+        return CreateShapeKeyWidgetsCategoryMixin.invoke(self, context, event)
+
+    def execute(self, context):
+        rig = bpy.data.objects.get(self.rig_name)
+        if not rig or rig.type != 'ARMATURE':
+            self.report({'ERROR'}, f"Can not find armature object with name '{self.rig_name}' to build on")
+            return {'CANCELLED'}
+        if rig.name not in context.view_layer.objects:
+            self.report({'ERROR'}, f"Rig '{rig.name}' needs to be in the view layer to add bones to it")
+            return {'CANCELLED'}
+
+        # All categories at once, for a single Edit Mode session on the rig.
+        widget_specs = api.get_category_widget_specs(context.mesh)
+        log.info(f"Building {len(widget_specs)} widgets on '{rig.name}'")
+        try:
+            stats = api.build_widgets(rig, context.object, widget_specs, incremental=self.incremental,
+                                      use_compact_drivers=self.use_compact_drivers)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        # Further category edits update the widgets of this rig.
+        context.mesh.shape_key_widget_rig = rig
+        sync.store_synced_state(context.mesh, self.use_compact_drivers)
+
+        log.info(f"Done: {stats.summary()}\n{stats.details()}")
+        self.report({'INFO'}, f"Shape Key widgets: {stats.summary()}")
+        return {'FINISHED'}
+
+
+class OperatorRenderThumbnails(Operator):
+    bl_idname = "shape_keys_widget.render_thumbnails"
+    bl_label = "Render Thumbnails"
+    bl_description = ("Render a thumbnail of each shape key of the categories of this mesh, "
+                      "in background Blender processes. Esc cancels")
+    bl_options = {'REGISTER'}
+
+    # Seconds between checks on the background processes.
+    POLL_INTERVAL = 0.5
+
+    output_dir: StringProperty(
+        name="Directory",
+        description="Directory where to write the '<shape key name>.png' thumbnails",
+        default="//thumbnails/",
+        subtype='DIR_PATH',
+    )
+    engine: EnumProperty(
+        name="Engine",
+        items=[
+            ('BLENDER_WORKBENCH', "Workbench", "Fast, with solid shading"),
+            ('CYCLES', "Cycles", "Slower, with the materials of the mesh, on the CPU"),
+        ],
+        default='BLENDER_WORKBENCH',
+    )
+    resolution: IntProperty(
+        name="Resolution",
+        description="Width and height of the thumbnails, in pixels",
+        default=thumbnails.THUMBNAIL_RESOLUTION,
+        min=16,
+        max=2048,
+    )
+    frame: EnumProperty(
+        name="Frame",
+        items=[
+            ('SHAPE_KEYS', "Shape Keys", "The region of the mesh that the shape keys move. "
+                                         "Editing a key so that the region changes renders all the keys again"),
+            ('MESH', "Mesh", "The whole mesh. Editing a key only renders that key again"),
+        ],
+        default='SHAPE_KEYS',
+    )
+    num_processes: IntProperty(
+        name="Processes",
+        description="Number of Blender processes rendering at the same time. 0 for one per CPU core",
+        default=0,
+        min=0,
+    )
+    use_cache: BoolProperty(
+        name="Use Cache",
+        description="Only render the shape keys that changed since they were last rendered with the same settings. "
+                    "Disable to render again after changing materials",
+        default=True,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        if not CreateShapeKeyWidgetsCategoryMixin.poll(context):
+            return False
+        if not context.mesh.shape_key_cats:
+            cls.poll_message_set("Mesh has no shape key widget categories")
+            return False
+        return True
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        if not bpy.data.filepath and self.output_dir.startswith("//"):
+            self.report({'ERROR'}, "Save the file first or choose an absolute directory for the thumbnails")
+            return {'CANCELLED'}
+        jobs = thumbnails.get_thumbnail_jobs(context.mesh)
+        if not jobs:
+            self.report({'ERROR'}, "No shape keys of the categories were found in the mesh")
+            return {'CANCELLED'}
+
+        self._render = thumbnails.ThumbnailRender(
+            context.object, jobs, self.output_dir, engine=self.engine, resolution=self.resolution,
+            frame=self.frame, num_processes=self.num_processes, use_cache=self.use_cache)
+        self._render.start()
+
+        wm = context.window_manager
+        wm.progress_begin(0, len(jobs))
+        self._timer = wm.event_timer_add(self.POLL_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        self.show_status(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._render.cancel()
+            self.end_modal(context)
+            self.report({'WARNING'}, "Thumbnail rendering cancelled")
+            return {'CANCELLED'}
+        # Let other events through, the rendering happens in other processes.
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        if self._render.is_running():
+            context.window_manager.progress_update(self._render.count_rendered())
+            self.show_status(context)
+            return {'RUNNING_MODAL'}
+
+        self.end_modal(context)
+        errors = self._render.finish()
+        # Reloaded images keep their count, so the cached icons wouldn't be refreshed.
+        previews.clear_thumbnail_icon_ids()
+        for error in errors:
+            log.error(error)
+        num_rendered = self._render.count_rendered()
+        if errors:
+            self.report({'WARNING'}, f"Rendered {num_rendered}/{len(self._render.jobs)} thumbnails. "
+                                     f"{len(errors)} errors, see the console")
+        else:
+            self.report({'INFO'}, f"Rendered {num_rendered} thumbnails")
+        return {'FINISHED'}
+
+    def cancel(self, context):
+        # Called when Blender cancels the operator, e.g. on closing the window.
+        self._render.cancel()
+        self.end_modal(context)
+
+    def show_status(self, context):
+        context.workspace.status_text_set(
+            f"Rendering thumbnails ({self._render.count_rendered()}/{len(self._render.jobs)}) "
+            f"in {len(self._render.processes)} processes. Esc to cancel")
+
+    def end_modal(self, context):
+        wm = context.window_manager
+        if self._timer:
+            wm.event_timer_remove(self._timer)
+            self._timer = None
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+
+class OperatorDrawDeltaThumbnails(Operator):
+    bl_idname = "shape_keys_widget.draw_delta_thumbnails"
+    bl_label = "Draw Quick Thumbnails"
+    bl_description = ("Draw a thumbnail of each shape key of the categories of this mesh, colored by how far "
+                      "the key moves the vertices. Instant, without rendering")
+    bl_options = {'UNDO', 'REGISTER'}
+
+    resolution: IntProperty(
+        name="Resolution",
+        description="Width and height of the thumbnails, in pixels",
+        default=delta_thumbnails.DELTA_THUMBNAIL_RESOLUTION,
+        min=16,
+        max=1024,
+    )
+    frame: EnumProperty(
+        name="Frame",
+        items=[
+            ('SHAPE_KEYS', "Shape Keys", "The region of the mesh that the shape keys move"),
+            ('MESH', "Mesh", "The whole mesh"),
+        ],
+        default='SHAPE_KEYS',
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return OperatorRenderThumbnails.poll(context)
+
+    def execute(self, context):
+        images = delta_thumbnails.make_delta_thumbnail_images(context.object, self.resolution, self.frame)
+        if not images:
+            self.report({'ERROR'}, "No shape keys of the categories were found in the mesh")
+            return {'CANCELLED'}
+        # Redrawn images keep their count, so the cached icons wouldn't be refreshed.
+        previews.clear_thumbnail_icon_ids()
+        self.report({'INFO'}, f"Drew {len(images)} thumbnails")
+        return {'FINISHED'}
+
+
 # Add-on Registration #############################################################################
 
 classes = (
@@ -547,6 +821,9 @@ classes = (
     OperatorDelShapeKeyFromCategory,
     OperatorMoveShapeKeyInCategory,
     OperatorMuteShapeKeysInCategory,
+    OperatorBuildRigFromCategories,
+    OperatorRenderThumbnails,
+    OperatorDrawDeltaThumbnails,
 )
 
 
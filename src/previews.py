@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Thumbnail previews for the UI, made lazily outside of drawing
+
+Making the preview of an image decodes and scales it down, which takes long for big images.
+Drawing only asks for previews: the ones not made yet are queued and the UI shows a fallback icon.
+A timer makes the queued previews in slices of PREVIEW_TIME_BUDGET seconds, in between UI events,
+and redraws the Properties Editor once some are ready.
+(bpy is not thread-safe, so the previews can't be made by a Python thread)
+"""
+
+import logging
+import time
+from collections import deque
+
+import bpy
+
+log = logging.getLogger(__package__)
+
+
+# Seconds of preview making per timer call, to keep the UI responsive.
+PREVIEW_TIME_BUDGET = 0.02
+# Seconds between timer calls while there are queued previews.
+PREVIEW_INTERVAL = 0.05
+
+# Icon of the thumbnail image of each shape key, by image name, or 0 if there is no such image.
+# Only has the images whose preview is ready. Cleared when the number of images changes,
+# on undo/redo and on file load.
+thumbnail_icon_ids = {}
+num_images_of_icon_ids = 0
+
+# Names of the images with a preview to make, in the order they were asked for.
+# Also as a set, to check in constant time whether a drawn image is already queued.
+queued_image_names = deque()
+queued_image_name_set = set()
+
+
+def get_image_name(sk_name):
+    return f"{sk_name}.png"
+
+
+def get_thumbnail_icon_id(sk_name):
+    """Return the icon of the '<shape key name>.png' image, or 0 while its preview isn't ready or there is none"""
+    global num_images_of_icon_ids
+
+    if num_images_of_icon_ids != len(bpy.data.images):
+        clear_thumbnail_icon_ids()
+        num_images_of_icon_ids = len(bpy.data.images)
+
+    img_name = get_image_name(sk_name)
+    icon_id = thumbnail_icon_ids.get(img_name)
+    if icon_id is None:
+        queue_preview(img_name)
+        return 0
+    return icon_id
+
+
+def queue_preview(img_name):
+    if img_name in queued_image_name_set:
+        return
+    queued_image_names.append(img_name)
+    queued_image_name_set.add(img_name)
+    if not bpy.app.timers.is_registered(make_queued_previews):
+        bpy.app.timers.register(make_queued_previews, first_interval=0.0)
+
+
+def make_queued_previews():
+    """Timer callback: make queued previews until the time budget runs out"""
+
+    start_time = time.perf_counter()
+    num_made = 0
+    while queued_image_names and time.perf_counter() - start_time < PREVIEW_TIME_BUDGET:
+        img_name = queued_image_names.popleft()
+        queued_image_name_set.discard(img_name)
+        img = bpy.data.images.get(img_name)
+        if img:
+            # preview_ensure() only makes an empty preview, decoded later while drawing.
+            # Reading the sizes makes the icon and the bigger preview of scaled up icons, right away.
+            preview = img.preview_ensure()
+            _icon_size, _image_size = tuple(preview.icon_size), tuple(preview.image_size)
+            num_made += 1
+        thumbnail_icon_ids[img_name] = img.preview.icon_id if img else 0
+
+    if num_made:
+        log.debug(f"Made {num_made} thumbnail previews, {len(queued_image_names)} queued")
+        tag_redraw_properties_editors()
+    return PREVIEW_INTERVAL if queued_image_names else None
+
+
+def tag_redraw_properties_editors():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+
+def clear_thumbnail_icon_ids():
+    # Queued previews are made again when drawing asks for them.
+    thumbnail_icon_ids.clear()
+    queued_image_names.clear()
+    queued_image_name_set.clear()
+
+
+def unregister():
+    if bpy.app.timers.is_registered(make_queued_previews):
+        bpy.app.timers.unregister(make_queued_previews)
+    clear_thumbnail_icon_ids()
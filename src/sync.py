@@ -0,0 +1,154 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Keep the widget rig of a mesh up-to-date with the edits of its shape key categories
+
+Edits tag their category as changed, from the property update callbacks and the category operators.
+(msgbus doesn't notify about adding, removing or moving items of Python collection properties)
+The tagged categories are synced together once the edits stop for SYNC_DELAY seconds, so that
+rapid clicking only syncs once. Each sync only touches the widgets of the tagged categories
+and only changes what differs from their state at the last sync.
+"""
+
+import json
+import logging
+import time
+
+import bpy
+
+from . import api
+from .convert_sks_to_skw_rig import ConversionProfile, ConversionStats, get_wgt_category_obj_name
+
+log = logging.getLogger(__package__)
+
+
+# Seconds without edits before syncing.
+SYNC_DELAY = 0.3
+
+# Mesh ID property with the build options and the widget specs of the categories at the last sync,
+# by category UUID, as JSON.
+# Stored in the file, so that it stays consistent with the rig on undo and across sessions.
+# (underscored, to not show in the Custom Properties panel)
+SYNCED_STATE_PROP = "_skw_synced_widgets"
+
+# Categories edited since the last sync: {mesh session_uid: {category UUID, ...}}.
+# By session_uid, which unlike the name stays the same when the mesh is renamed.
+pending_category_uuids = {}
+last_tag_time = 0.0
+
+
+def tag_category(mesh, category):
+    """Mark the category as changed, to sync the widget rig of the mesh after the edits stop"""
+    global last_tag_time
+
+    if not mesh.shape_key_widget_rig:
+        return
+    pending_category_uuids.setdefault(mesh.session_uid, set()).add(category.uuid)
+    last_tag_time = time.monotonic()
+    if not bpy.app.timers.is_registered(sync_pending):
+        bpy.app.timers.register(sync_pending, first_interval=SYNC_DELAY)
+
+
+def sync_pending():
+    """Timer callback: sync the tagged categories, or wait more if they were edited in the meantime"""
+
+    time_since_last_tag = time.monotonic() - last_tag_time
+    if time_since_last_tag < SYNC_DELAY:
+        return SYNC_DELAY - time_since_last_tag
+
+    pending = dict(pending_category_uuids)
+    pending_category_uuids.clear()
+    meshes_by_uid = {mesh.session_uid: mesh for mesh in bpy.data.meshes}
+    for mesh_uid, category_uuids in pending.items():
+        mesh = meshes_by_uid.get(mesh_uid)
+        if mesh and mesh.shape_key_widget_rig:
+            try:
+                sync_categories(mesh, category_uuids)
+            except Exception:
+                # Keep the timer alive for the next edits.
+                log.exception(f"Failed to sync the widgets of mesh '{mesh.name}'")
+    return None
+
+
+def read_synced_state(mesh):
+    return json.loads(mesh.get(SYNCED_STATE_PROP, '{"use_compact_drivers": false, "specs": {}}'))
+
+
+def write_synced_state(mesh, synced_state):
+    mesh[SYNCED_STATE_PROP] = json.dumps(synced_state)
+
+
+def store_synced_state(mesh, use_compact_drivers=False):
+    """Record all the categories as synced, e.g. after building the whole rig with the given options"""
+    write_synced_state(mesh, {
+        'use_compact_drivers': use_compact_drivers,
+        'specs': {category.uuid: get_synced_spec(category) for category in mesh.shape_key_cats},
+    })
+
+
+def get_synced_spec(category):
+    # As read back from JSON, to compare with stored specs.
+    return json.loads(json.dumps(api.get_category_widget_spec(category)))
+
+
+def find_mesh_object(mesh):
+    return next((ob for ob in bpy.data.objects if ob.data == mesh), None)
+
+
+def sync_categories(mesh, category_uuids):
+    """Update the widgets of the given categories, changing only what differs since the last sync"""
+
+    rig = mesh.shape_key_widget_rig
+    mesh_obj = find_mesh_object(mesh)
+    if not mesh_obj or not mesh.shape_keys:
+        return
+
+    synced_state = read_synced_state(mesh)
+    synced_specs = synced_state['specs']
+    categories_by_uuid = {category.uuid: category for category in mesh.shape_key_cats}
+
+    specs_to_update = []
+    stale_bone_names = set()
+    stale_label_names = []
+    for category_uuid in category_uuids:
+        old_spec = synced_specs.get(category_uuid)
+        category = categories_by_uuid.get(category_uuid)
+        new_spec = get_synced_spec(category) if category else None
+        if new_spec == old_spec:
+            continue
+
+        # Bones of removed keys or cursors, or of the whole widget if it was removed or renamed.
+        if old_spec:
+            new_bone_names = api.get_widget_bone_names(new_spec) if new_spec else set()
+            stale_bone_names |= api.get_widget_bone_names(old_spec) - new_bone_names
+            if not new_spec or new_spec['name'] != old_spec['name']:
+                stale_label_names.append(old_spec['name'])
+
+        if new_spec:
+            specs_to_update.append(new_spec)
+            synced_specs[category_uuid] = new_spec
+        else:
+            del synced_specs[category_uuid]
+
+    # Unless another category still uses them, should the names collide.
+    if stale_bone_names or stale_label_names:
+        current_specs = [get_synced_spec(category) for category in mesh.shape_key_cats]
+        stale_bone_names -= api.get_widgets_bone_names(current_specs)
+        label_obj_names = {get_wgt_category_obj_name(spec['name']) for spec in current_specs}
+        stale_label_names = [name for name in stale_label_names
+                             if get_wgt_category_obj_name(name) not in label_obj_names]
+
+    if not specs_to_update and not stale_bone_names and not stale_label_names:
+        return
+
+    removal_stats = ConversionStats()
+    api.remove_widget_bones(rig, mesh_obj, stale_bone_names, removal_stats, ConversionProfile(enabled=False))
+    api.remove_label_widgets(stale_label_names, removal_stats)
+    update_stats = ConversionStats()
+    if specs_to_update:
+        update_stats = api.update_widgets(rig, mesh_obj, specs_to_update,
+                                          use_compact_drivers=synced_state['use_compact_drivers'])
+    write_synced_state(mesh, synced_state)
+
+    log.info(f"Synced {len(specs_to_update)} widgets of '{mesh.name}' on '{rig.name}': "
+             f"{update_stats.summary()}, {removal_stats.total('REMOVED')} removed")
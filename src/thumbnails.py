@@ -0,0 +1,454 @@
+# SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
+# SPDX-License-Identifier: GPL-3.0
+
+"""Render a thumbnail of each shape key of the categories of a mesh, in background Blender processes
+
+Each thumbnail isolates its shape key at 1.0, or the '.L' and '.R' pair of mirrored categories,
+and renders the mesh from the front with a CPU engine, framing the same region for all the keys.
+The keys are split in shards, one per background process, as many as CPU cores by default.
+The processes render the saved file, so the add-on saves a copy of the open file for them.
+They render into a temporary directory. Once they are done, the rendered thumbnails replace the
+'<output dir>/<shape key name>.png' files, which are loaded in one batch as the '<shape key name>.png'
+images that the UI shows. Cancelled or failed renders leave the previous thumbnails as they were.
+
+Rendered thumbnails are kept in a cache directory next to the .blend file, by a hash of what they show:
+the shape key offsets, the coordinates they are relative to, the object transform and the render
+settings, including the framed region. Only the keys without a cached thumbnail are rendered again.
+The 'SHAPE_KEYS' frame covers the region that all the keys move, so editing one key in a way that
+changes that region renders all the keys again. The 'MESH' frame doesn't depend on the keys:
+editing a key only renders that key again.
+The least recently used thumbnails are removed once the cache grows over THUMBNAIL_CACHE_MAX_SIZE.
+(Materials and lights are not part of the hash, re-render without the cache after changing them)
+
+This module is also the script of the background processes, so it only depends on bpy:
+    blender -b <file> --python src/thumbnails.py -- --worker --params <shard.json>
+See scripts/render_thumbnails.py to render from the command line.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from math import radians
+
+import bpy
+import numpy as np
+from mathutils import Euler, Vector
+
+log = logging.getLogger(__package__)
+
+
+THUMBNAIL_RESOLUTION = 256
+CYCLES_SAMPLES = 16
+# The framed region is scaled up by this, to leave a border around the shape keys.
+FRAME_MARGIN = 1.2
+# Vertices that a shape key moves less than this don't count for the framed region.
+MIN_VERTEX_OFFSET = 1e-4
+
+# Directory of the thumbnail cache, next to the .blend file. Shared by the files in the same directory.
+THUMBNAIL_CACHE_DIR = "//.skw_thumbnail_cache/"
+THUMBNAIL_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+
+# Runner ##########################################################################################
+
+def get_thumbnail_jobs(mesh):
+    """Return the thumbnails to render for the categories of the mesh, as
+    [{'name': image name without extension, 'key_names': [shape keys at 1.0]}, ...]
+    """
+
+    key_names_in_mesh = set(mesh.shape_keys.key_blocks.keys()) if mesh.shape_keys else set()
+    jobs = {}
+    for cat in mesh.shape_key_cats:
+        for skw_sk in cat.shape_keys:
+            name = skw_sk.shape_key_name
+            key_names = [name + ".L", name + ".R"] if cat.is_mirrored else [name]
+            key_names = [n for n in key_names if n in key_names_in_mesh]
+            if key_names and name not in jobs:
+                jobs[name] = {'name': name, 'key_names': key_names}
+    return list(jobs.values())
+
+
+def get_vertex_coords(vertices):
+    coords = np.empty(len(vertices) * 3, dtype=np.float32)
+    vertices.foreach_get("co", coords)
+    return coords.reshape(-1, 3)
+
+
+def get_frame_bounds(mesh_obj, key_names=None):
+    """Return the world space corners (min, max) of the vertices moved by the shape keys, before and
+    after moving, or of the whole mesh without shape keys or if they move nothing"""
+
+    mesh = mesh_obj.data
+    coords = get_vertex_coords(mesh.vertices)
+    if key_names and mesh.shape_keys:
+        moved_coords = []
+        for key_name in key_names:
+            key_block = mesh.shape_keys.key_blocks[key_name]
+            key_coords = get_vertex_coords(key_block.data)
+            relative_coords = get_vertex_coords(key_block.relative_key.data)
+            is_moved = np.linalg.norm(key_coords - relative_coords, axis=1) > MIN_VERTEX_OFFSET
+            moved_coords += [key_coords[is_moved], relative_coords[is_moved]]
+        moved_coords = np.concatenate(moved_coords)
+        if len(moved_coords):
+            coords = moved_coords
+
+    matrix = np.array(mesh_obj.matrix_world, dtype=np.float32)
+    world_coords = coords @ matrix[:3, :3].T + matrix[:3, 3]
+    return world_coords.min(axis=0).tolist(), world_coords.max(axis=0).tolist()
+
+
+def get_thumbnail_hashes(mesh_obj, jobs, render_settings):
+    """Return {job name: hash of what its thumbnail shows} for the jobs
+
+    The render settings include the framed region, which for the 'SHAPE_KEYS' frame depends on all the keys.
+    """
+
+    settings_hash = hashlib.sha1(json.dumps(render_settings, sort_keys=True).encode())
+    settings_hash.update(np.array(mesh_obj.matrix_world, dtype=np.float32).tobytes())
+
+    key_blocks = mesh_obj.data.shape_keys.key_blocks
+    # Shared by the keys relative to the same key, read once.
+    relative_coords_by_name = {}
+    hashes = {}
+    for job in jobs:
+        job_hash = settings_hash.copy()
+        for key_name in job['key_names']:
+            key_block = key_blocks[key_name]
+            relative_name = key_block.relative_key.name
+            if relative_name not in relative_coords_by_name:
+                relative_coords_by_name[relative_name] = get_vertex_coords(key_block.relative_key.data)
+            relative_coords = relative_coords_by_name[relative_name]
+            job_hash.update(relative_coords.tobytes())
+            job_hash.update((get_vertex_coords(key_block.data) - relative_coords).tobytes())
+        hashes[job['name']] = job_hash.hexdigest()
+    return hashes
+
+
+class ThumbnailCache:
+    """Directory of rendered thumbnails, as '<hash>.png' files, with the least recently used removed first"""
+
+    def __init__(self, cache_dir, max_size=THUMBNAIL_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get_path(self, thumbnail_hash):
+        return os.path.join(self.cache_dir, f"{thumbnail_hash}.png")
+
+    def has(self, thumbnail_hash):
+        return os.path.exists(self.get_path(thumbnail_hash))
+
+    def copy_to(self, thumbnail_hash, filepath):
+        shutil.copyfile(self.get_path(thumbnail_hash), filepath)
+        # The modification time is the time of last use, for the eviction.
+        os.utime(self.get_path(thumbnail_hash))
+
+    def add(self, thumbnail_hash, filepath):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shutil.copyfile(filepath, self.get_path(thumbnail_hash))
+
+    def evict(self):
+        """Remove the least recently used thumbnails until the cache fits its maximum size"""
+
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".png")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        num_removed = 0
+        for entry in entries:
+            if size <= self.max_size:
+                break
+            size -= entry.stat().st_size
+            os.remove(entry.path)
+            num_removed += 1
+        if num_removed:
+            log.info(f"Removed {num_removed} least recently used thumbnails from the cache")
+
+
+def shard_jobs(jobs, num_shards):
+    # Interleaved, so that keys of the same category, likely similar to render, are spread out.
+    return [jobs[shard_idx::num_shards] for shard_idx in range(num_shards) if jobs[shard_idx::num_shards]]
+
+
+class ThumbnailRender:
+    """Thumbnails rendering in background Blender processes, one per shard of the jobs"""
+
+    def __init__(self, mesh_obj, jobs, output_dir, engine='BLENDER_WORKBENCH',
+                 resolution=THUMBNAIL_RESOLUTION, frame='SHAPE_KEYS', num_processes=0, use_cache=True):
+        self.mesh_obj_name = mesh_obj.name
+        self.jobs = jobs
+        self.output_dir = os.path.abspath(bpy.path.abspath(output_dir))
+        self.engine = engine
+        self.resolution = resolution
+
+        # The same region for all the keys of all the shards.
+        key_names = [n for job in jobs for n in job['key_names']] if frame == 'SHAPE_KEYS' else None
+        self.frame_bounds = get_frame_bounds(mesh_obj, key_names)
+
+        # Only the keys without a cached thumbnail are rendered. An unsaved file has no cache.
+        self.cache = None
+        self.thumbnail_hashes = {}
+        self.jobs_to_render = jobs
+        if use_cache and bpy.data.filepath:
+            self.cache = ThumbnailCache(os.path.abspath(bpy.path.abspath(THUMBNAIL_CACHE_DIR)))
+            render_settings = {'engine': engine, 'resolution': resolution, 'frame_bounds': self.frame_bounds}
+            self.thumbnail_hashes = get_thumbnail_hashes(mesh_obj, jobs, render_settings)
+            self.jobs_to_render = [job for job in jobs if not self.cache.has(self.thumbnail_hashes[job['name']])]
+        self.num_processes = min(num_processes or os.cpu_count() or 1, len(self.jobs_to_render))
+
+        # Temporary directory with the file copy, the shard parameters, renders, results and logs.
+        self.work_dir = ""
+        self.processes = []
+        self.start_time = 0.0
+        # Names of the thumbnails put in the output directory, once finished.
+        self.finished_names = None
+
+    def get_image_path(self, name):
+        return os.path.join(self.output_dir, f"{name}.png")
+
+    def get_render_dir(self):
+        return os.path.join(self.work_dir, "renders")
+
+    def get_render_path(self, name):
+        return os.path.join(self.get_render_dir(), f"{name}.png")
+
+    def start(self, blend_path=None):
+        """Start the background processes, on a copy of the open file unless given a saved file"""
+
+        self.work_dir = tempfile.mkdtemp(prefix="skw_thumbnails_")
+        os.makedirs(self.get_render_dir())
+        if not blend_path and self.jobs_to_render:
+            # Remap relative paths of e.g. textures to the location of the copy.
+            blend_path = os.path.join(self.work_dir, "thumbnails.blend")
+            bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, relative_remap=True)
+
+        threads_per_process = max(1, (os.cpu_count() or 1) // max(1, self.num_processes))
+        self.start_time = time.perf_counter()
+        for shard_idx, shard in enumerate(shard_jobs(self.jobs_to_render, self.num_processes)):
+            params_path = os.path.join(self.work_dir, f"shard-{shard_idx}.json")
+            with open(params_path, "w") as f:
+                json.dump({
+                    'mesh_obj_name': self.mesh_obj_name,
+                    'jobs': shard,
+                    'output_dir': self.get_render_dir(),
+                    'engine': self.engine,
+                    'resolution': self.resolution,
+                    'frame_bounds': self.frame_bounds,
+                    'result': os.path.join(self.work_dir, f"shard-{shard_idx}-result.json"),
+                }, f)
+            cmd = [
+                bpy.app.binary_path, "--background", "--factory-startup",
+                "--threads", str(threads_per_process),
+                blend_path,
+                "--python-exit-code", "1",
+                "--python", os.path.abspath(__file__),
+                "--", "--worker", "--params", params_path,
+            ]
+            with open(os.path.join(self.work_dir, f"shard-{shard_idx}.log"), "w") as log_file:
+                self.processes.append(subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT))
+        log.info(f"Rendering {len(self.jobs_to_render)} thumbnails of '{self.mesh_obj_name}' "
+                 f"in {len(self.processes)} processes into '{self.output_dir}', "
+                 f"{len(self.jobs) - len(self.jobs_to_render)} from the cache")
+
+    def is_running(self):
+        return any(process.poll() is None for process in self.processes)
+
+    def wait(self):
+        for process in self.processes:
+            process.wait()
+
+    def cancel(self):
+        """Stop the background processes, leaving the output directory as it was"""
+
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+        self.wait()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def count_rendered(self):
+        """Return the number of thumbnails done so far, including the ones from the cache"""
+
+        if self.finished_names is not None:
+            return len(self.finished_names)
+        num_cached = len(self.jobs) - len(self.jobs_to_render)
+        return num_cached + sum(os.path.exists(self.get_render_path(job['name'])) for job in self.jobs_to_render)
+
+    def get_errors(self):
+        """Return the problems of the finished processes, for the ones that didn't render all their keys"""
+
+        errors = []
+        for shard_idx, process in enumerate(self.processes):
+            result_path = os.path.join(self.work_dir, f"shard-{shard_idx}-result.json")
+            if os.path.exists(result_path):
+                with open(result_path) as f:
+                    errors += json.load(f)['errors']
+            elif process.returncode:
+                log_path = os.path.join(self.work_dir, f"shard-{shard_idx}.log")
+                errors.append(f"Blender exited with code {process.returncode}. See {log_path}")
+        return errors
+
+    def finish(self):
+        """Put the rendered and cached thumbnails in the output directory, load them in one batch,
+        clean up and return the errors"""
+
+        self.wait()
+        errors = self.get_errors()
+
+        # Only the thumbnails that were rendered replace the previous ones.
+        os.makedirs(self.output_dir, exist_ok=True)
+        names_to_render = {job['name'] for job in self.jobs_to_render}
+        self.finished_names = []
+        for job in self.jobs:
+            name = job['name']
+            if name not in names_to_render:
+                self.cache.copy_to(self.thumbnail_hashes[name], self.get_image_path(name))
+            elif os.path.exists(self.get_render_path(name)):
+                if self.cache:
+                    self.cache.add(self.thumbnail_hashes[name], self.get_render_path(name))
+                # The work directory may be on another drive.
+                shutil.move(self.get_render_path(name), self.get_image_path(name))
+            else:
+                continue
+            self.finished_names.append(name)
+        if self.cache:
+            self.cache.evict()
+
+        load_thumbnail_images(self.output_dir, self.finished_names)
+        log.info(f"Rendered {len(self.finished_names)}/{len(self.jobs)} thumbnails "
+                 f"in {time.perf_counter() - self.start_time:.1f}s")
+
+        # Keep the logs to look into the errors.
+        if errors:
+            log.warning(f"Thumbnail rendering logs are in '{self.work_dir}'")
+        else:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return errors
+
+
+def load_thumbnail_images(output_dir, names):
+    """Load the '<name>.png' files of the output directory as images, reloading the ones already loaded"""
+
+    for name in names:
+        filepath = os.path.join(output_dir, f"{name}.png")
+        # Relative to the .blend file when possible, so that the thumbnails move along with it.
+        if bpy.data.filepath:
+            try:
+                filepath = bpy.path.relpath(filepath)
+            except ValueError:
+                pass  # On another drive.
+        img = bpy.data.images.get(f"{name}.png")
+        if img:
+            # Quick thumbnails are packed, generated images: they would keep showing instead of the file.
+            if img.packed_file:
+                img.unpack(method='REMOVE')
+            img.source = 'FILE'
+            img.filepath = filepath
+            img.reload()
+            if img.preview:
+                img.preview.reload()
+        else:
+            img = bpy.data.images.load(filepath)
+            img.name = f"{name}.png"
+
+
+# Worker (runs in a background Blender process) ###################################################
+
+def make_thumbnail_scene(mesh_obj, frame_bounds, engine, resolution):
+    """Return a new scene with only the mesh, framed from the front by an orthographic camera"""
+
+    scene = bpy.data.scenes.new("SKW Thumbnails")
+    scene.collection.objects.link(mesh_obj)
+    # Render the mesh even if it's hidden in the scene it's from.
+    mesh_obj.hide_render = False
+
+    render = scene.render
+    render.engine = engine
+    render.resolution_x = render.resolution_y = resolution
+    render.resolution_percentage = 100
+    render.film_transparent = True
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+    if engine == 'CYCLES':
+        scene.cycles.device = 'CPU'
+        scene.cycles.samples = CYCLES_SAMPLES
+        # Workbench has its own studio lighting.
+        scene.world = bpy.data.worlds.new("SKW Thumbnails")
+        scene.world.color = (0.5, 0.5, 0.5)
+        light = bpy.data.objects.new("SKW Thumbnails Light", bpy.data.lights.new("SKW Thumbnails", 'SUN'))
+        light.rotation_euler = Euler((1.1, 0.0, -0.4))
+        scene.collection.objects.link(light)
+
+    bounds_min, bounds_max = Vector(frame_bounds[0]), Vector(frame_bounds[1])
+    size = bounds_max - bounds_min
+    camera_data = bpy.data.cameras.new("SKW Thumbnails")
+    camera_data.type = 'ORTHO'
+    camera_data.ortho_scale = max(size.x, size.z, MIN_VERTEX_OFFSET) * FRAME_MARGIN
+    # In front of the mesh, looking along +Y like the Front view.
+    distance = max(mesh_obj.dimensions) * 2 + 1.0
+    camera_data.clip_end = distance * 2
+    camera = bpy.data.objects.new("SKW Thumbnails Camera", camera_data)
+    camera.location = (bounds_min + bounds_max) / 2
+    camera.location.y = bounds_min.y - distance
+    camera.rotation_euler = Euler((radians(90), 0.0, 0.0))
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+    return scene
+
+
+def render_thumbnails(mesh_obj, jobs, output_dir, engine, resolution, frame_bounds):
+    """Render each job's shape keys at 1.0 with all others at 0.0 to '<output dir>/<name>.png' and return the errors"""
+
+    scene = make_thumbnail_scene(mesh_obj, frame_bounds, engine, resolution)
+    shape_keys = mesh_obj.data.shape_keys
+    # Drivers, e.g. of a widget rig, would override the values. This file is not saved.
+    shape_keys.animation_data_clear()
+    mesh_obj.show_only_shape_key = False
+
+    errors = []
+    for job in jobs:
+        try:
+            for key_block in shape_keys.key_blocks:
+                key_block.value = 0.0
+            for key_name in job['key_names']:
+                key_block = shape_keys.key_blocks[key_name]
+                key_block.mute = False
+                key_block.slider_max = max(key_block.slider_max, 1.0)
+                key_block.value = 1.0
+            scene.render.filepath = os.path.join(output_dir, f"{job['name']}.png")
+            bpy.ops.render.render(write_still=True, scene=scene.name)
+        except Exception:
+            traceback.print_exc()
+            errors.append(f"Failed to render the thumbnail of '{job['name']}': {traceback.format_exc(limit=1)}")
+    return errors
+
+
+def main_worker(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", action="store_true")
+    parser.add_argument("--params", required=True)
+    args = parser.parse_args(argv)
+
+    with open(args.params) as f:
+        params = json.load(f)
+    mesh_obj = bpy.data.objects.get(params['mesh_obj_name'])
+    if not mesh_obj or mesh_obj.type != 'MESH' or not mesh_obj.data.shape_keys:
+        errors = [f"Can not find mesh object with shape keys '{params['mesh_obj_name']}'"]
+    else:
+        errors = render_thumbnails(mesh_obj, params['jobs'], params['output_dir'], params['engine'],
+                                   params['resolution'], params['frame_bounds'])
+    with open(params['result'], "w") as f:
+        json.dump({'errors': errors}, f, indent=2)
+
+
+if __name__ == "__main__":
+    # Blender passes the arguments after '--' on to the script.
+    main_worker(sys.argv[sys.argv.index("--") + 1:])
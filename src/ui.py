@@ -13,6 +13,13 @@ from bpy.types import (
 
 from .. import ADDON_ID
 from . import utils
+from .data import get_key_name_set
+from .previews import get_thumbnail_icon_id
+from .convert_sks_to_skw_rig import get_character_setup_names
+
+
+def is_animation_playing(context):
+    return bool(context.screen and context.screen.is_animation_playing)
 
 
 class VIEW3D_PT_shape_key_widgets_setup(Panel):
@@ -48,12 +55,14 @@ class VIEW3D_PT_shape_key_widgets_conversion(Panel):
         col.prop(addon_prefs, "character_name")
         col.prop(addon_prefs, "categories_str")
 
-        op = col.operator("scene.convert_sks_to_skw")
-        op.rig_name = "RIG-"+char_name
-        op.geo_name = f"GEO-{char_name}-head"
-        op.thumbs_collection_name = f"{char_name}-rig-widgets-thumbnails"
-        op.wgts_collection_name = f"{char_name}-rig-widgets"
-        op.categories_str = addon_prefs.categories_str
+        # The dialog to review the settings, or the step by step conversion with progress.
+        row = col.row(align=True)
+        for op_idname, text, icon in (("scene.convert_sks_to_skw", "Convert SKS to SKW rig", 'NONE'),
+                                      ("scene.convert_sks_to_skw_modal", "", 'TIME')):
+            op = row.operator(op_idname, text=text, icon=icon)
+            for prop_name, value in get_character_setup_names(char_name).items():
+                setattr(op, prop_name, value)
+            op.categories_str = addon_prefs.categories_str
 
 
 class DATA_PT_ShapeKeysWidgetCategories(Panel):
@@ -93,9 +102,21 @@ class DATA_PT_ShapeKeysWidgetCategories(Panel):
         row = col.row(align=True)
         row.operator("shape_keys_widget.add_shape_keys_widget_category")
         row.menu("DATA_MT_AddCategoryMenu", text="", icon='DOWNARROW_HLT')
+        col.operator("shape_keys_widget.build_rig_from_categories", icon='ARMATURE_DATA')
+        row = col.row(align=True)
+        row.operator("shape_keys_widget.render_thumbnails", icon='RENDER_STILL')
+        row.operator("shape_keys_widget.draw_delta_thumbnails", icon='MOD_DISPLACE')
+        col.prop(context.mesh, "shape_key_widget_rig")
         col.separator()
 
+        # Thumbnails are skipped during playback, so that drawing doesn't slow it down.
+        # In the compact mode, each category is a single paged grid.
+        addon_prefs = context.preferences.addons[ADDON_ID].preferences
+        is_playing = is_animation_playing(context)
+        use_list = not addon_prefs.use_compact_categories or is_playing
+
         # List of categories.
+        # Collapsed categories only draw their header.
         cats = context.mesh.shape_key_cats
         for i, cat in enumerate(cats):
 
@@ -135,19 +156,6 @@ class DATA_PT_ShapeKeysWidgetCategories(Panel):
                 draw_cat_properties()
 
                 def draw_cat_sks():
-                    row = col.row()
-                    # UI list
-                    num_rows = 5
-                    # fmt: off
-                    row.template_list(
-                        "DATA_UL_CategoryShapeKeys", panel_id,  # Type and unique id.
-                        cat, "shape_keys",  # Pointer to the CollectionProperty.
-                        cat, "active_sk_idx",  # Pointer to the active identifier.
-                        rows=num_rows,
-                        type='DEFAULT'
-                    )
-                    # fmt: on
-
                     # Buttons on the right
                     def draw_sk_op_buttons():
                         but_col = row.column(align=True)
@@ -171,21 +179,39 @@ class DATA_PT_ShapeKeysWidgetCategories(Panel):
                         )
                         move_down_op.direction = 'DOWN'
                         move_down_op.cat_idx = i
-                    draw_sk_op_buttons()
+
+                    if use_list:
+                        row = col.row()
+                        # UI list
+                        num_rows = 5
+                        # fmt: off
+                        row.template_list(
+                            "DATA_UL_CategoryShapeKeys", panel_id,  # Type and unique id.
+                            cat, "shape_keys",  # Pointer to the CollectionProperty.
+                            cat, "active_sk_idx",  # Pointer to the active identifier.
+                            rows=num_rows,
+                            type='DEFAULT'
+                        )
+                        # fmt: on
+                        draw_sk_op_buttons()
 
                     row = col.row()
                     row.use_property_decorate = False
                     row.prop(cat, "num_cols")
+                    if is_playing:
+                        return
                     row = col.row()
                     # row.prop_search(cat, "shape_key_name", cat, "shape_keys")
                     # row.prop_search(cat, "shape_key_name", key, "key_blocks")
+                    # The list only draws the items of the page that is scrolled to.
                     # fmt: off
                     row.use_property_decorate = False
                     row.template_list(
                         "DATA_UL_CategoryShapeKeys", panel_id,  # Type and unique id.
                         cat, "shape_keys",  # Pointer to the CollectionProperty.
                         cat, "active_sk_idx",  # Pointer to the active identifier.
-                        rows=5,
+                        rows=addon_prefs.grid_rows,
+                        maxrows=addon_prefs.grid_rows,
                         type='GRID', columns=cat.num_cols,
                     )
                     # fmt: on
@@ -193,14 +219,14 @@ class DATA_PT_ShapeKeysWidgetCategories(Panel):
                 draw_cat_sks()
 
                 def draw_sk_properties():
+                    if not use_list or is_playing or not 0 <= cat.active_sk_idx < len(cat.shape_keys):
+                        return
                     row = col.row()
 
                     skw_sk = cat.shape_keys[cat.active_sk_idx]
-                    img_name = f"{skw_sk.shape_key_name}.png"
-                    preview_idx = 182  # hardcoded 'SHAPEKEY_DATA' icon fallback
-                    if img_name in bpy.data.images:
-                        img = bpy.data.images[img_name]
-                        preview_idx = img.preview.icon_id
+                    # Fallback icon if the image wasn't created yet.
+                    preview_idx = (get_thumbnail_icon_id(skw_sk.shape_key_name) or
+                                   utils.get_icon_value('SHAPEKEY_DATA'))
                     row.template_icon(preview_idx, scale=6.0)
                 draw_sk_properties()
 
@@ -213,27 +239,28 @@ class DATA_UL_CategoryShapeKeys(UIList):
         cat = data
         skw_sk = item
 
-        sk_names_in_mesh = []
+        # Cached lookups, as this is called for each row on every redraw.
+        sk_names_in_mesh = set()
         if context.mesh.shape_keys:
-            sk_names_in_mesh = context.mesh.shape_keys.key_blocks.keys()
+            sk_names_in_mesh = get_key_name_set(context.mesh.shape_keys)
         if not cat.is_mirrored:
             has_matching_sk = skw_sk.shape_key_name in sk_names_in_mesh
         else:
             has_matching_sk = skw_sk.shape_key_name+".L" in sk_names_in_mesh and skw_sk.shape_key_name+".R" in sk_names_in_mesh
 
-        img_name = f"{skw_sk.shape_key_name}.png"
-        # Fallback icon if the image wasn't created yet.
-        preview_idx = utils.get_icon_value('SHAPEKEY_DATA')
-        if img_name in bpy.data.images:
-            img = bpy.data.images[img_name]
-            preview_idx = img.preview.icon_id
+        # Thumbnails are skipped during playback.
+        use_icon = not is_animation_playing(context)
+        if use_icon:
+            # Fallback icon if the image wasn't created yet.
+            preview_idx = get_thumbnail_icon_id(skw_sk.shape_key_name) or utils.get_icon_value('SHAPEKEY_DATA')
 
         if self.layout_type in {'DEFAULT', 'COMPACT'}:
 
             row = layout.row(align=True)
             row.alert = not has_matching_sk
 
-            row.template_icon(preview_idx)
+            if use_icon:
+                row.template_icon(preview_idx)
             row.prop(skw_sk, "shape_key_name", emboss=False, text="")
 
         else:  # GRID
@@ -241,7 +268,8 @@ class DATA_UL_CategoryShapeKeys(UIList):
             col.alert = not has_matching_sk
 
             col.prop(skw_sk, "shape_key_name", text="", emboss=False)
-            col.template_icon(preview_idx, scale=2.5)
+            if use_icon:
+                col.template_icon(preview_idx, scale=2.5)
 
 
 class DATA_MT_AddCategoryMenu(Menu):
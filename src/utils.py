@@ -1,9 +1,12 @@
 # SPDX-FileCopyrightText: 2024-2025 Shape Keys Widget Authors
 # SPDX-License-Identifier: GPL-3.0
 
+import functools
+
 from bpy.types import UILayout
 
 
+@functools.cache
 def get_icon_value(icon_name: str) -> int:
     """Return the int value of a Blender UI icon name"""
 